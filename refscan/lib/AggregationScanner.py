@@ -0,0 +1,255 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from pymongo.collection import Collection
+
+from refscan.lib.Partition import Partition
+from refscan.lib.Scanner import Scanner, CheckpointCallback, ProgressCallback
+from refscan.lib.ViolationList import ViolationList
+from refscan.lib.constants import console
+
+
+class AggregationScanner(Scanner):
+    r"""
+    A scanner that has the MongoDB server check the references, via aggregation pipelines that "join" each source
+    field to the collections that can contain the documents it references; so that only the references that lack
+    integrity (as opposed to all the relevant source documents) are sent to the client.
+
+    Note: The pipelines use `$lookup` stages that have both `localField`/`foreignField` and a `pipeline`, which
+          MongoDB introduced in version 5.0. The lookups use the index on the `id` field of each target collection,
+          if there is one.
+          Reference: https://www.mongodb.com/docs/manual/reference/operator/aggregation/lookup/
+
+    Note: The scanner reports the violations in each collection in `_id` order (not in natural order).
+    """
+
+    # Note: The progress bar can't track the documents processed by the server, so the scanner only reports its
+    #       progress in terms of violations.
+    reports_progress_per_document = False
+
+    def get_class_uris_by_class_name(self) -> Dict[str, List[str]]:
+        r"""
+        Returns a dictionary that maps each schema class name to the `class_uri` values (i.e. the values of the `type`
+        field of documents) that the scanner interprets as representing instances of that class.
+        """
+        class_uris_by_class_name: Dict[str, List[str]] = {}
+        for class_uri, scan_plan in self.scan_plans_by_class_uri.items():
+            class_uris_by_class_name.setdefault(scan_plan.class_name, []).append(class_uri)
+        return class_uris_by_class_name
+
+    def get_target_collection_names_by_class_uri(self, source_field_name: str) -> Dict[str, tuple]:
+        r"""
+        Returns a dictionary that maps each `type` value of a source document that can have the specified field, to
+        the (sorted) names of the collections in which the schema allows the documents referenced by that field to
+        exist.
+        """
+        target_collection_names_by_class_uri = {}
+        for class_uri, scan_plan in self.scan_plans_by_class_uri.items():
+            if source_field_name in scan_plan.reference_field_names:
+                target_collection_names_by_class_uri[class_uri] = scan_plan.get_target_collection_names(
+                    source_field_name
+                )
+        return target_collection_names_by_class_uri
+
+    @staticmethod
+    def make_unwind_stages(source_field_name: str, class_uris: List[str]) -> list:
+        r"""
+        Returns aggregation pipeline stages that output one document per value in the specified field of each
+        source document whose `type` is among those specified. Each output document has the `_id`, `id`, and `type`
+        of the source document, the value (as `target_id`), and that value's position in the field's list of values
+        (as `target_id_index`).
+        """
+        return [
+            {"$match": {source_field_name: {"$exists": True}, "type": {"$in": class_uris}}},
+            # Normalize the field's value into a list (the single-value case becomes a one-item list), then make one
+            # document per item in that list.
+            {
+                "$project": {
+                    "_id": 1,
+                    "id": 1,
+                    "type": 1,
+                    "target_id": {
+                        "$cond": [
+                            {"$isArray": f"${source_field_name}"},
+                            f"${source_field_name}",
+                            [f"${source_field_name}"],
+                        ]
+                    },
+                }
+            },
+            {"$unwind": {"path": "$target_id", "includeArrayIndex": "target_id_index"}},
+        ]
+
+    def make_violation_sort_key(
+        self, source_document_object_id, source_class_name: str, source_field_name: str, target_id_index: int
+    ) -> tuple:
+        r"""
+        Returns a key we can use to sort violations by source document `_id`; then, within each source document, in
+        the same order in which the synchronous scanner would find them (i.e. by field, then by position in the field).
+
+        Note: We sort `_id` values by their string representations (grouped by type), since values of different
+              types (e.g. `ObjectId`s and strings) cannot be compared to one another in Python.
+        """
+        field_position = self.reference_field_names_by_source_class_name[source_class_name].index(source_field_name)
+        return (
+            type(source_document_object_id).__name__,
+            str(source_document_object_id),
+            field_position,
+            target_id_index,
+        )
+
+    def make_pipeline(self, source_field_name: str, target_collection_names_by_class_uri: Dict[str, tuple]) -> list:
+        r"""
+        Returns an aggregation pipeline that outputs one document per reference, in the specified field, that lacks
+        integrity. Each output document has the `_id`, `id`, and `type` of the source document, the referenced `id`
+        (as `target_id`) and that `id`'s position in the field's list of values, if any (as `target_id_index`).
+
+        :param source_field_name: Name of the field containing the references
+        :param target_collection_names_by_class_uri: Dictionary mapping each `type` value of the source documents to
+                                                     the names of the collections in which the schema allows the
+                                                     documents referenced by this field to exist
+        """
+        names_of_all_target_collections = sorted(
+            set(name for names in target_collection_names_by_class_uri.values() for name in names)
+        )
+
+        def make_found_in_field_name(target_collection_name: str) -> str:
+            return f"found_in_{names_of_all_target_collections.index(target_collection_name)}"
+
+        pipeline = self.make_unwind_stages(source_field_name, list(target_collection_names_by_class_uri))
+
+        # Look up each referenced `id` in each collection that can contain the referenced document.
+        for target_collection_name in names_of_all_target_collections:
+            pipeline.append(
+                {
+                    "$lookup": {
+                        "from": target_collection_name,
+                        "localField": "target_id",
+                        "foreignField": "id",
+                        "pipeline": [{"$project": {"_id": 1}}, {"$limit": 1}],
+                        "as": make_found_in_field_name(target_collection_name),
+                    }
+                }
+            )
+
+        # Keep only the references whose targets were not found in any of the collections the schema allows them to
+        # be in, given the schema class of the source document.
+        branches = []
+        for class_uri, target_collection_names in target_collection_names_by_class_uri.items():
+            is_found_terms = [
+                {"$gt": [{"$size": f"${make_found_in_field_name(name)}"}, 0]} for name in target_collection_names
+            ]
+            branches.append({"case": {"$eq": ["$type", class_uri]}, "then": {"$or": is_found_terms}})
+        pipeline.append({"$match": {"$expr": {"$eq": [{"$switch": {"branches": branches, "default": True}}, False]}}})
+        pipeline.append({"$project": {"_id": 1, "id": 1, "type": 1, "target_id": 1, "target_id_index": 1}})
+
+        return pipeline
+
+    def count_documents_having_unknown_type(
+        self, collection: Collection, source_collection_name: str, partition: Optional[Partition]
+    ) -> Counter:
+        r"""
+        Returns the numbers of relevant documents (in the specified collection, or in the specified partition of it)
+        whose `type` values do not correspond to any schema class, by `type` value (see
+        `Scanner.num_documents_by_unknown_type`).
+
+        Note: The pipelines that check the references only match documents whose `type` values correspond to schema
+              classes, so the other documents would otherwise go uncounted. We have the server count them, instead of
+              fetching them. Like the synchronous scanner, we consider a document whose `type` is a list (even a list
+              containing a known `type` value) to have an unknown `type`.
+              Reference: https://www.mongodb.com/docs/manual/reference/operator/query/type/#querying-by-array-type
+        """
+        query_filter, _ = self.get_query_filter_and_projection(source_collection_name)
+        has_unknown_type = {
+            "$or": [{"type": {"$nin": list(self.scan_plans_by_class_uri)}}, {"type": {"$type": "array"}}]
+        }
+        pipeline = [
+            {"$match": {"$and": [query_filter, has_unknown_type]}},
+            {"$group": {"_id": "$type", "num_documents": {"$sum": 1}}},
+        ]
+        if partition is not None and partition.num_partitions > 1:
+            pipeline.insert(0, {"$match": partition.get_query_filter()})
+        if self.verbose:
+            console.print(f"{pipeline=}")
+
+        num_documents_by_unknown_type = Counter()
+        for result in collection.aggregate(pipeline, allowDiskUse=True):
+            class_uri = result["_id"] if isinstance(result["_id"], str) else None
+            num_documents_by_unknown_type[class_uri] += result["num_documents"]
+        return num_documents_by_unknown_type
+
+    def scan_collection(
+        self,
+        source_collection_name: str,
+        on_progress: Optional[ProgressCallback] = None,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+        on_checkpoint: Optional[CheckpointCallback] = None,
+    ) -> ViolationList:
+        r"""
+        Scans the relevant documents in the specified collection (or in the specified partition of it), and returns
+        a list of the violations found.
+
+        Note: This runs one aggregation pipeline per field (among the fields that can contain references), plus one
+              that counts the relevant documents whose `type` values are unknown.
+
+        Note: Since the pipelines look up the referenced documents themselves, this scanner does not skip the lookups
+              of malformed target `id`s (if the user opted to validate them); it only tags the violations involving
+              such `id`s with the reason.
+
+        Note: Since the pipelines do not process the documents in `_id` order, this scanner cannot resume a scan
+              partway through a collection; so it does not call `on_checkpoint`.
+        """
+        if resume_after is not None:
+            raise ValueError("This scanner cannot resume a scan partway through a collection.")
+
+        collection = self.db.get_collection(source_collection_name)
+        source_field_names = self.references.get_source_field_names_of_source_collection(source_collection_name)
+        self.num_documents_by_unknown_type.update(
+            self.count_documents_having_unknown_type(collection, source_collection_name, partition)
+        )
+
+        violations_and_sort_keys = []
+        for source_field_name in source_field_names:
+
+            # Determine which collections can contain the documents referenced by this field, for each `type` value
+            # of a source document that has this field.
+            target_collection_names_by_class_uri = self.get_target_collection_names_by_class_uri(source_field_name)
+            if len(target_collection_names_by_class_uri) == 0:
+                continue
+
+            pipeline = self.make_pipeline(source_field_name, target_collection_names_by_class_uri)
+            if partition is not None and partition.num_partitions > 1:
+                pipeline.insert(0, {"$match": partition.get_query_filter()})
+            if self.verbose:
+                console.print(f"{pipeline=}")
+
+            for result in collection.aggregate(pipeline, allowDiskUse=True):
+                source_class_name = self.scan_plans_by_class_uri[result["type"]].class_name
+                target_collection_names = target_collection_names_by_class_uri[result["type"]]
+                target_id = result["target_id"]
+                name_of_collection_containing_target_document = None
+                if self.locate_misplaced_documents:
+                    name_of_collection_containing_target_document = self.locate_misplaced_document(
+                        target_id=target_id, target_collection_names=target_collection_names
+                    )
+                violation = self.make_violation(
+                    source_collection_name=source_collection_name,
+                    document=result,
+                    source_class_name=source_class_name,
+                    source_field_name=source_field_name,
+                    target_collection_names=target_collection_names,
+                    target_id=target_id,
+                    name_of_collection_containing_target=name_of_collection_containing_target_document,
+                )
+
+                sort_key = self.make_violation_sort_key(
+                    result["_id"], source_class_name, source_field_name, result["target_id_index"]
+                )
+                violations_and_sort_keys.append((sort_key, violation))
+
+            if on_progress is not None:
+                on_progress(0, len(violations_and_sort_keys))
+
+        violations_and_sort_keys.sort(key=lambda item: item[0])
+        return ViolationList([violation for _, violation in violations_and_sort_keys])
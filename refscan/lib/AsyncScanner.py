@@ -0,0 +1,183 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Hashable, Optional, Tuple
+import asyncio
+
+from refscan.lib.Partition import Partition
+from refscan.lib.Scanner import Scanner, CheckpointCallback, ProgressCallback
+from refscan.lib.ViolationList import ViolationList
+
+
+class AsyncScanner(Scanner):
+    r"""
+    A scanner that uses `asyncio` to keep multiple lookups "in flight" at once while it reads the source documents,
+    so that the time it spends waiting for the MongoDB server to respond to one lookup overlaps with the time it spends
+    waiting for it to respond to others.
+
+    Note: The version of PyMongo this package depends upon has no `asyncio` API. So, each lookup is performed by the
+          (synchronous) `Finder`, in a thread belonging to a pool whose size matches the concurrency limit; and the
+          event loop schedules those lookups. PyMongo releases the GIL while it waits for the server to respond.
+          Reference: https://docs.python.org/3/library/asyncio-eventloop.html#asyncio.loop.run_in_executor
+
+    Note: The per-document logic (i.e. deriving the schema class, determining the target collections, and making the
+          `Violation`s) is the same as that of the synchronous scanner. Only the scheduling of the I/O differs.
+    """
+
+    def __init__(self, *args, concurrency: int = 64, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency  # maximum number of lookups in flight at once
+
+    def check_reference(
+        self,
+        target_id: str,
+        target_collection_names: tuple,
+        routing_key: Optional[Hashable] = None,
+        is_target_id_malformed: bool = False,
+    ) -> Tuple[bool, Optional[str]]:
+        r"""
+        Checks whether the document having the specified `id` exists in any of the specified target collections
+        (searching them in the order the finder deems best for the specified routing key).
+        Returns a `(was_found, name_of_collection_containing_target)` tuple; where, if the document was not found
+        and the user opted to locate misplaced documents, the latter is the name of the (ineligible) collection,
+        if any, in which the document was found instead.
+
+        :param is_target_id_malformed: Whether the `id` is known to be malformed; in which case, we know the document
+                                       doesn't exist in any of the target collections without searching them
+        """
+        if not is_target_id_malformed:
+            name_of_collection_containing_target_document = (
+                self.finder.check_whether_document_having_id_exists_among_collections(
+                    collection_names=list(target_collection_names), document_id=target_id, routing_key=routing_key
+                )
+            )
+            if name_of_collection_containing_target_document is not None:
+                return True, name_of_collection_containing_target_document
+        if self.locate_misplaced_documents:
+            return False, self.locate_misplaced_document(target_id, target_collection_names)
+        return False, None
+
+    def scan_collection(
+        self,
+        source_collection_name: str,
+        on_progress: Optional[ProgressCallback] = None,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+        on_checkpoint: Optional[CheckpointCallback] = None,
+    ) -> ViolationList:
+        r"""
+        Scans the relevant documents in the specified collection (or in the specified partition of it), and returns
+        a list of the violations found; in the same order in which the synchronous scanner would have found them.
+        """
+        return asyncio.run(
+            self._scan_collection(
+                source_collection_name,
+                on_progress=on_progress,
+                partition=partition,
+                resume_after=resume_after,
+                on_checkpoint=on_checkpoint,
+            )
+        )
+
+    async def _scan_collection(
+        self,
+        source_collection_name: str,
+        on_progress: Optional[ProgressCallback] = None,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+        on_checkpoint: Optional[CheckpointCallback] = None,
+    ) -> ViolationList:
+        r"""Coroutine that does the work of the `scan_collection` method."""
+        loop = asyncio.get_running_loop()
+        violations = ViolationList()
+        num_documents_recorded = 0
+
+        # Limit the number of lookups in flight at once. Once the limit has been reached, we stop reading source
+        # documents until one of the lookups finishes.
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        # Keep track of the documents whose lookups have been scheduled, but whose violations have not been recorded
+        # yet, in the order in which we read them. Each item is a `(document, source_class_name, lookups)` tuple;
+        # where each lookup is a `(field_name, target_collection_names, target_id, task)` tuple.
+        pending_documents = deque()
+
+        def record_violations_of_document(document, source_class_name, lookups) -> None:
+            for field_name, target_collection_names, target_id, task in lookups:
+                was_found, name_of_collection_containing_target_document = task.result()
+                if not was_found:
+                    violation = self.make_violation(
+                        source_collection_name=source_collection_name,
+                        document=document,
+                        source_class_name=source_class_name,
+                        source_field_name=field_name,
+                        target_collection_names=target_collection_names,
+                        target_id=target_id,
+                        name_of_collection_containing_target=name_of_collection_containing_target_document,
+                    )
+                    violations.append(violation)
+
+            # Report the document's contribution to the progress.
+            if on_progress is not None:
+                on_progress(1, len(violations))
+
+            # Report that the scan has gotten through this document, once per batch's worth of documents.
+            #
+            # Note: Since we record the violations of the documents in the order in which we read them, every document
+            #       preceding this one (in `_id` order, if the documents are sorted) has been processed, too.
+            #
+            nonlocal num_documents_recorded
+            num_documents_recorded += 1
+            if on_checkpoint is not None and num_documents_recorded % self.lookup_batch_size == 0:
+                on_checkpoint(document["_id"], num_documents_recorded, violations)
+
+        def record_violations_of_finished_documents() -> None:
+            r"""Records the violations of the leading pending documents whose lookups have all finished."""
+            while len(pending_documents) > 0 and all(lookup[3].done() for lookup in pending_documents[0][2]):
+                record_violations_of_document(*pending_documents.popleft())
+
+        # Note: We use a separate thread to read the source documents, so that reading them does not have to wait for
+        #       a lookup thread to become available.
+        with ThreadPoolExecutor(max_workers=1) as reader, ThreadPoolExecutor(max_workers=self.concurrency) as lookuper:
+
+            async def look_up(
+                target_id: str, target_collection_names: tuple, routing_key: Optional[Hashable], is_malformed: bool
+            ) -> Tuple[bool, Optional[str]]:
+                try:
+                    return await loop.run_in_executor(
+                        lookuper,
+                        partial(self.check_reference, target_id, target_collection_names, routing_key, is_malformed),
+                    )
+                finally:
+                    semaphore.release()
+
+            documents = self.find_relevant_documents(
+                source_collection_name, partition=partition, resume_after=resume_after
+            )
+            batches_of_documents = self.fetch_batches_of_documents(documents, source_collection_name)
+            while True:
+                batch_of_documents = await loop.run_in_executor(reader, next, batches_of_documents, None)
+                if batch_of_documents is None:
+                    break
+
+                for document in batch_of_documents:
+                    source_class_name, references_in_document = self.get_references_in_document(document)
+                    lookups = []
+                    for field_name, target_collection_names, target_ids in references_in_document:
+                        _, routing_key = self.make_lookup_key(source_class_name, field_name, target_collection_names)
+                        for target_id in target_ids:
+                            is_malformed = self.is_malformed_target_id(source_class_name, field_name, target_id)
+                            await semaphore.acquire()
+                            task = asyncio.ensure_future(
+                                look_up(target_id, target_collection_names, routing_key, is_malformed)
+                            )
+                            lookups.append((field_name, target_collection_names, target_id, task))
+                    pending_documents.append((document, source_class_name, lookups))
+                    record_violations_of_finished_documents()
+
+            # Wait for the remaining lookups to finish, then record the remaining violations (in document order).
+            while len(pending_documents) > 0:
+                document, source_class_name, lookups = pending_documents.popleft()
+                await asyncio.gather(*[lookup[3] for lookup in lookups])
+                record_violations_of_document(document, source_class_name, lookups)
+
+        return violations
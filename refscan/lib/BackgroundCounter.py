@@ -0,0 +1,81 @@
+from concurrent.futures import Future
+from typing import Callable, Set
+import queue
+import threading
+
+
+class BackgroundCounter:
+    r"""
+    A class that counts the relevant documents in collections, one collection at a time, in a background thread; so
+    that the scan of a collection can begin without waiting for the count, and the progress bar can show the count
+    once it is done.
+
+    Note: Once the scan of a collection is over, its count is no longer needed, so the caller abandons it (see
+          `abandon`). If the count has not started yet, it never will; and if it is underway, its result is ignored
+          (i.e. it is not reported via the count's callback, where it would overwrite the progress bar's final total).
+
+    Note: The thread is a daemon thread, so that a count that is still underway when the scan ends (e.g. a count of a
+          large collection, which the server is still working on) does not keep the program running. Once the counter
+          has been stopped, the result of such a count is ignored; so the caller can close the `MongoClient` without
+          waiting for it.
+          Reference: https://docs.python.org/3/library/threading.html#thread-objects
+    """
+
+    def __init__(self, count_documents: Callable[[str], int]):
+        self.count_documents = count_documents
+        self.pending_counts: queue.Queue = queue.Queue()
+
+        # Note: We report each count while holding this lock, so that, once `abandon` (or `stop`) has returned, the
+        #       callback of the count (or of any count) is not called.
+        self.lock = threading.Lock()
+        self.abandoned_futures: Set[Future] = set()
+        self.is_stopped = False
+
+        self.thread = threading.Thread(target=self._run, name="refscan-count", daemon=True)
+        self.thread.start()
+
+    def submit(self, collection_name: str, on_count: Callable[[int], None]) -> Future:
+        r"""
+        Queues a count of the relevant documents in the specified collection. Returns a `Future` of the count; and,
+        once the count is done (unless it has been abandoned), calls the specified function with it.
+        """
+        future: Future = Future()
+        self.pending_counts.put((collection_name, future, on_count))
+        return future
+
+    def abandon(self, future: Future) -> None:
+        r"""
+        Abandons the specified count; i.e. cancels it if it has not started yet, and otherwise ensures its result is
+        not reported via its callback.
+        """
+        with self.lock:
+            future.cancel()
+            self.abandoned_futures.add(future)
+
+    def stop(self) -> None:
+        r"""Abandons all counts, and tells the thread to stop once it has finished the count underway, if any."""
+        with self.lock:
+            self.is_stopped = True
+        while True:
+            try:
+                _, future, _ = self.pending_counts.get_nowait()
+                future.cancel()
+            except queue.Empty:
+                break
+        self.pending_counts.put(None)
+
+    def _run(self) -> None:
+        r"""Performs the queued counts, one at a time, until told to stop."""
+        while (item := self.pending_counts.get()) is not None:
+            collection_name, future, on_count = item
+            if not future.set_running_or_notify_cancel():
+                continue  # the count was abandoned before it started
+            try:
+                num_documents = self.count_documents(collection_name)
+            except Exception as exception:
+                future.set_exception(exception)
+                continue
+            with self.lock:
+                if not self.is_stopped and future not in self.abandoned_futures:
+                    on_count(num_documents)
+            future.set_result(num_documents)
@@ -0,0 +1,76 @@
+from hashlib import blake2b
+from typing import Iterable, Iterator
+import math
+
+
+class BloomFilter:
+    r"""
+    A probabilistic set of `id` values, which can tell us that a given `id` value is definitely _not_ in the set, or
+    that it _may_ be in the set.
+
+    Note: A Bloom filter never says "not in the set" about a value that was added to it (i.e. it has no false
+          negatives), but it can say "may be in the set" about a value that wasn't added to it (i.e. it has false
+          positives). The more bits it has per value added, the lower its false positive rate.
+          Reference: https://en.wikipedia.org/wiki/Bloom_filter
+
+    Note: We derive the positions of a value's bits from a single 128-bit hash of the value, via double hashing.
+          Reference: https://www.eecs.harvard.edu/~michaelm/postscripts/rsa2008.pdf
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int):
+        if num_bits < 1 or num_hashes < 1:
+            raise ValueError("A Bloom filter must have at least one bit and at least one hash function.")
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.num_ids = 0  # number of `id` values added to the filter
+        self.bits = bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float) -> "BloomFilter":
+        r"""
+        Returns an empty Bloom filter sized so that, once the specified number of `id` values have been added to it,
+        its false positive rate will be (approximately) the specified one.
+
+        Reference: https://en.wikipedia.org/wiki/Bloom_filter#Optimal_number_of_hash_functions
+        """
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("The false positive rate must be between 0 and 1.")
+        capacity = max(capacity, 1)
+        num_bits = math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits=num_bits, num_hashes=num_hashes)
+
+    def _get_bit_positions(self, document_id) -> Iterator[int]:
+        r"""Yields the positions of the bits that represent the specified `id` value."""
+        digest = blake2b(str(document_id).encode("utf-8"), digest_size=16).digest()
+        hash_1 = int.from_bytes(digest[:8], byteorder="little")
+        hash_2 = int.from_bytes(digest[8:], byteorder="little") | 1  # ensures the step is never zero
+        for i in range(self.num_hashes):
+            yield (hash_1 + i * hash_2) % self.num_bits
+
+    def add(self, document_id) -> None:
+        r"""Adds the specified `id` value to the filter."""
+        for position in self._get_bit_positions(document_id):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.num_ids += 1
+
+    def update(self, document_ids: Iterable) -> None:
+        r"""Adds the specified `id` values to the filter."""
+        for document_id in document_ids:
+            self.add(document_id)
+
+    def __contains__(self, document_id) -> bool:
+        r"""
+        Returns `False` if the specified `id` value is definitely not in the filter; or `True` if it may be.
+        """
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7)) for position in self._get_bit_positions(document_id)
+        )
+
+    def get_estimated_false_positive_rate(self) -> float:
+        r"""
+        Returns the estimated false positive rate of the filter, given the number of `id` values added to it.
+
+        Reference: https://en.wikipedia.org/wiki/Bloom_filter#Probability_of_false_positives
+        """
+        return (1 - math.exp(-self.num_hashes * self.num_ids / self.num_bits)) ** self.num_hashes
@@ -0,0 +1,127 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+import json
+import os
+
+from refscan.lib.BloomFilter import BloomFilter
+
+# The name and version of the format of the files in which we save Bloom filter indexes.
+FILE_FORMAT_NAME = "refscan-bloom-filters"
+FILE_FORMAT_VERSION = 1
+
+# The number of bytes we use to store the length of a file's (JSON) header.
+HEADER_LENGTH_SIZE_IN_BYTES = 8
+
+
+class BloomFilterIndex:
+    r"""
+    A set of Bloom filters, one per collection, each of which contains the `id` values of the documents in that
+    collection.
+
+    Note: The finder consults the index before querying a collection, and skips the query when the index says the
+          collection definitely doesn't contain a document having a given `id` (which, for references that lack
+          integrity, is the common case). Since a Bloom filter has no false negatives, this never hides a document
+          that the filter was built from.
+
+    Note: The index can be saved to a file, so that a later run on the same snapshot of the database can load it
+          instead of rebuilding it. Whoever loads it is responsible for checking (via the `metadata`) that it was
+          built from the same snapshot; since documents added after it was built would not be in its filters.
+    """
+
+    def __init__(self, false_positive_rate: float = 0.01, metadata: Optional[dict] = None):
+        self.false_positive_rate = false_positive_rate
+        self.metadata: dict = {} if metadata is None else metadata  # e.g. name of database the filters were built from
+        self.filters_by_collection_name: Dict[str, BloomFilter] = {}
+
+    def add_collection(self, collection_name: str, document_ids: Iterable, expected_num_ids: int) -> None:
+        r"""
+        Builds a Bloom filter containing the specified `id` values (in a single streaming pass over them), sized for
+        the expected number of `id` values, and adds it to the index as the filter of the specified collection.
+        """
+        bloom_filter = BloomFilter.for_capacity(expected_num_ids, self.false_positive_rate)
+        bloom_filter.update(document_ids)
+        self.filters_by_collection_name[collection_name] = bloom_filter
+
+    def has_collection(self, collection_name: str) -> bool:
+        r"""Returns `True` if the index has a Bloom filter for the specified collection."""
+        return collection_name in self.filters_by_collection_name
+
+    def may_contain(self, collection_name: str, document_id) -> bool:
+        r"""
+        Returns `False` if the specified collection definitely does not contain a document having the specified `id`;
+        or `True` if it may (including when the index has no Bloom filter for the collection).
+        """
+        bloom_filter = self.filters_by_collection_name.get(collection_name)
+        return bloom_filter is None or document_id in bloom_filter
+
+    def get_names_of_collections_that_may_contain_id(self, document_id, collection_names: List[str]) -> List[str]:
+        r"""
+        Returns the names of those of the specified collections (in the same order) that may contain a document having
+        the specified `id`.
+        """
+        return [name for name in collection_names if self.may_contain(name, document_id)]
+
+    def __len__(self) -> int:
+        r"""Returns the number of `id` values added to the index, among all collections."""
+        return sum(bloom_filter.num_ids for bloom_filter in self.filters_by_collection_name.values())
+
+    def get_size_in_bytes(self) -> int:
+        r"""Returns the amount of memory, in bytes, occupied by the bits of the index's Bloom filters."""
+        return sum(len(bloom_filter.bits) for bloom_filter in self.filters_by_collection_name.values())
+
+    def save(self, file_path: Union[str, Path]) -> None:
+        r"""
+        Saves the index to the specified file.
+
+        Note: The file consists of the length of a JSON header (as an 8-byte little-endian integer), the header
+              (which describes each filter), and the bits of each filter (in the order in which the header lists them).
+
+        Note: We write the index to a temporary file, then rename that file; so that, if the program is interrupted
+              while writing it, no partially-written index is left behind.
+        """
+        file_path = Path(file_path)
+        header = dict(
+            format=FILE_FORMAT_NAME,
+            version=FILE_FORMAT_VERSION,
+            false_positive_rate=self.false_positive_rate,
+            metadata=self.metadata,
+            filters=[
+                dict(
+                    collection_name=collection_name,
+                    num_bits=bloom_filter.num_bits,
+                    num_hashes=bloom_filter.num_hashes,
+                    num_ids=bloom_filter.num_ids,
+                )
+                for collection_name, bloom_filter in self.filters_by_collection_name.items()
+            ],
+        )
+        header_bytes = json.dumps(header).encode("utf-8")
+        temporary_file_path = file_path.with_name(f"{file_path.name}.tmp")
+        with open(temporary_file_path, "wb") as f:
+            f.write(len(header_bytes).to_bytes(HEADER_LENGTH_SIZE_IN_BYTES, byteorder="little"))
+            f.write(header_bytes)
+            for bloom_filter in self.filters_by_collection_name.values():
+                f.write(bloom_filter.bits)
+        os.replace(temporary_file_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: Union[str, Path]) -> "BloomFilterIndex":
+        r"""
+        Returns an index loaded from the specified file.
+        """
+        with open(file_path, "rb") as f:
+            header_length = int.from_bytes(f.read(HEADER_LENGTH_SIZE_IN_BYTES), byteorder="little")
+            header = json.loads(f.read(header_length).decode("utf-8"))
+            if header.get("format") != FILE_FORMAT_NAME or header.get("version") != FILE_FORMAT_VERSION:
+                raise ValueError(f"Not a version {FILE_FORMAT_VERSION} Bloom filter file: {file_path}")
+            index = cls(false_positive_rate=header["false_positive_rate"], metadata=header["metadata"])
+            for filter_description in header["filters"]:
+                bloom_filter = BloomFilter(
+                    num_bits=filter_description["num_bits"], num_hashes=filter_description["num_hashes"]
+                )
+                bloom_filter.num_ids = filter_description["num_ids"]
+                bloom_filter.bits = bytearray(f.read(len(bloom_filter.bits)))
+                if len(bloom_filter.bits) != (bloom_filter.num_bits + 7) // 8:
+                    raise ValueError(f"Bloom filter file is truncated: {file_path}")
+                index.filters_by_collection_name[filter_description["collection_name"]] = bloom_filter
+        return index
@@ -0,0 +1,129 @@
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import os
+import time
+
+from bson import json_util
+
+from refscan.lib.Violation import Violation
+from refscan.lib.ViolationList import ViolationList
+
+
+class Checkpoint:
+    r"""
+    The state of a scan that is in progress; which can be saved to a file, so that the scan can be resumed later
+    (e.g. after the program has been interrupted).
+
+    Note: We serialize the state as MongoDB Extended JSON, so that `_id` values (e.g. `ObjectId`s) and referenced
+          `id` values survive the round trip with their types intact.
+          Reference: https://pymongo.readthedocs.io/en/stable/api/bson/json_util.html
+    """
+
+    def __init__(self, file_path: Union[str, Path], scan_parameters: dict, save_interval_in_seconds: float = 60):
+        self.file_path = Path(file_path)
+        self.save_interval_in_seconds = save_interval_in_seconds
+        self.time_of_last_save = time.monotonic()
+
+        # Parameters that have to be the same when the scan is resumed as when it began (e.g. the database name).
+        self.scan_parameters = scan_parameters
+
+        # The state of the scan.
+        self.names_of_completed_collections: List[str] = []
+        self.last_object_id_by_collection_name: Dict[str, Any] = {}  # `_id` of last document processed
+        self.num_documents_scanned_by_collection_name: Dict[str, int] = {}
+        self.violations_by_collection_name: Dict[str, ViolationList] = {}
+
+    def record_progress(
+        self, collection_name: str, last_object_id: Any, num_documents_scanned: int, violations: List[Violation]
+    ) -> None:
+        r"""
+        Records that the documents in the specified collection have been scanned, up to and including the one having
+        the specified `_id`; and that the specified violations have been found in the collection so far.
+        """
+        self.last_object_id_by_collection_name[collection_name] = last_object_id
+        self.num_documents_scanned_by_collection_name[collection_name] = num_documents_scanned
+        self.violations_by_collection_name[collection_name] = ViolationList(violations)
+
+    def mark_collection_complete(
+        self, collection_name: str, num_documents_scanned: int, violations: List[Violation]
+    ) -> None:
+        r"""
+        Records that all the relevant documents in the specified collection have been scanned, and that the specified
+        violations were found in it.
+        """
+        self.last_object_id_by_collection_name.pop(collection_name, None)
+        self.num_documents_scanned_by_collection_name[collection_name] = num_documents_scanned
+        self.violations_by_collection_name[collection_name] = ViolationList(violations)
+        if collection_name not in self.names_of_completed_collections:
+            self.names_of_completed_collections.append(collection_name)
+
+    def is_collection_complete(self, collection_name: str) -> bool:
+        r"""Returns `True` if all the relevant documents in the specified collection have been scanned."""
+        return collection_name in self.names_of_completed_collections
+
+    def save(self) -> None:
+        r"""
+        Saves the checkpoint to its file.
+
+        Note: We write the checkpoint to a temporary file, then rename that file; so that, if the program is
+              interrupted while writing it, the previously-saved checkpoint remains intact.
+        """
+        state = dict(
+            scan_parameters=self.scan_parameters,
+            names_of_completed_collections=self.names_of_completed_collections,
+            last_object_id_by_collection_name=self.last_object_id_by_collection_name,
+            num_documents_scanned_by_collection_name=self.num_documents_scanned_by_collection_name,
+            violations_by_collection_name={
+                collection_name: [asdict(violation) for violation in violations]
+                for collection_name, violations in self.violations_by_collection_name.items()
+            },
+        )
+        temporary_file_path = self.file_path.with_name(f"{self.file_path.name}.tmp")
+        with open(temporary_file_path, "w") as f:
+            f.write(json_util.dumps(state))
+        os.replace(temporary_file_path, self.file_path)
+        self.time_of_last_save = time.monotonic()
+
+    def is_save_due(self) -> bool:
+        r"""Returns `True` if the save interval has elapsed since the checkpoint was last saved."""
+        return time.monotonic() - self.time_of_last_save >= self.save_interval_in_seconds
+
+    def delete(self) -> None:
+        r"""Deletes the checkpoint's file, if it exists."""
+        self.file_path.unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, file_path: Union[str, Path], save_interval_in_seconds: float = 60) -> "Checkpoint":
+        r"""
+        Returns a checkpoint loaded from the specified file.
+        """
+        with open(file_path, "r") as f:
+            state = json_util.loads(f.read())
+        checkpoint = cls(
+            file_path=file_path,
+            scan_parameters=state["scan_parameters"],
+            save_interval_in_seconds=save_interval_in_seconds,
+        )
+        checkpoint.names_of_completed_collections = state["names_of_completed_collections"]
+        checkpoint.last_object_id_by_collection_name = state["last_object_id_by_collection_name"]
+        checkpoint.num_documents_scanned_by_collection_name = state["num_documents_scanned_by_collection_name"]
+        checkpoint.violations_by_collection_name = {
+            collection_name: ViolationList([Violation(**violation) for violation in violations])
+            for collection_name, violations in state["violations_by_collection_name"].items()
+        }
+        return checkpoint
+
+    def get_mismatched_scan_parameter_names(self, scan_parameters: dict) -> List[str]:
+        r"""
+        Returns the names of the scan parameters whose values differ from those recorded in the checkpoint.
+        """
+        names = sorted(set(self.scan_parameters) | set(scan_parameters))
+        return [name for name in names if self.scan_parameters.get(name) != scan_parameters.get(name)]
+
+    def get_resume_point(self, collection_name: str) -> Optional[Any]:
+        r"""
+        Returns the `_id` of the last document processed in the specified collection, if any; so that the scan of
+        that collection can resume after it.
+        """
+        return self.last_object_id_by_collection_name.get(collection_name)
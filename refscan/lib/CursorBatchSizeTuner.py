@@ -0,0 +1,67 @@
+from typing import Dict, Optional
+
+# The amount of time we want the database to take to send each batch of documents. Longer batches amortize the
+# latency of each round trip over more documents; shorter ones keep the prefetch queue (if any) filling steadily.
+TARGET_SECONDS_PER_BATCH = 0.25
+
+# The maximum amount of data we want each batch of documents to contain.
+#
+# Note: The MongoDB server limits each batch to 16 MiB, regardless of the batch size the client requests.
+#       Reference: https://www.mongodb.com/docs/manual/tutorial/iterate-a-cursor/#cursor-batches
+#
+TARGET_BYTES_PER_BATCH = 4 * 1024 * 1024
+
+# The range of batch sizes (numbers of documents) the tuner will recommend.
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 100_000
+
+
+class CursorBatchSizeTuner:
+    r"""
+    A class that recommends the batch size (i.e. the number of documents per round trip) for the database cursors the
+    scanner opens, based upon the sizes of the documents and the fetch latency it has observed so far.
+
+    Note: A cursor's batch size cannot be changed once the cursor has started returning documents, so the tuner's
+          recommendations apply to the _next_ cursor the scanner opens (e.g. for the next partition of a collection,
+          or for the next collection). The tuner tracks document sizes per collection (since they vary between
+          collections), but tracks latency per document among all collections (since it mostly depends upon the
+          connection to the server); so that, for a collection it has not seen yet, it can still make a
+          recommendation based on latency alone. Until it has observed anything, it defers to the driver's default.
+    """
+
+    def __init__(self):
+        self.num_documents = 0
+        self.num_seconds = 0.0
+        self.num_sampled_documents_by_collection_name: Dict[str, int] = {}
+        self.num_sampled_bytes_by_collection_name: Dict[str, int] = {}
+
+    def record_batch(self, num_documents: int, num_seconds: float) -> None:
+        r"""Records that fetching the specified number of documents took the specified number of seconds."""
+        self.num_documents += num_documents
+        self.num_seconds += num_seconds
+
+    def record_document_size(self, collection_name: str, num_bytes: int) -> None:
+        r"""Records the (BSON) size of a document fetched from the specified collection."""
+        self.num_sampled_documents_by_collection_name[collection_name] = (
+            self.num_sampled_documents_by_collection_name.get(collection_name, 0) + 1
+        )
+        self.num_sampled_bytes_by_collection_name[collection_name] = (
+            self.num_sampled_bytes_by_collection_name.get(collection_name, 0) + num_bytes
+        )
+
+    def get_batch_size(self, collection_name: str) -> Optional[int]:
+        r"""
+        Returns the batch size the tuner recommends for a cursor over the specified collection; or `None` if it has
+        not observed enough to make a recommendation.
+        """
+        candidate_batch_sizes = []
+        if self.num_documents > 0 and self.num_seconds > 0:
+            seconds_per_document = self.num_seconds / self.num_documents
+            candidate_batch_sizes.append(TARGET_SECONDS_PER_BATCH / seconds_per_document)
+        num_sampled_documents = self.num_sampled_documents_by_collection_name.get(collection_name, 0)
+        if num_sampled_documents > 0:
+            bytes_per_document = self.num_sampled_bytes_by_collection_name[collection_name] / num_sampled_documents
+            candidate_batch_sizes.append(TARGET_BYTES_PER_BATCH / max(bytes_per_document, 1))
+        if len(candidate_batch_sizes) == 0:
+            return None
+        return max(MIN_BATCH_SIZE, min(MAX_BATCH_SIZE, int(min(candidate_batch_sizes))))
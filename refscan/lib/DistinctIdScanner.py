@@ -0,0 +1,224 @@
+from typing import Any, Hashable, List, Optional
+
+from pymongo.collection import Collection
+
+from refscan.lib.AggregationScanner import AggregationScanner
+from refscan.lib.Partition import Partition
+from refscan.lib.Scanner import CheckpointCallback, ProgressCallback
+from refscan.lib.ViolationList import ViolationList
+from refscan.lib.constants import console
+from refscan.lib.helpers import split_into_batches
+
+
+class DistinctIdScanner(AggregationScanner):
+    r"""
+    A scanner that checks references in three phases, for each source field (and each combination of collections
+    in which the schema allows the documents referenced by that field to exist):
+    1. Have the MongoDB server collect the _distinct_ `id` values referenced by that field (via `$unwind`/`$group`).
+    2. Check whether the documents having those `id`s exist, in bulk (via the `Finder`).
+    3. Fetch only the source documents that reference the `id`s whose documents were not found.
+
+    Note: When many source documents reference the same few target documents (e.g. thousands of biosamples
+          referencing one study), this makes the cost of the scan proportional to the number of distinct targets
+          instead of to the number of references.
+
+    Note: The scanner reports the violations in each collection in `_id` order (not in natural order).
+    """
+
+    def get_distinct_target_ids(
+        self, collection: Collection, source_field_name: str, class_uris: List[str], partition: Optional[Partition]
+    ) -> list:
+        r"""
+        Returns the distinct values in the specified field of the documents (in the specified collection, or in the
+        specified partition of it) whose `type` is among those specified.
+
+        Reference: https://www.mongodb.com/docs/manual/reference/operator/aggregation/group/
+        """
+        pipeline = self.make_unwind_stages(source_field_name, class_uris)
+        pipeline.append({"$group": {"_id": "$target_id"}})
+        if partition is not None and partition.num_partitions > 1:
+            pipeline.insert(0, {"$match": partition.get_query_filter()})
+        if self.verbose:
+            console.print(f"{pipeline=}")
+        return [result["_id"] for result in collection.aggregate(pipeline, allowDiskUse=True)]
+
+    def get_missing_target_ids(
+        self, target_ids: list, target_collection_names: tuple, routing_key: Optional[Hashable] = None
+    ) -> list:
+        r"""
+        Returns the subset of the specified `id` values for which no document having that `id` exists in any of the
+        specified collections (which the finder searches in the order it deems best for the specified routing key).
+        """
+        hashable_target_ids = [target_id for target_id in target_ids if isinstance(target_id, Hashable)]
+        name_of_collection_containing_target_document_by_id = self.finder.find_collections_containing_documents(
+            document_ids=hashable_target_ids, collection_names=list(target_collection_names), routing_key=routing_key
+        )
+        missing_target_ids = [
+            target_id
+            for target_id in hashable_target_ids
+            if name_of_collection_containing_target_document_by_id[target_id] is None
+        ]
+
+        # Note: A value that isn't hashable (e.g. a dictionary) can't be used as a dictionary key, so we look up the
+        #       target of such a reference by itself.
+        for target_id in target_ids:
+            if not isinstance(target_id, Hashable):
+                if (
+                    self.finder.check_whether_document_having_id_exists_among_collections(
+                        collection_names=list(target_collection_names), document_id=target_id, routing_key=routing_key
+                    )
+                    is None
+                ):
+                    missing_target_ids.append(target_id)
+
+        return missing_target_ids
+
+    def scan_collection(
+        self,
+        source_collection_name: str,
+        on_progress: Optional[ProgressCallback] = None,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+        on_checkpoint: Optional[CheckpointCallback] = None,
+    ) -> ViolationList:
+        r"""
+        Scans the relevant documents in the specified collection (or in the specified partition of it), and returns
+        a list of the violations found.
+
+        Note: Like the `AggregationScanner`, this scanner cannot resume a scan partway through a collection; so it
+              does not call `on_checkpoint`.
+        """
+        if resume_after is not None:
+            raise ValueError("This scanner cannot resume a scan partway through a collection.")
+
+        collection = self.db.get_collection(source_collection_name)
+        source_field_names = self.references.get_source_field_names_of_source_collection(source_collection_name)
+        _, query_projection = self.get_query_filter_and_projection(source_collection_name)
+
+        # Note: Like the `AggregationScanner`'s pipelines, the phases below only match documents whose `type` values
+        #       correspond to schema classes; so, we count the others separately.
+        self.num_documents_by_unknown_type.update(
+            self.count_documents_having_unknown_type(collection, source_collection_name, partition)
+        )
+
+        violations_and_sort_keys = []
+        for source_field_name in source_field_names:
+
+            # Group the `type` values of the source documents that can have this field, by the combination of
+            # collections in which the schema allows the documents referenced by the field to exist.
+            target_collection_names_by_class_uri = self.get_target_collection_names_by_class_uri(source_field_name)
+            class_uris_by_target_collection_names = {}
+            for class_uri, target_collection_names in target_collection_names_by_class_uri.items():
+                class_uris_by_target_collection_names.setdefault(target_collection_names, []).append(class_uri)
+
+            for target_collection_names, class_uris in sorted(class_uris_by_target_collection_names.items()):
+
+                # Phases 1 and 2: Collect the distinct `id`s referenced by this field, and check them in bulk.
+                distinct_target_ids = self.get_distinct_target_ids(collection, source_field_name, class_uris, partition)
+                source_class_names = tuple(
+                    sorted(set(self.scan_plans_by_class_uri[uri].class_name for uri in class_uris))
+                )
+                _, routing_key = self.make_lookup_key(source_class_names, source_field_name, target_collection_names)
+
+                # If the user opted to validate target `id`s, set aside the ones that are malformed (for any of the
+                # source classes), and only look up the ones that are well-formed for at least one of them.
+                #
+                # Note: Documents of the classes for which an `id` is malformed reference a missing document, whether
+                #       or not a document having that `id` exists; so, we fetch the source documents referencing it
+                #       in phase 3, either way.
+                #
+                malformed_target_ids = []
+                target_ids_to_look_up = []
+                for target_id in distinct_target_ids:
+                    is_malformed_by_source_class = [
+                        self.is_malformed_target_id(name, source_field_name, target_id) for name in source_class_names
+                    ]
+                    if any(is_malformed_by_source_class):
+                        malformed_target_ids.append(target_id)
+                    if not all(is_malformed_by_source_class):
+                        target_ids_to_look_up.append(target_id)
+                missing_target_ids = self.get_missing_target_ids(
+                    target_ids_to_look_up, target_collection_names, routing_key=routing_key
+                )
+                if self.verbose:
+                    console.print(
+                        f"{source_collection_name}.{source_field_name}: {len(distinct_target_ids)} distinct ids "
+                        f"referenced; {len(malformed_target_ids)} malformed; {len(missing_target_ids)} not found "
+                        f"among collections: {list(target_collection_names)}"
+                    )
+                missing_hashable_target_ids = set(
+                    target_id for target_id in missing_target_ids if isinstance(target_id, Hashable)
+                )
+                for target_id in malformed_target_ids:
+                    is_already_missing = (
+                        target_id in missing_hashable_target_ids
+                        if isinstance(target_id, Hashable)
+                        else target_id in missing_target_ids
+                    )
+                    if not is_already_missing:
+                        missing_target_ids.append(target_id)
+                if len(missing_target_ids) == 0:
+                    continue
+
+                # Phase 3: Fetch the source documents that reference the `id`s whose documents were not found.
+                #
+                # Note: A source document that references multiple missing `id`s can be fetched once per batch of
+                #       `id`s, so we keep track of the documents we've already processed.
+                #
+                object_ids_of_processed_documents = set()
+                name_of_collection_containing_target_document_by_missing_target_id = {}
+                for batch_of_target_ids in split_into_batches(missing_target_ids, self.finder.max_ids_per_query):
+                    query_filter = {source_field_name: {"$in": batch_of_target_ids}, "type": {"$in": class_uris}}
+                    if partition is not None and partition.num_partitions > 1:
+                        query_filter = {"$and": [query_filter, partition.get_query_filter()]}
+                    for document in collection.find(query_filter, projection=query_projection):
+                        if document["_id"] in object_ids_of_processed_documents:
+                            continue
+                        object_ids_of_processed_documents.add(document["_id"])
+
+                        source_class_name, references_in_document = self.get_references_in_document(document)
+                        for field_name, _, target_ids in references_in_document:
+                            if field_name != source_field_name:
+                                continue
+                            for target_id_index, target_id in enumerate(target_ids):
+                                if self.is_malformed_target_id(source_class_name, source_field_name, target_id):
+                                    is_missing = True
+                                elif isinstance(target_id, Hashable):
+                                    is_missing = target_id in missing_hashable_target_ids
+                                else:
+                                    is_missing = target_id in missing_target_ids
+                                if not is_missing:
+                                    continue
+
+                                # Note: We only search for a given misplaced document once, no matter how many
+                                #       source documents reference it.
+                                name_of_collection_containing_target_document = None
+                                if self.locate_misplaced_documents:
+                                    cache = name_of_collection_containing_target_document_by_missing_target_id
+                                    if isinstance(target_id, Hashable) and target_id in cache:
+                                        name_of_collection_containing_target_document = cache[target_id]
+                                    else:
+                                        name_of_collection_containing_target_document = self.locate_misplaced_document(
+                                            target_id=target_id, target_collection_names=target_collection_names
+                                        )
+                                        if isinstance(target_id, Hashable):
+                                            cache[target_id] = name_of_collection_containing_target_document
+                                violation = self.make_violation(
+                                    source_collection_name=source_collection_name,
+                                    document=document,
+                                    source_class_name=source_class_name,
+                                    source_field_name=source_field_name,
+                                    target_collection_names=target_collection_names,
+                                    target_id=target_id,
+                                    name_of_collection_containing_target=name_of_collection_containing_target_document,
+                                )
+                                sort_key = self.make_violation_sort_key(
+                                    document["_id"], source_class_name, source_field_name, target_id_index
+                                )
+                                violations_and_sort_keys.append((sort_key, violation))
+
+            if on_progress is not None:
+                on_progress(0, len(violations_and_sort_keys))
+
+        violations_and_sort_keys.sort(key=lambda item: item[0])
+        return ViolationList([violation for _, violation in violations_and_sort_keys])
@@ -0,0 +1,98 @@
+from collections import Counter
+from typing import Iterable, Iterator, Optional
+import queue
+import threading
+import time
+
+# The number of seconds the producer waits for room in the queue before checking whether the consumer has gone away.
+PUT_TIMEOUT_IN_SECONDS = 0.1
+
+
+class _ProducerFailure:
+    r"""A wrapper around an exception raised by the producer, which the consumer re-raises."""
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+# A value the producer puts in the queue once it has put everything else in it.
+_END_OF_ITEMS = object()
+
+
+class DocumentPrefetcher:
+    r"""
+    An iterator that reads items (e.g. batches of documents) from another iterator (e.g. one that reads them from a
+    database cursor) in a background thread, keeping up to `queue_depth` of them in a bounded queue; so that the
+    database can be sending the next items while the consumer is still processing the current one.
+
+    Note: The prefetcher records the following statistics in the `stats` counter:
+          - `prefetch_stall_seconds`: time the consumer spent waiting for the queue to have an item in it
+          - `prefetch_producer_wait_seconds`: time the producer spent waiting for the queue to have room in it
+          - `prefetch_queue_depth_total`: sum of the queue's depth each time the consumer took an item from it
+          - `prefetch_items`: number of items the consumer took from the queue
+          Dividing the total queue depth by the number of items gives the average depth of the queue. If the queue
+          is usually empty, the database is the bottleneck; if it is usually full, the consumer is.
+
+    Note: If the consumer stops iterating before the producer is done (e.g. due to an exception), closing the
+          iteration (which happens automatically when the generator is garbage collected) stops the producer.
+    """
+
+    def __init__(self, items: Iterable, queue_depth: int, stats: Optional[Counter] = None):
+        if queue_depth < 1:
+            raise ValueError("The queue depth must be at least 1.")
+        self.items = items
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_depth)
+        self.stats = Counter() if stats is None else stats
+        self.is_stopping = threading.Event()
+        self.thread = threading.Thread(target=self._produce, name="refscan-prefetcher", daemon=True)
+        self.thread.start()
+
+    def _put(self, item) -> bool:
+        r"""
+        Puts the specified item in the queue, waiting for room in it if necessary. Returns `False` if the prefetcher
+        was closed while the producer was waiting.
+        """
+        wait_start_time = time.perf_counter()
+        try:
+            while not self.is_stopping.is_set():
+                try:
+                    self.queue.put(item, timeout=PUT_TIMEOUT_IN_SECONDS)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.stats["prefetch_producer_wait_seconds"] += time.perf_counter() - wait_start_time
+
+    def _produce(self) -> None:
+        r"""Reads items from the underlying iterator into the queue (this runs in the background thread)."""
+        try:
+            for item in self.items:
+                if not self._put(item):
+                    return
+        except BaseException as exception:  # e.g. a network error, which we let the consumer handle
+            self._put(_ProducerFailure(exception))
+            return
+        self._put(_END_OF_ITEMS)
+
+    def __iter__(self) -> Iterator:
+        try:
+            while True:
+                queue_depth = self.queue.qsize()
+                stall_start_time = time.perf_counter()
+                item = self.queue.get()
+                self.stats["prefetch_stall_seconds"] += time.perf_counter() - stall_start_time
+                if item is _END_OF_ITEMS:
+                    break
+                if isinstance(item, _ProducerFailure):
+                    raise item.exception
+                self.stats["prefetch_queue_depth_total"] += queue_depth
+                self.stats["prefetch_items"] += 1
+                yield item
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        r"""Stops the producer (if it is still running) and waits for its thread to end."""
+        self.is_stopping.set()
+        self.thread.join()
@@ -1,62 +1,346 @@
-from typing import List, Optional
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional
+import threading
 
 from pymongo.database import Database
 
+from refscan.lib.BloomFilterIndex import BloomFilterIndex
+from refscan.lib.IdIndex import IdIndex
+from refscan.lib.IdPrefixRouter import IdPrefixRouter
+
+# A value we use to distinguish "this result is not in the cache" from a cached result of `None` (i.e. "missing").
+_NOT_CACHED = object()
+
 
 class Finder:
     r"""
     A class that can be used to find a document in a MongoDB database,
     in a way that uses past searches to try to speed up future searches.
+
+    Note: Callers can pass a "routing key" to the search methods, identifying the kind of reference whose target is
+          being searched for (e.g. a `(source_class_name, source_field_name)` tuple). The finder keeps track of which
+          collections the documents targeted by each kind of reference have been found in, and searches the
+          collections in which they have been found most often first.
     """
 
-    def __init__(self, database: Database):
+    def __init__(
+        self,
+        database: Database,
+        max_ids_per_query: int = 1000,
+        id_index: Optional[IdIndex] = None,
+        result_cache_size: int = 0,
+        id_prefix_router: Optional[IdPrefixRouter] = None,
+        bloom_filter_index: Optional[BloomFilterIndex] = None,
+    ):
         self.db = database
 
-        # Initialize a variable we can use to keep track of the collections in which we most recently found targeted
-        # documents.
+        # If we were given an in-memory index of `id` values, we will consult it instead of the database, whenever
+        # it contains the `id` values of all the collections we are asked to search.
+        self.id_index = id_index
+
+        # Initialize a dictionary we can use to keep track of how many targeted documents we have found in each
+        # collection, for each routing key (e.g. `{("Biosample", "associated_studies"): {"study_set": 123}}`).
+        #
+        # Note: This will enable us to _start_ searching in the collections most likely to contain the documents
+        #       targeted by a given kind of reference, instead of in collections that only held the documents targeted
+        #       by some unrelated kind of reference.
+        #
+        # Note: We guard the dictionary with a lock, since the asynchronous scanner calls the finder from multiple
+        #       threads (and sorting by counts that another thread is updating would be unsafe).
+        #
+        self.num_documents_found_by_routing_key: Dict[Optional[Hashable], Counter] = {}
+        self.routing_lock = threading.Lock()
+
+        # Limit the number of `id` values we put into the `$in` operator of a single query, so that no query
+        # approaches the maximum BSON document size (which is 16 MiB).
+        self.max_ids_per_query = max_ids_per_query
+
+        # Initialize a least-recently-used (LRU) cache of the results of past searches, so that we don't search the
+        # database for a popular document (e.g. a study referenced by thousands of biosamples) again and again.
+        #
+        # Note: Each key is a `(collection_names, document_id)` tuple, where `collection_names` is the (frozen) set of
+        #       collections that were searched; since whether (and where) a document was found depends upon which
+        #       collections were searched. Each value is the name of the collection the document was found in, or
+        #       `None` if the document was not found in any of them (we cache those negative results, too).
+        #
+        # Note: We guard the cache with a lock, since the asynchronous scanner calls the finder from multiple threads.
+        #
+        self.result_cache_size = result_cache_size  # maximum number of results to cache (0 means "don't cache")
+        self.result_cache: OrderedDict = OrderedDict()
+        self.result_cache_lock = threading.Lock()
+
+        # If we were given a router that predicts which collection contains a document based upon its `id`'s prefix,
+        # we will search the predicted collection first (or, if the router is exclusive and certain, only it).
+        self.id_prefix_router = id_prefix_router
+
+        # If we were given per-collection Bloom filters, we will not search a collection for a document whose `id`
+        # the collection's filter says is definitely not in it.
+        self.bloom_filter_index = bloom_filter_index
+
+        # Keep track of how many `id` values we were asked to look up ("lookups"), however we answered (e.g. via the
+        # database, the cache, or an index); how many results we got from the cache ("cache_hits"), how many we had to
+        # search the database for because they weren't in the cache ("cache_misses"), how many queries we sent to the
+        # database ("queries"), and how many times we skipped searching a collection for an `id` because its Bloom
+        # filter said the `id` was definitely not in it ("bloom_filter_skips").
         #
-        # Note: This will enable us to _start_ searching in these same collections next time.
+        # Note: We guard the counters with a lock, since the finder can be called from multiple threads (e.g. by the
+        #       asynchronous scanner, or when using lookup threads); and incrementing a counter is a read-modify-write
+        #       operation, so concurrent increments could otherwise be lost.
         #
-        self.names_of_collections_most_recently_found_in = []
-        self.cache_size = 2  # we'll cache up to 2 collection names
+        self.stats: Counter = Counter()
+        self.stats_lock = threading.Lock()
+
+    def _increment_stat(self, name: str, amount: int = 1) -> None:
+        r"""Adds the specified amount to the specified counter in `stats`."""
+        with self.stats_lock:
+            self.stats[name] += amount
+
+    def _get_names_of_collections_in_search_order(
+        self, collection_names: List[str], routing_key: Optional[Hashable] = None
+    ) -> List[str]:
+        r"""
+        Returns a copy of the specified list of collection names, reordered so that the collections in which we have
+        found the most documents targeted via the specified routing key are at the front.
+
+        Note: Since every document targeted via a given routing key is searched for in the same collections, sorting
+              the collections by the number of documents found in them is the same as sorting them by hit rate.
+              Collections having the same number (e.g. before any documents have been found) keep their given order.
+        """
+        with self.routing_lock:
+            num_documents_found = self.num_documents_found_by_routing_key.get(routing_key)
+            if num_documents_found is None:
+                return list(collection_names)
+            return sorted(collection_names, key=lambda name: num_documents_found[name], reverse=True)
+
+    def _record_documents_found(self, collection_name: str, num_documents: int, routing_key: Optional[Hashable]):
+        r"""
+        Records that we found the specified number of documents, targeted via the specified routing key, in the
+        specified collection.
+        """
+        with self.routing_lock:
+            self.num_documents_found_by_routing_key.setdefault(routing_key, Counter())[collection_name] += num_documents
+
+    def _get_cached_result(self, collection_names: frozenset, document_id: Hashable):
+        r"""
+        Returns the cached result of searching the specified collections for the document having the specified `id`;
+        or `_NOT_CACHED` if there is no such result in the cache.
+        """
+        key = (collection_names, document_id)
+        with self.result_cache_lock:
+            result = self.result_cache.get(key, _NOT_CACHED)
+            if result is _NOT_CACHED:
+                self._increment_stat("cache_misses")
+            else:
+                self.result_cache.move_to_end(key)  # marks it as the most recently used result
+                self._increment_stat("cache_hits")
+        return result
+
+    def _cache_result(self, collection_names: frozenset, document_id: Hashable, result: Optional[str]) -> None:
+        r"""
+        Caches the result of searching the specified collections for the document having the specified `id`,
+        evicting the least recently used result if the cache is full.
+        """
+        with self.result_cache_lock:
+            self.result_cache[(collection_names, document_id)] = result
+            self.result_cache.move_to_end((collection_names, document_id))
+            if len(self.result_cache) > self.result_cache_size:
+                self.result_cache.popitem(last=False)
 
     def check_whether_document_having_id_exists_among_collections(
-        self, document_id: str, collection_names: List[str]
+        self, document_id: str, collection_names: List[str], routing_key: Optional[Hashable] = None
     ) -> Optional[str]:
         r"""
         Checks whether any document in any of the specified collections has the specified value in its `id` field.
         Returns the name of the first collection, if any, containing such a document. If none of the collections
         contain such a document, the function returns `None`.
 
+        :param routing_key: Identifies the kind of reference whose target is being searched for (see class docstring)
+
         References:
         - https://pymongo.readthedocs.io/en/stable/api/pymongo/collection.html#pymongo.collection.Collection.find_one
         """
-        names_of_collections_to_search = collection_names.copy()
+        self._increment_stat("lookups")
 
-        # Make a concise alias.
-        cache = self.names_of_collections_most_recently_found_in
+        # If we have an index of the `id` values of these collections, consult it instead of the database.
+        #
+        # Note: A value that isn't hashable (e.g. a dictionary) can't be in the index (whose `id` values are hashed or
+        #       kept in sets), so we search the database for such values, like we would without an index.
+        #
+        if (
+            self.id_index is not None
+            and isinstance(document_id, Hashable)
+            and self.id_index.has_collections(collection_names)
+        ):
+            return self.id_index.find_collection_containing_id(document_id, collection_names)
+
+        # If we have already searched these collections for this document, return the cached result.
+        #
+        # Note: A value that isn't hashable (e.g. a dictionary) can't be used as a dictionary key, so we don't cache
+        #       the results of searches for such values.
+        #
+        is_cacheable = self.result_cache_size > 0 and isinstance(document_id, Hashable)
+        if is_cacheable:
+            cached_result = self._get_cached_result(frozenset(collection_names), document_id)
+            if cached_result is not _NOT_CACHED:
+                return cached_result
 
-        # If any cached collection name is among the ones eligible to search, move it to the front of list.
-        for cached_collection_name in reversed(cache):  # goes in reverse, so latest addition ends up in front
-            if cached_collection_name in collection_names:
-                names_of_collections_to_search.remove(cached_collection_name)
-                names_of_collections_to_search.insert(0, cached_collection_name)  # makes it the first item
+        names_of_collections_to_search = self._get_names_of_collections_in_search_order(collection_names, routing_key)
+        if self.id_prefix_router is not None:
+            names_of_collections_to_search = self.id_prefix_router.get_names_of_collections_to_search(
+                document_id, names_of_collections_to_search
+            )
+        if self.bloom_filter_index is not None:
+            names_of_collections_that_may_contain_document = (
+                self.bloom_filter_index.get_names_of_collections_that_may_contain_id(
+                    document_id, names_of_collections_to_search
+                )
+            )
+            self._increment_stat(
+                "bloom_filter_skips",
+                len(names_of_collections_to_search) - len(names_of_collections_that_may_contain_document),
+            )
+            names_of_collections_to_search = names_of_collections_that_may_contain_document
 
         # Search the collections in their current order.
         name_of_collection_containing_target_document = None
         query_filter = dict(id=document_id)
         for collection_name in names_of_collections_to_search:
 
-            # If we found the document, cache the collection name and stop searching.
+            # If we found the document, record where we found it and stop searching.
+            self._increment_stat("queries")
             if self.db.get_collection(collection_name).find_one(query_filter, projection=["_id"]) is not None:
                 name_of_collection_containing_target_document = collection_name
-
-                # Put this collection name at the front/start of the cache.
-                if len(cache) == 0 or cache[0] != collection_name:
-                    if collection_name in cache:  # if it's elsewhere in the cache, remove it from the cache
-                        cache.remove(collection_name)
-                    cache = [collection_name] + cache[0 : self.cache_size - 1]  # prepends item, dropping any excess
-                    self.names_of_collections_most_recently_found_in = cache  # persists it to the instance attribute
+                self._record_documents_found(collection_name, 1, routing_key)
                 break
 
+        if is_cacheable:
+            self._cache_result(frozenset(collection_names), document_id, name_of_collection_containing_target_document)
+
         return name_of_collection_containing_target_document
+
+    def _find_ids_in_collection(self, collection_name: str, document_ids: List[str]) -> set:
+        r"""
+        Returns the subset of the specified `id` values that are present in the `id` field of any document in the
+        specified collection; querying the collection in batches of `id` values.
+
+        Note: If we have per-collection Bloom filters, we only query the collection for the `id` values its filter
+              says it may contain.
+        """
+        if self.bloom_filter_index is not None:
+            num_ids = len(document_ids)
+            document_ids = [
+                document_id
+                for document_id in document_ids
+                if self.bloom_filter_index.may_contain(collection_name, document_id)
+            ]
+            self._increment_stat("bloom_filter_skips", num_ids - len(document_ids))
+
+        collection = self.db.get_collection(collection_name)
+        ids_found = set()
+        for i in range(0, len(document_ids), self.max_ids_per_query):
+            batch_of_ids = document_ids[i : i + self.max_ids_per_query]
+            query_filter = {"id": {"$in": batch_of_ids}}
+            self._increment_stat("queries")
+            for document in collection.find(query_filter, projection={"_id": 0, "id": 1}):
+                ids_found.add(document["id"])
+        return ids_found & set(document_ids)  # ignores any (unexpected) values we didn't ask for
+
+    def find_collections_containing_documents(
+        self, document_ids: Iterable[str], collection_names: List[str], routing_key: Optional[Hashable] = None
+    ) -> Dict[str, Optional[str]]:
+        r"""
+        Checks which of the specified `id` values are present in the `id` field of any document in any of the
+        specified collections. Returns a dictionary that maps each distinct `id` value to the name of the first
+        collection, if any, containing such a document; or to `None` if none of the collections contain one.
+
+        Note: Unlike `check_whether_document_having_id_exists_among_collections`, which issues one query per `id`
+              value per collection, this method issues one query per _batch_ of `id` values per collection (using
+              the `$in` operator), and only asks each collection about the `id` values that are still unresolved.
+
+        :param routing_key: Identifies the kind of reference whose targets are being searched for (see class
+                            docstring)
+
+        References:
+        - https://www.mongodb.com/docs/manual/reference/operator/query/in/
+        """
+        remaining_ids = set(document_ids)
+        self._increment_stat("lookups", len(remaining_ids))
+
+        if self.id_index is not None and self.id_index.has_collections(collection_names):
+            return self.id_index.find_collections_containing_ids(remaining_ids, collection_names)
+
+        name_of_collection_containing_target_document_by_id: Dict[str, Optional[str]] = {
+            document_id: None for document_id in remaining_ids
+        }
+
+        # Get whichever results we can from the cache, and only search the database for the rest.
+        if self.result_cache_size > 0:
+            frozen_collection_names = frozenset(collection_names)
+            for document_id in list(remaining_ids):
+                cached_result = self._get_cached_result(frozen_collection_names, document_id)
+                if cached_result is not _NOT_CACHED:
+                    name_of_collection_containing_target_document_by_id[document_id] = cached_result
+                    remaining_ids.discard(document_id)
+            ids_to_cache = list(remaining_ids)
+
+        # If we have an `id` prefix router, get the collection it predicts is the most likely to contain each document.
+        names_of_collections_to_search = self._get_names_of_collections_in_search_order(collection_names, routing_key)
+        position_by_collection_name = {name: i for i, name in enumerate(names_of_collections_to_search)}
+        predicted_collection_name_by_id: Dict[str, str] = {}
+        ids_to_search_for_nowhere_else = set()
+        if self.id_prefix_router is not None and len(collection_names) > 1:
+            for document_id in remaining_ids:
+                predicted_collection_names = self.id_prefix_router.get_predicted_collection_names(
+                    document_id, collection_names
+                )
+                if len(predicted_collection_names) > 0:
+                    predicted_collection_name_by_id[document_id] = predicted_collection_names[0]
+                    if self.id_prefix_router.exclusive and len(predicted_collection_names) == 1:
+                        ids_to_search_for_nowhere_else.add(document_id)
+
+        def is_searched_for_in_first_pass(document_id: str, collection_name: str) -> bool:
+            r"""
+            Returns `True` if, during the first pass over the collections, we search the specified collection for the
+            specified `id` value; i.e. if the router made no prediction about the `id` value, or the collection is the
+            predicted one, or the collection comes after the predicted one (meaning the prediction was wrong).
+            """
+            predicted_collection_name = predicted_collection_name_by_id.get(document_id)
+            if predicted_collection_name is None or predicted_collection_name == collection_name:
+                return True
+            if document_id in ids_to_search_for_nowhere_else:
+                return False
+            return position_by_collection_name[collection_name] > position_by_collection_name[predicted_collection_name]
+
+        # Make a first pass over the collections, in which we hold back each `id` value from the collections that come
+        # before its predicted collection; then, make a second pass, in which we search those collections for the `id`
+        # values we held back from them and still haven't found (i.e. whose predictions were wrong).
+        #
+        # Note: When all predictions are right (or there are none), this issues no more queries than a single pass
+        #       would, while sending each `id` value only to the collection that contains it.
+        #
+        for is_first_pass in (True, False):
+            for collection_name in names_of_collections_to_search:
+                if len(remaining_ids) == 0:
+                    break
+                ids_to_search_for = [
+                    document_id
+                    for document_id in remaining_ids
+                    if is_searched_for_in_first_pass(document_id, collection_name) == is_first_pass
+                    and (is_first_pass or document_id not in ids_to_search_for_nowhere_else)
+                ]
+                ids_found = self._find_ids_in_collection(collection_name, ids_to_search_for)
+
+                # Record the collection name for each `id` value we found, and stop searching for those `id` values.
+                for document_id in ids_found:
+                    name_of_collection_containing_target_document_by_id[document_id] = collection_name
+                remaining_ids -= ids_found
+
+                if len(ids_found) > 0:
+                    self._record_documents_found(collection_name, len(ids_found), routing_key)
+
+        if self.result_cache_size > 0:
+            for document_id in ids_to_cache:
+                result = name_of_collection_containing_target_document_by_id[document_id]
+                self._cache_result(frozen_collection_names, document_id, result)
+
+        return name_of_collection_containing_target_document_by_id
@@ -0,0 +1,159 @@
+from hashlib import blake2b
+from numbers import Integral
+from typing import Dict, Hashable, Iterable, List, Optional
+
+from pymongo.database import Database
+
+from refscan.lib.IdIndex import IdIndex
+
+# Note: NumPy is an optional dependency of this package. People can install it via `$ pipx install 'refscan[numpy]'`.
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def hash_id(document_id: Hashable) -> int:
+    r"""
+    Returns a 64-bit hash of the specified `id` value.
+
+    Note: We don't use Python's built-in `hash()` function here, because its output for a given string differs from
+          one Python process to the next (unless the `PYTHONHASHSEED` environment variable is set).
+          Reference: https://docs.python.org/3/reference/datamodel.html#object.__hash__
+
+    Note: We hash the name of the value's type along with the value, so that (for example) the integer `5` and the
+          string `"5"` have different hashes; since a document whose `id` is one does not satisfy a reference to the
+          other. We treat all integers (e.g. BSON's 64-bit `Int64` integers) as the same type, since MongoDB does.
+    """
+    if isinstance(document_id, Integral) and not isinstance(document_id, bool):
+        type_name = "int"
+    else:
+        type_name = type(document_id).__name__
+    digest = blake2b(f"{type_name}:{document_id}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, byteorder="little", signed=False)
+
+
+class HashedIdIndex(IdIndex):
+    r"""
+    An in-memory index of the `id` values of the documents in some collections, in which each `id` value is stored
+    as a 64-bit hash instead of as a string.
+
+    Note: The hashes of each collection's `id` values are stored in a sorted NumPy array, which occupies 8 bytes per
+          `id` (a Python `set` of short strings occupies roughly ten times that). The tradeoff is that two different
+          `id` values can (very rarely) have the same hash. When the index is bound to a database, it confirms each
+          hash match by querying the database, so that a hash collision never hides a violation.
+    """
+
+    def __init__(self, database: Optional[Database] = None):
+        super().__init__()
+        if np is None:
+            raise ImportError(
+                "The hashed id index requires NumPy. You can install it via: $ pipx install 'refscan[numpy]'"
+            )
+        self.db = database  # if `None`, hash matches will not be confirmed
+        self.hashes_by_collection_name: Dict[str, "np.ndarray"] = {}
+
+    def __getstate__(self) -> dict:
+        r"""
+        Returns the state of the index for pickling (e.g. when sending it to another process).
+
+        Note: We omit the database binding, since `Database` instances cannot be pickled. The recipient can rebind the
+              index to its own database by setting the `db` attribute.
+        """
+        state = self.__dict__.copy()
+        state["db"] = None
+        return state
+
+    @staticmethod
+    def _hash_ids(document_ids: Iterable[str]) -> "np.ndarray":
+        r"""Returns a NumPy array containing the hashes of the specified `id` values, in the same order."""
+        return np.fromiter((hash_id(document_id) for document_id in document_ids), dtype=np.uint64)
+
+    def add_collection(self, collection_name: str, document_ids: Iterable[str]) -> None:
+        r"""
+        Adds the specified `id` values to the index, as the `id` values of the documents in the specified collection.
+        """
+        hashes = self._hash_ids(document_ids)
+        if collection_name in self.hashes_by_collection_name:
+            hashes = np.concatenate([self.hashes_by_collection_name[collection_name], hashes])
+        self.hashes_by_collection_name[collection_name] = np.unique(hashes)  # note: the result is sorted
+
+    def has_collection(self, collection_name: str) -> bool:
+        r"""
+        Returns `True` if the index contains the `id` values of the documents in the specified collection.
+        """
+        return collection_name in self.hashes_by_collection_name
+
+    def _get_mask_of_hashes_in_collection(self, hashes: "np.ndarray", collection_name: str) -> "np.ndarray":
+        r"""
+        Returns a boolean NumPy array indicating which of the specified hashes are among those of the specified
+        collection's `id` values.
+        """
+        hashes_in_collection = self.hashes_by_collection_name.get(collection_name)
+        if hashes_in_collection is None or len(hashes_in_collection) == 0:
+            return np.zeros(len(hashes), dtype=bool)
+
+        # Find where each hash would be inserted into the (sorted) array, then check whether that spot holds the hash.
+        # Reference: https://numpy.org/doc/stable/reference/generated/numpy.searchsorted.html
+        positions = np.searchsorted(hashes_in_collection, hashes)
+        positions[positions == len(hashes_in_collection)] = 0  # avoids indexing past the end of the array
+        return hashes_in_collection[positions] == hashes
+
+    def _get_ids_confirmed_to_be_in_collection(self, document_ids: List[str], collection_name: str) -> set:
+        r"""
+        Returns the subset of the specified `id` values that the database confirms are present in the specified
+        collection. If the index is not bound to a database, returns all the specified `id` values.
+        """
+        if self.db is None or len(document_ids) == 0:
+            return set(document_ids)
+        query_filter = {"id": {"$in": document_ids}}
+        collection = self.db.get_collection(collection_name)
+        return set(document["id"] for document in collection.find(query_filter, projection={"_id": 0, "id": 1}))
+
+    def find_collection_containing_id(self, document_id: str, collection_names: List[str]) -> Optional[str]:
+        r"""
+        Returns the name of the first of the specified collections, if any, that contains a document having the
+        specified `id`. If none of them do, returns `None`.
+        """
+        return self.find_collections_containing_ids([document_id], collection_names)[document_id]
+
+    def find_collections_containing_ids(
+        self, document_ids: Iterable[str], collection_names: List[str]
+    ) -> Dict[str, Optional[str]]:
+        r"""
+        Returns a dictionary that maps each of the specified `id` values to the name of the first of the specified
+        collections, if any, that contains a document having that `id`; or to `None` if none of them do.
+
+        Note: This checks the whole batch of `id` values against each collection at once, in a vectorized way.
+        """
+        remaining_ids = list(set(document_ids))
+        name_of_collection_containing_id_by_id: Dict[str, Optional[str]] = {
+            document_id: None for document_id in remaining_ids
+        }
+        remaining_hashes = self._hash_ids(remaining_ids)
+        for collection_name in collection_names:
+            if len(remaining_ids) == 0:
+                break
+            mask = self._get_mask_of_hashes_in_collection(remaining_hashes, collection_name)
+            candidate_ids = [document_id for document_id, is_match in zip(remaining_ids, mask) if is_match]
+            confirmed_ids = self._get_ids_confirmed_to_be_in_collection(candidate_ids, collection_name)
+            for document_id in confirmed_ids:
+                name_of_collection_containing_id_by_id[document_id] = collection_name
+
+            # Stop searching for the `id` values we've found.
+            if len(confirmed_ids) > 0:
+                is_remaining = np.array([document_id not in confirmed_ids for document_id in remaining_ids])
+                remaining_ids = [document_id for document_id in remaining_ids if document_id not in confirmed_ids]
+                remaining_hashes = remaining_hashes[is_remaining]
+
+        return name_of_collection_containing_id_by_id
+
+    def __len__(self) -> int:
+        r"""Returns the number of (distinct) hashes in the index, among all collections."""
+        return sum(len(hashes) for hashes in self.hashes_by_collection_name.values())
+
+    def get_size_in_bytes(self) -> int:
+        r"""
+        Returns the approximate amount of memory, in bytes, occupied by the index.
+        """
+        return sum(hashes.nbytes for hashes in self.hashes_by_collection_name.values())
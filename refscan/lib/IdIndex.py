@@ -0,0 +1,70 @@
+import sys
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class IdIndex:
+    r"""
+    An in-memory index of the `id` values of the documents in some collections.
+
+    Note: The index can be used to check whether a document having a given `id` exists in a given collection,
+          without querying the database.
+    """
+
+    def __init__(self):
+        self.ids_by_collection_name: Dict[str, Set[str]] = {}
+
+    def add_collection(self, collection_name: str, document_ids: Iterable[str]) -> None:
+        r"""
+        Adds the specified `id` values to the index, as the `id` values of the documents in the specified collection.
+        """
+        self.ids_by_collection_name.setdefault(collection_name, set()).update(document_ids)
+
+    def has_collection(self, collection_name: str) -> bool:
+        r"""
+        Returns `True` if the index contains the `id` values of the documents in the specified collection.
+        """
+        return collection_name in self.ids_by_collection_name
+
+    def has_collections(self, collection_names: Iterable[str]) -> bool:
+        r"""
+        Returns `True` if the index contains the `id` values of the documents in all the specified collections.
+        """
+        return all(self.has_collection(collection_name) for collection_name in collection_names)
+
+    def find_collection_containing_id(self, document_id: str, collection_names: List[str]) -> Optional[str]:
+        r"""
+        Returns the name of the first of the specified collections, if any, that contains a document having the
+        specified `id`. If none of them do, returns `None`.
+        """
+        for collection_name in collection_names:
+            if document_id in self.ids_by_collection_name.get(collection_name, ()):
+                return collection_name
+        return None
+
+    def find_collections_containing_ids(
+        self, document_ids: Iterable[str], collection_names: List[str]
+    ) -> Dict[str, Optional[str]]:
+        r"""
+        Returns a dictionary that maps each of the specified `id` values to the name of the first of the specified
+        collections, if any, that contains a document having that `id`; or to `None` if none of them do.
+        """
+        return {
+            document_id: self.find_collection_containing_id(document_id, collection_names)
+            for document_id in set(document_ids)
+        }
+
+    def __len__(self) -> int:
+        r"""Returns the number of `id` values in the index, among all collections."""
+        return sum(len(ids) for ids in self.ids_by_collection_name.values())
+
+    def get_size_in_bytes(self) -> int:
+        r"""
+        Returns the approximate amount of memory, in bytes, occupied by the index.
+
+        Note: This accounts for the sets and for the `id` strings they contain.
+        """
+        num_bytes = sys.getsizeof(self.ids_by_collection_name)
+        for collection_name, ids in self.ids_by_collection_name.items():
+            num_bytes += sys.getsizeof(collection_name) + sys.getsizeof(ids)
+            num_bytes += sum(sys.getsizeof(document_id) for document_id in ids)
+        return num_bytes
@@ -0,0 +1,96 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+import re
+
+from refscan.lib.SchemaAnalyzer import SchemaAnalyzer
+
+# A regular expression that matches the prefix and typecode at the beginning of an `id`; e.g. "nmdc:bsm" in
+# "nmdc:bsm-11-abc123".
+ID_PREFIX_REGEX = re.compile(r"^([^:\s]+:[A-Za-z0-9_]+)-")
+
+
+class IdPrefixRouter:
+    r"""
+    A class that predicts which collection contains the document having a given `id`, based upon the `id`'s prefix
+    and typecode (e.g. "nmdc:bsm" in "nmdc:bsm-11-abc123"), so that the finder can search that collection first.
+
+    The router learns a histogram of prefixes and the collections in which they occur, either from a sample of the
+    `id` values in each collection, or from the `id` patterns the schema specifies for the classes whose instances
+    each collection can contain.
+
+    Note: If the router is `exclusive` and the histogram says a given prefix only occurs in one of the collections
+          being searched, the finder only searches that collection. That saves queries, at the risk of reporting a
+          reference as a violation when the referenced document exists in one of the other collections (i.e. in a
+          collection whose other documents have different prefixes).
+    """
+
+    def __init__(self, exclusive: bool = False):
+        self.exclusive = exclusive
+        self.num_ids_by_prefix: Dict[str, Counter] = {}  # e.g. {"nmdc:bsm": {"biosample_set": 1000}}
+
+    @staticmethod
+    def get_id_prefix(document_id) -> Optional[str]:
+        r"""
+        Returns the prefix and typecode at the beginning of the specified `id` (e.g. "nmdc:bsm"), if it has them;
+        otherwise, returns `None`.
+        """
+        if not isinstance(document_id, str):
+            return None
+        match = ID_PREFIX_REGEX.match(document_id)
+        return None if match is None else match.group(1)
+
+    def learn_prefix(self, prefix: str, collection_name: str, num_ids: int = 1) -> None:
+        r"""Records that the specified number of `id`s having the specified prefix occur in the specified collection."""
+        self.num_ids_by_prefix.setdefault(prefix, Counter())[collection_name] += num_ids
+
+    def learn_ids(self, collection_name: str, document_ids: Iterable) -> None:
+        r"""Records the prefixes of the specified `id`s (e.g. a sample of them), which occur in the specified collection."""
+        for document_id in document_ids:
+            prefix = self.get_id_prefix(document_id)
+            if prefix is not None:
+                self.learn_prefix(prefix, collection_name)
+
+    def learn_from_schema(self, schema_analyzer: SchemaAnalyzer, collection_name_to_class_names: Dict[str, List[str]]):
+        r"""
+        Records the prefixes that the schema allows the `id`s of the instances of each class to have, as occurring in
+        each collection that can contain instances of that class.
+
+        :param schema_analyzer: An analyzer of the schema
+        :param collection_name_to_class_names: Dictionary mapping each collection name to the names of the classes
+                                               whose instances can be stored in that collection
+        """
+        for collection_name, class_names in collection_name_to_class_names.items():
+            for class_name in class_names:
+                for prefix in schema_analyzer.get_id_prefixes_of_class(class_name):
+                    self.learn_prefix(prefix, collection_name)
+
+    def __len__(self) -> int:
+        r"""Returns the number of distinct prefixes the router has learned."""
+        return len(self.num_ids_by_prefix)
+
+    def get_predicted_collection_names(self, document_id, collection_names: List[str]) -> List[str]:
+        r"""
+        Returns the names of those of the specified collections in which the router has seen the specified `id`'s
+        prefix, ordered from most to least likely to contain the document (collections in which the prefix has been
+        seen equally often keep their given order). If the router has not seen the prefix in any of them, returns
+        an empty list.
+        """
+        prefix = self.get_id_prefix(document_id)
+        num_ids_by_collection_name = self.num_ids_by_prefix.get(prefix) if prefix is not None else None
+        if num_ids_by_collection_name is None:
+            return []
+        predicted_collection_names = [name for name in collection_names if num_ids_by_collection_name[name] > 0]
+        return sorted(predicted_collection_names, key=lambda name: num_ids_by_collection_name[name], reverse=True)
+
+    def get_names_of_collections_to_search(self, document_id, collection_names: List[str]) -> List[str]:
+        r"""
+        Returns the specified collection names, reordered so that those the router predicts are most likely to contain
+        the document having the specified `id` are at the front. If the router is exclusive and predicts that only one
+        of the collections can contain the document, returns only that collection's name.
+        """
+        predicted_collection_names = self.get_predicted_collection_names(document_id, collection_names)
+        if self.exclusive and len(predicted_collection_names) == 1:
+            return predicted_collection_names
+        return predicted_collection_names + [
+            name for name in collection_names if name not in predicted_collection_names
+        ]
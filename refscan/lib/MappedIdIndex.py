@@ -0,0 +1,269 @@
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
+import json
+import mmap
+import os
+import sys
+
+from pymongo.database import Database
+
+from refscan.lib.HashedIdIndex import hash_id
+from refscan.lib.IdIndex import IdIndex
+
+# Note: NumPy is an optional dependency of this package. People can install it via `$ pipx install 'refscan[numpy]'`.
+#       When it is installed, we use it to sort and deduplicate each collection's hashes while building an index.
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# The name and version of the format of the files in which we store memory-mapped `id` indexes.
+FILE_FORMAT_NAME = "refscan-id-index"
+#
+# Note: Version 2 files contain hashes of `id` values qualified by their types (see `hash_id`), which version 1 files
+#       (whose hashes were of the `id` values alone) are not compatible with.
+#
+FILE_FORMAT_VERSION = 2
+
+# The number of bytes we use to store the length of a file's (JSON) header.
+HEADER_LENGTH_SIZE_IN_BYTES = 8
+
+# The number of bytes each hash occupies in a file.
+HASH_SIZE_IN_BYTES = 8
+
+# The number of hashes we sort at a time when building an index without NumPy (see `_write_distinct_hashes`).
+NUM_HASHES_PER_SORTED_RUN = 1_000_000
+
+
+class MappedIdIndex(IdIndex):
+    r"""
+    An index of the `id` values of the documents in some collections, stored in a file that the index memory-maps.
+
+    The file consists of the length of a JSON header (as an 8-byte little-endian integer); the header, which describes
+    the database the index was built from and contains an "offsets table" (i.e. where each collection's hashes start
+    and how many there are); padding up to a multiple of 8 bytes; and, for each collection, the sorted, distinct 64-bit
+    hashes of its documents' `id` values (as little-endian integers).
+
+    Note: Since the index memory-maps the file instead of reading it into Python objects, opening it is nearly
+          instantaneous, it only occupies memory for the pages it actually reads, and multiple processes that open
+          the same file (e.g. multiple scans of the same snapshot, or the worker processes of one scan) share those
+          pages via the operating system's page cache. Each lookup is a binary search within a collection's hashes.
+
+    Note: Like the `HashedIdIndex`, this index can (very rarely) mistake one `id` for another whose hash is the same.
+          When the index is bound to a database, it confirms each hash match by querying the database.
+    """
+
+    def __init__(self, file_path: Union[str, Path], database: Optional[Database] = None):
+        super().__init__()
+        self.file_path = Path(file_path)
+        self.db = database  # if `None`, hash matches will not be confirmed
+        self._open()
+
+    def _open(self) -> None:
+        r"""Memory-maps the index's file and reads its header."""
+        if sys.byteorder != "little":  # pragma: no cover
+            raise RuntimeError("Memory-mapped id indexes are only supported on little-endian machines.")
+        with open(self.file_path, "rb") as f:
+            header_length = int.from_bytes(f.read(HEADER_LENGTH_SIZE_IN_BYTES), byteorder="little")
+            header = json.loads(f.read(header_length).decode("utf-8"))
+            if header.get("format") != FILE_FORMAT_NAME or header.get("version") != FILE_FORMAT_VERSION:
+                raise ValueError(f"Not a version {FILE_FORMAT_VERSION} id index file: {self.file_path}")
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.metadata: dict = header["metadata"]
+        self.hash_ranges_by_collection_name: Dict[str, Tuple[int, int]] = {
+            entry["collection_name"]: (entry["offset"], entry["offset"] + entry["num_hashes"])
+            for entry in header["collections"]
+        }
+
+        # Make a view of the hashes as an array of unsigned 64-bit integers, which reads them from the memory map on
+        # demand (instead of making a Python object for each of them).
+        num_hashes = sum(end - start for start, end in self.hash_ranges_by_collection_name.values())
+        data = memoryview(self.mmap)[HEADER_LENGTH_SIZE_IN_BYTES + header_length :]
+        if len(data) != num_hashes * HASH_SIZE_IN_BYTES:
+            data.release()
+            self.mmap.close()
+            raise ValueError(f"Id index file is truncated: {self.file_path}")
+        self.hashes = data.cast("Q")
+
+    def close(self) -> None:
+        r"""Unmaps the index's file."""
+        self.hashes.release()  # note: the memory map can't be closed while a view of it exists
+        self.mmap.close()
+
+    def __getstate__(self) -> dict:
+        r"""
+        Returns the state of the index for pickling (e.g. when sending it to another process).
+
+        Note: We omit the memory map (which the recipient recreates by mapping the same file) and the database binding
+              (since `Database` instances cannot be pickled). The recipient can rebind the index to its own database by
+              setting the `db` attribute.
+        """
+        return dict(file_path=self.file_path)
+
+    def __setstate__(self, state: dict) -> None:
+        r"""Restores the state of the index after unpickling, memory-mapping its file again."""
+        self.__init__(state["file_path"])
+
+    @staticmethod
+    def build(
+        file_path: Union[str, Path], ids_by_collection_name: Dict[str, Iterable], metadata: Optional[dict] = None
+    ) -> None:
+        r"""
+        Writes an index of the specified `id` values of the documents in each of the specified collections, to the
+        specified file.
+
+        Note: We only hold one collection's hashes in memory at a time. Since we don't know the contents of the offsets
+              table until we've hashed every collection's `id` values, we write the hashes to a temporary file first,
+              then write the header followed by those hashes to another temporary file, which we rename at the end;
+              so that, if the program is interrupted while writing the index, no partially-written index is left
+              behind.
+        """
+        file_path = Path(file_path)
+        temporary_hashes_file_path = file_path.with_name(f"{file_path.name}.hashes.tmp")
+        temporary_file_path = file_path.with_name(f"{file_path.name}.tmp")
+        collection_entries = []
+        num_hashes_so_far = 0
+        with open(temporary_hashes_file_path, "w+b") as hashes_file:
+            for collection_name, document_ids in ids_by_collection_name.items():
+                num_hashes = MappedIdIndex._write_distinct_hashes(hashes_file, document_ids)
+                collection_entries.append(
+                    dict(collection_name=collection_name, offset=num_hashes_so_far, num_hashes=num_hashes)
+                )
+                num_hashes_so_far += num_hashes
+
+            # Pad the header with spaces (which JSON allows) so that the hashes start at a multiple of 8 bytes.
+            header = dict(
+                format=FILE_FORMAT_NAME,
+                version=FILE_FORMAT_VERSION,
+                metadata={} if metadata is None else metadata,
+                collections=collection_entries,
+            )
+            header_bytes = json.dumps(header).encode("utf-8")
+            header_bytes += b" " * (-(HEADER_LENGTH_SIZE_IN_BYTES + len(header_bytes)) % HASH_SIZE_IN_BYTES)
+
+            with open(temporary_file_path, "wb") as f:
+                f.write(len(header_bytes).to_bytes(HEADER_LENGTH_SIZE_IN_BYTES, byteorder="little"))
+                f.write(header_bytes)
+                hashes_file.seek(0)
+                while chunk := hashes_file.read(1024 * 1024):
+                    f.write(chunk)
+        os.replace(temporary_file_path, file_path)
+        os.remove(temporary_hashes_file_path)
+
+    @staticmethod
+    def _write_distinct_hashes(f: BinaryIO, document_ids: Iterable) -> int:
+        r"""
+        Writes the sorted, distinct hashes of the specified `id` values to the specified file (as little-endian 64-bit
+        integers), and returns the number of hashes written.
+
+        Note: When NumPy is installed, we collect the hashes into a NumPy array (8 bytes per `id`) and let NumPy sort
+              and deduplicate them, like the `HashedIdIndex` does. Otherwise, so that we don't make a Python `int`
+              (about 32 bytes, plus its slot in a `set`) for every `id` in the collection at once, we sort the hashes
+              in runs of `NUM_HASHES_PER_SORTED_RUN`, store each sorted run compactly in an `array`, and then merge
+              the runs, skipping duplicates, as we write them.
+        """
+        if np is not None:
+            hashes = np.unique(np.fromiter((hash_id(document_id) for document_id in document_ids), dtype=np.uint64))
+            f.write(hashes.astype("<u8", copy=False).tobytes())
+            return len(hashes)
+
+        hash_iterator = (hash_id(document_id) for document_id in document_ids)
+        sorted_runs: List[array] = []
+        while len(run := sorted(set(islice(hash_iterator, NUM_HASHES_PER_SORTED_RUN)))) > 0:
+            sorted_runs.append(array("Q", run))
+        del run
+
+        num_hashes = 0
+        previous_hash = None
+        buffer = array("Q")
+        for hash_ in merge(*sorted_runs):
+            if hash_ == previous_hash:
+                continue
+            buffer.append(hash_)
+            previous_hash = hash_
+            if len(buffer) == NUM_HASHES_PER_SORTED_RUN:
+                num_hashes += MappedIdIndex._write_hashes(f, buffer)
+                buffer = array("Q")
+        num_hashes += MappedIdIndex._write_hashes(f, buffer)
+        return num_hashes
+
+    @staticmethod
+    def _write_hashes(f: BinaryIO, hashes: array) -> int:
+        r"""Writes the specified hashes to the specified file, as little-endian integers; and returns their number."""
+        if sys.byteorder != "little":  # pragma: no cover
+            hashes.byteswap()
+        f.write(hashes.tobytes())
+        return len(hashes)
+
+    def has_collection(self, collection_name: str) -> bool:
+        r"""
+        Returns `True` if the index contains the `id` values of the documents in the specified collection.
+        """
+        return collection_name in self.hash_ranges_by_collection_name
+
+    def _has_hash_in_collection(self, hash_: int, collection_name: str) -> bool:
+        r"""Returns `True` if the specified hash is among those of the specified collection's `id` values."""
+        hash_range = self.hash_ranges_by_collection_name.get(collection_name)
+        if hash_range is None:
+            return False
+        start, end = hash_range
+        position = bisect_left(self.hashes, hash_, start, end)
+        return position < end and self.hashes[position] == hash_
+
+    def _get_ids_confirmed_to_be_in_collection(self, document_ids: List[str], collection_name: str) -> set:
+        r"""
+        Returns the subset of the specified `id` values that the database confirms are present in the specified
+        collection. If the index is not bound to a database, returns all the specified `id` values.
+        """
+        if self.db is None or len(document_ids) == 0:
+            return set(document_ids)
+        query_filter = {"id": {"$in": document_ids}}
+        collection = self.db.get_collection(collection_name)
+        return set(document["id"] for document in collection.find(query_filter, projection={"_id": 0, "id": 1}))
+
+    def find_collection_containing_id(self, document_id: str, collection_names: List[str]) -> Optional[str]:
+        r"""
+        Returns the name of the first of the specified collections, if any, that contains a document having the
+        specified `id`. If none of them do, returns `None`.
+        """
+        return self.find_collections_containing_ids([document_id], collection_names)[document_id]
+
+    def find_collections_containing_ids(
+        self, document_ids: Iterable[str], collection_names: List[str]
+    ) -> Dict[str, Optional[str]]:
+        r"""
+        Returns a dictionary that maps each of the specified `id` values to the name of the first of the specified
+        collections, if any, that contains a document having that `id`; or to `None` if none of them do.
+        """
+        remaining_hashes_by_id = {document_id: hash_id(document_id) for document_id in set(document_ids)}
+        name_of_collection_containing_id_by_id: Dict[str, Optional[str]] = {
+            document_id: None for document_id in remaining_hashes_by_id
+        }
+        for collection_name in collection_names:
+            if len(remaining_hashes_by_id) == 0:
+                break
+            candidate_ids = [
+                document_id
+                for document_id, hash_ in remaining_hashes_by_id.items()
+                if self._has_hash_in_collection(hash_, collection_name)
+            ]
+            for document_id in self._get_ids_confirmed_to_be_in_collection(candidate_ids, collection_name):
+                name_of_collection_containing_id_by_id[document_id] = collection_name
+                del remaining_hashes_by_id[document_id]  # stops searching for the `id` values we've found
+
+        return name_of_collection_containing_id_by_id
+
+    def __len__(self) -> int:
+        r"""Returns the number of (distinct) hashes in the index, among all collections."""
+        return len(self.hashes)
+
+    def get_size_in_bytes(self) -> int:
+        r"""
+        Returns the size, in bytes, of the index's file (only the parts of which that get read will occupy memory).
+        """
+        return len(self.mmap)
@@ -0,0 +1,26 @@
+from typing import Dict, Hashable, List, Optional, Tuple
+from dataclasses import dataclass, field
+
+
+@dataclass
+class MicroBatch:
+    """
+    A batch of consecutive source documents, and what the stages of the scanner's pipeline have learned about them so
+    far. The source reader makes the batch; then the extractor, the resolver, and the sink, in that order, each read
+    what the stages before them filled in and fill in their own parts.
+    """
+
+    source_collection_name: str = field()  # e.g. "biosample_set"
+    documents: list = field(default_factory=list)
+
+    # Filled in by the extractor: for each document, a `(document, source_class_name, references_in_document)` tuple
+    # (see `Scanner.get_references_in_document`); and the target `id`s to look up, grouped by lookup key (see
+    # `Scanner.make_lookup_key`).
+    references_by_document: List[Tuple[dict, Optional[str], list]] = field(default_factory=list)
+    target_ids_by_lookup_key: Dict[tuple, set] = field(default_factory=dict)
+
+    # Filled in by the resolver: for each lookup key, the name of the collection containing the document targeted by
+    # each `id`, or `None` if no eligible collection contains it.
+    name_of_collection_containing_target_by_lookup_key_and_id: Dict[tuple, Dict[Hashable, Optional[str]]] = field(
+        default_factory=dict
+    )
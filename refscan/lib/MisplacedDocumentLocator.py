@@ -0,0 +1,79 @@
+from typing import Hashable, Iterable, List, Optional
+import threading
+
+from pymongo.database import Database
+
+from refscan.lib.HashedIdIndex import HashedIdIndex
+from refscan.lib.helpers import get_id_values_in_collection
+
+
+class MisplacedDocumentLocator:
+    r"""
+    A class that can be used to find out which collection, if any, contains the document having a given `id`; via an
+    in-memory index of the `id` values of the documents in every collection.
+
+    Note: The locator builds the index the first time it is used (reading each collection's `id` values once), so
+          that a scan that finds no violations never pays for it. After that, locating a misplaced document is a
+          lookup in memory (plus, when the lookup finds a match, a query confirming it), instead of one query per
+          collection.
+
+    Note: To keep the index compact, it is a `HashedIdIndex` (which stores 8 bytes per `id`, instead of the `id`
+          string). The index is bound to the database, so it confirms each hash match by querying the collection
+          (that way, a hash collision never makes the locator report a document as being somewhere it is not).
+    """
+
+    def __init__(self, database: Database, collection_names: Iterable[str]):
+        self.db = database
+        self.collection_names: List[str] = sorted(collection_names)
+
+        # Note: We make the (empty) index now, so that, if NumPy (which the index requires) is not installed, we find
+        #       out before the scan begins.
+        self.id_index = HashedIdIndex(database=database)
+        self.is_index_built = False
+
+        # Note: We guard the building of the index with a lock, since the asynchronous scanner can call the locator
+        #       from multiple threads (and we only want to build the index once).
+        self.index_lock = threading.Lock()
+
+    def build_index(self) -> None:
+        r"""Reads the `id` value of every document in every collection into the index."""
+        for collection_name in self.collection_names:
+            document_ids = get_id_values_in_collection(self.db.get_collection(collection_name))
+            self.id_index.add_collection(collection_name, document_ids)
+        self.is_index_built = True
+
+    def _get_index(self) -> HashedIdIndex:
+        r"""Returns the index, building it first if it has not been built yet."""
+        if not self.is_index_built:
+            with self.index_lock:
+                if not self.is_index_built:  # another thread may have built it while we waited
+                    self.build_index()
+        return self.id_index
+
+    def __len__(self) -> int:
+        r"""Returns the number of `id` values in the index, among all collections (which is 0 until it is built)."""
+        return len(self.id_index)
+
+    def locate(self, document_id: Hashable, names_of_collections_to_ignore: Iterable[str] = ()) -> Optional[str]:
+        r"""
+        Returns the name of the first collection (in alphabetical order), other than the ones specified, that contains
+        a document having the specified `id`; or `None` if no such collection contains one.
+
+        Note: A value that isn't hashable (e.g. a dictionary) is not in the index, so we query the collections for
+              such values one by one (like the scanner does when it has no locator).
+
+        :param names_of_collections_to_ignore: Names of collections in which to ignore the document, if it's there
+                                               (e.g. the collections the schema allows the document to be in)
+        """
+        names_of_collections_to_search = [
+            collection_name
+            for collection_name in self.collection_names
+            if collection_name not in names_of_collections_to_ignore
+        ]
+        if not isinstance(document_id, Hashable):
+            for collection_name in names_of_collections_to_search:
+                collection = self.db.get_collection(collection_name)
+                if collection.find_one(dict(id=document_id), projection=["_id"]) is not None:
+                    return collection_name
+            return None
+        return self._get_index().find_collection_containing_id(document_id, names_of_collections_to_search)
@@ -0,0 +1,43 @@
+from typing import Any, Optional
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class Partition:
+    """
+    A range of `_id` values in a collection; i.e. a portion of the collection that can be scanned independently of the
+    collection's other portions.
+
+    Note: A collection that has not been split up is represented by a single partition that has no bounds.
+    """
+
+    collection_name: str = field()  # e.g. "biosample_set"
+    index: int = field(default=0)  # position of this partition among those of the collection (e.g. 0)
+    num_partitions: int = field(default=1)  # number of partitions the collection has been split into (e.g. 4)
+    lower_bound: Optional[Any] = field(default=None)  # smallest `_id` value in the range, or `None` if unbounded
+    upper_bound: Optional[Any] = field(default=None)  # smallest `_id` value beyond the range, or `None` if unbounded
+
+    @property
+    def description(self) -> str:
+        r"""Returns a description of the partition, suitable for labeling its progress bar."""
+        if self.num_partitions == 1:
+            return self.collection_name
+        return f"{self.collection_name} [{self.index + 1}/{self.num_partitions}]"
+
+    def get_query_filter(self) -> dict:
+        r"""
+        Returns a query filter that matches the documents whose `_id` values are in this partition's range.
+
+        Note: MongoDB's comparison operators only match values of the same BSON type as the operand. In order for the
+              partitions of a collection to cover _all_ of its documents (e.g. including any whose `_id` value is a
+              string instead of an `ObjectId`), the first partition is defined as everything _not_ in the later ones.
+              Reference: https://www.mongodb.com/docs/manual/reference/method/db.collection.find/#type-bracketing
+        """
+        if self.lower_bound is None and self.upper_bound is None:
+            return {}
+        elif self.lower_bound is None:
+            return {"_id": {"$not": {"$gte": self.upper_bound}}}
+        elif self.upper_bound is None:
+            return {"_id": {"$gte": self.lower_bound}}
+        else:
+            return {"_id": {"$gte": self.lower_bound, "$lt": self.upper_bound}}
@@ -0,0 +1,102 @@
+from typing import Callable, Optional
+import threading
+import time
+
+from rich.progress import Progress
+
+from refscan.lib.constants import console
+
+
+class ProgressLogger:
+    r"""
+    A class that periodically prints a one-line report of the progress of the tasks of a progress bar (i.e. of the
+    scan), including throughput; for when the program's output is going to a log file instead of to a terminal (in
+    which case the progress bar is not displayed while the scan is underway).
+
+    Example report:
+    ```
+    Progress: 120,000 documents scanned (4,000/s), 360 lookups (12/s), 7 violations; scanning: biosample_set
+    ```
+
+    Note: The logger runs in a background thread, and reads the progress bar's tasks (instead of being told about each
+          document the scanner processes); so it adds nothing to the scanner's work per document.
+    """
+
+    def __init__(
+        self,
+        progress: Progress,
+        interval_in_seconds: float = 30,
+        get_num_lookups: Optional[Callable[[], int]] = None,
+    ):
+        r"""
+        :param progress: The progress bar whose tasks' progress to report
+        :param interval_in_seconds: The number of seconds between consecutive reports
+        :param get_num_lookups: A function that returns the number of lookups performed so far; or `None` if that
+                                number is not available (in which case, the reports will not include it)
+        """
+        self.progress = progress
+        self.interval_in_seconds = interval_in_seconds
+        self.get_num_lookups = get_num_lookups
+        self.is_stopping = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        # The time and the numbers of documents and lookups at the time of the previous report, from which we
+        # calculate the throughput since then.
+        self.time_of_last_report = time.monotonic()
+        self.num_documents_at_last_report = 0
+        self.num_lookups_at_last_report = 0
+
+    def make_report(self) -> str:
+        r"""Returns a one-line report of the current progress, and of the throughput since the previous report."""
+        tasks = self.progress.tasks
+        num_documents = int(sum(task.completed for task in tasks))
+        num_violations = sum(task.fields.get("num_violations", 0) for task in tasks)
+        names_of_running_tasks = [
+            task.description for task in tasks if task.fields.get("remaining_time_label") == "remaining"
+        ]
+
+        now = time.monotonic()
+        num_seconds = max(now - self.time_of_last_report, 1e-9)
+        parts = [
+            f"{num_documents:,} documents scanned "
+            f"({(num_documents - self.num_documents_at_last_report) / num_seconds:,.0f}/s)"
+        ]
+        self.time_of_last_report = now
+        self.num_documents_at_last_report = num_documents
+        if self.get_num_lookups is not None:
+            num_lookups = self.get_num_lookups()
+            parts.append(
+                f"{num_lookups:,} lookups ({(num_lookups - self.num_lookups_at_last_report) / num_seconds:,.0f}/s)"
+            )
+            self.num_lookups_at_last_report = num_lookups
+        parts.append(f"{num_violations:,} violations")
+
+        report = f"Progress: {', '.join(parts)}"
+        if len(names_of_running_tasks) > 0:
+            report += f"; scanning: {', '.join(names_of_running_tasks)}"
+        return report
+
+    def _run(self) -> None:
+        r"""Prints a report every `interval_in_seconds`, until the logger is stopped (this runs in the thread)."""
+        while not self.is_stopping.wait(timeout=self.interval_in_seconds):
+            console.print(self.make_report(), highlight=False, soft_wrap=True)
+
+    def start(self) -> None:
+        r"""Starts printing reports periodically."""
+        self.time_of_last_report = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="refscan-progress-logger", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        r"""Stops printing reports, and prints a final one."""
+        self.is_stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+        console.print(self.make_report(), highlight=False, soft_wrap=True)
+
+    def __enter__(self) -> "ProgressLogger":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
@@ -1,4 +1,4 @@
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Tuple, Union
 from pathlib import Path
 from dataclasses import fields, astuple
 from collections import UserList
@@ -16,17 +16,134 @@ class ReferenceList(UserList):
 
     Note: `UserList` is a base class that facilitates the implementation of custom list classes.
           One thing it does is enable sorting via `sorted(the_list)`.
+
+    Note: The "getter" methods answer their questions via lookup tables that are built (from the whole list) the
+          first time one of those methods is called, and are discarded whenever the list is mutated via one of its
+          methods. The lookup tables are not discarded if `self.data` is mutated directly.
     """
 
+    def __init__(self, initlist=None):
+        super().__init__(initlist)
+        self._lookup_tables: Optional[dict] = None
+
+    def _invalidate_lookup_tables(self) -> None:
+        r"""Discards the lookup tables, so that they get rebuilt the next time they are needed."""
+        self._lookup_tables = None
+
+    def _get_lookup_tables(self) -> dict:
+        r"""
+        Returns the lookup tables, building them first if they have not been built since the list was last mutated.
+
+        Note: Each table's values are in the order in which the getter methods have always returned them (i.e. the
+              order in which the values first appear in the list); except that the values of the table of target
+              collection names are in the (arbitrary) order of a `set`, as they always have been.
+        """
+        if self._lookup_tables is not None:
+            return self._lookup_tables
+
+        source_collection_names: List[str] = []
+        target_collection_names: List[str] = []
+        source_field_names_by_source_collection_name: Dict[str, List[str]] = {}
+        source_field_names_by_source_class_name: Dict[str, List[str]] = {}
+        target_collection_name_sets_by_source_class_and_field_name: Dict[Tuple[str, str], set] = {}
+        target_class_names_by_source_class_and_field_name: Dict[Tuple[str, str], List[str]] = {}
+        for reference in self.data:
+            if reference.source_collection_name not in source_collection_names:
+                source_collection_names.append(reference.source_collection_name)
+            if reference.target_collection_name not in target_collection_names:
+                target_collection_names.append(reference.target_collection_name)
+
+            field_names = source_field_names_by_source_collection_name.setdefault(reference.source_collection_name, [])
+            if reference.source_field_name not in field_names:
+                field_names.append(reference.source_field_name)
+
+            field_names = source_field_names_by_source_class_name.setdefault(reference.source_class_name, [])
+            if reference.source_field_name not in field_names:
+                field_names.append(reference.source_field_name)
+
+            key = (reference.source_class_name, reference.source_field_name)
+            target_collection_name_sets_by_source_class_and_field_name.setdefault(key, set()).add(
+                reference.target_collection_name
+            )
+            target_class_names = target_class_names_by_source_class_and_field_name.setdefault(key, [])
+            if reference.target_class_name not in target_class_names:
+                target_class_names.append(reference.target_class_name)
+
+        self._lookup_tables = dict(
+            source_collection_names=source_collection_names,
+            target_collection_names=target_collection_names,
+            source_field_names_by_source_collection_name=source_field_names_by_source_collection_name,
+            source_field_names_by_source_class_name=source_field_names_by_source_class_name,
+            target_collection_names_by_source_class_and_field_name={
+                key: list(names) for key, names in target_collection_name_sets_by_source_class_and_field_name.items()
+            },
+            target_class_names_by_source_class_and_field_name=target_class_names_by_source_class_and_field_name,
+        )
+        return self._lookup_tables
+
+    # Note: We override each of the methods via which a `UserList` can be mutated (in place), so that we can discard
+    #       the lookup tables when the list is mutated.
+    #       Reference: https://docs.python.org/3/library/collections.abc.html#collections-abstract-base-classes
+
+    def __setitem__(self, i, item):
+        self._invalidate_lookup_tables()
+        super().__setitem__(i, item)
+
+    def __delitem__(self, i):
+        self._invalidate_lookup_tables()
+        super().__delitem__(i)
+
+    def __iadd__(self, other):
+        self._invalidate_lookup_tables()
+        return super().__iadd__(other)
+
+    def __imul__(self, n):
+        self._invalidate_lookup_tables()
+        return super().__imul__(n)
+
+    def append(self, item) -> None:
+        self._invalidate_lookup_tables()
+        super().append(item)
+
+    def insert(self, i, item) -> None:
+        self._invalidate_lookup_tables()
+        super().insert(i, item)
+
+    def pop(self, i=-1):
+        self._invalidate_lookup_tables()
+        return super().pop(i)
+
+    def remove(self, item) -> None:
+        self._invalidate_lookup_tables()
+        super().remove(item)
+
+    def clear(self) -> None:
+        self._invalidate_lookup_tables()
+        super().clear()
+
+    def extend(self, other) -> None:
+        self._invalidate_lookup_tables()
+        super().extend(other)
+
+    def reverse(self) -> None:
+        self._invalidate_lookup_tables()
+        super().reverse()
+
+    def sort(self, /, *args, **kwds) -> None:
+        self._invalidate_lookup_tables()
+        super().sort(*args, **kwds)
+
     def get_source_collection_names(self) -> list[str]:
         """
         Returns the distinct `source_collection_names` values among all references in the list.
         """
-        distinct_source_collection_names = []
-        for reference in self.data:
-            if reference.source_collection_name not in distinct_source_collection_names:
-                distinct_source_collection_names.append(reference.source_collection_name)
-        return distinct_source_collection_names
+        return list(self._get_lookup_tables()["source_collection_names"])
+
+    def get_distinct_target_collection_names(self) -> list[str]:
+        """
+        Returns the distinct `target_collection_names` values among all references in the list.
+        """
+        return list(self._get_lookup_tables()["target_collection_names"])
 
     def count_source_collections(self) -> int:
         r"""
@@ -38,12 +155,10 @@ class ReferenceList(UserList):
         """
         Returns the distinct source field names of the specified source collection.
         """
-        distinct_source_field_names = []
-        for reference in self.data:
-            if reference.source_collection_name == collection_name:
-                if reference.source_field_name not in distinct_source_field_names:
-                    distinct_source_field_names.append(reference.source_field_name)
-        return distinct_source_field_names
+        source_field_names_by_source_collection_name = self._get_lookup_tables()[
+            "source_field_names_by_source_collection_name"
+        ]
+        return list(source_field_names_by_source_collection_name.get(collection_name, []))
 
     def get_target_collection_names(
         self,
@@ -54,17 +169,24 @@ class ReferenceList(UserList):
         Returns a list of the names of the collections in which a [target] document referenced by the specified field
         of a [source] document representing an instance of the specified schema class, might exist.
 
-        TODO: Execution spends a lot of time in this function. Consider replacing it with something faster (e.g. a LUT).
+        Note: The scanners call this once per reference field of each document they scan, so it uses a lookup table.
         """
-        target_collection_names = []
-        for reference in self.data:  # note: in a `UserList`, `self.data` refers to the underlying list data structure
-
-            # If this reference's source describes the specified source, record the reference's target collection name.
-            if reference.source_class_name == source_class_name and reference.source_field_name == source_field_name:
-                target_collection_names.append(reference.target_collection_name)
+        target_collection_names_by_source_class_and_field_name = self._get_lookup_tables()[
+            "target_collection_names_by_source_class_and_field_name"
+        ]
+        return list(
+            target_collection_names_by_source_class_and_field_name.get((source_class_name, source_field_name), [])
+        )
 
-        distinct_target_collection_names = list(set(target_collection_names))
-        return distinct_target_collection_names
+    def get_target_class_names(self, source_class_name: str, source_field_name: str) -> list[str]:
+        r"""
+        Returns a list of the names of the schema classes of which a [target] document referenced by the specified
+        field of a [source] document representing an instance of the specified schema class, might be an instance.
+        """
+        target_class_names_by_source_class_and_field_name = self._get_lookup_tables()[
+            "target_class_names_by_source_class_and_field_name"
+        ]
+        return list(target_class_names_by_source_class_and_field_name.get((source_class_name, source_field_name), []))
 
     def get_groups(self, field_names: list[str]):
         r"""
@@ -106,20 +228,12 @@ class ReferenceList(UserList):
 
         Example: {"Study": ["part_of"]}
         """
-        reference_field_names_by_source_class_name: Dict[str, List[str]] = {}
-        for reference in self.data:
-            source_class_name = reference.source_class_name
-            source_field_name = reference.source_field_name
-
-            # Initialize a dictionary item for this source class, if one doesn't already exist.
-            if source_class_name not in reference_field_names_by_source_class_name.keys():
-                reference_field_names_by_source_class_name[source_class_name] = []
-
-            # If the source field name isn't already in this class's list, append it.
-            if source_field_name not in reference_field_names_by_source_class_name[source_class_name]:
-                reference_field_names_by_source_class_name[source_class_name].append(source_field_name)
+        source_field_names_by_source_class_name = self._get_lookup_tables()["source_field_names_by_source_class_name"]
 
-        return reference_field_names_by_source_class_name
+        # Return a copy, so that the caller cannot modify the lookup table.
+        return {
+            class_name: list(field_names) for class_name, field_names in source_field_names_by_source_class_name.items()
+        }
 
     def as_table(self) -> Table:
         r"""
@@ -0,0 +1,33 @@
+from typing import Tuple
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class ScanPlan:
+    """
+    The information a scanner needs in order to extract the references from a document whose `type` field has a given
+    value (i.e. a given `class_uri`); compiled once, before the scan begins.
+    """
+
+    class_uri: str = field()  # e.g. "nmdc:Biosample"
+    class_name: str = field()  # e.g. "Biosample"
+
+    # The fields of the class that can contain references, in the order in which the scanner checks them; each paired
+    # with the (sorted) names of the collections in which the schema allows the referenced documents to exist.
+    # e.g. (("associated_studies", ("study_set",)), ...)
+    reference_fields: Tuple[Tuple[str, Tuple[str, ...]], ...] = field(default=())
+
+    @property
+    def reference_field_names(self) -> Tuple[str, ...]:
+        r"""Returns the names of the fields that can contain references, in the order in which they are checked."""
+        return tuple(field_name for field_name, _ in self.reference_fields)
+
+    def get_target_collection_names(self, field_name: str) -> Tuple[str, ...]:
+        r"""
+        Returns the (sorted) names of the collections in which the schema allows the documents referenced by the
+        specified field to exist; or an empty tuple if the field cannot contain references.
+        """
+        for name, target_collection_names in self.reference_fields:
+            if name == field_name:
+                return target_collection_names
+        return ()
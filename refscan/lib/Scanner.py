@@ -0,0 +1,997 @@
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from queue import Queue
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Pattern, Tuple
+import math
+import multiprocessing
+import queue
+import re
+import threading
+import time
+
+from bson import ObjectId, decode, encode
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from linkml_runtime import SchemaView
+from pymongo.cursor import Cursor
+from rich.progress import Progress
+from rich.table import Column, Table
+
+from refscan.lib.CursorBatchSizeTuner import CursorBatchSizeTuner
+from refscan.lib.DocumentPrefetcher import DocumentPrefetcher
+from refscan.lib.Finder import Finder
+from refscan.lib.HashedIdIndex import HashedIdIndex
+from refscan.lib.IdIndex import IdIndex
+from refscan.lib.MappedIdIndex import MappedIdIndex
+from refscan.lib.MicroBatch import MicroBatch
+from refscan.lib.MisplacedDocumentLocator import MisplacedDocumentLocator
+from refscan.lib.Partition import Partition
+from refscan.lib.ReferenceList import ReferenceList
+from refscan.lib.ScanPlan import ScanPlan
+from refscan.lib.SchemaAnalyzer import SchemaAnalyzer
+from refscan.lib.Violation import (
+    Violation,
+    REASON_MALFORMED_TARGET_ID,
+    REASON_TARGET_IN_INELIGIBLE_COLLECTION,
+    REASON_TARGET_NOT_FOUND,
+)
+from refscan.lib.ViolationList import ViolationList
+from refscan.lib.constants import console
+from refscan.lib.helpers import connect_to_database
+
+# A function the scanner calls after processing each document; it receives the number of documents
+# processed (since the previous call) and the number of violations found so far in the collection.
+ProgressCallback = Callable[[int, int], None]
+
+# A function the scanner calls after processing each batch of documents (in `_id` order); it receives the `_id` of the
+# last document processed, the number of documents processed so far, and the violations found so far in the collection.
+CheckpointCallback = Callable[[Any, int, ViolationList], None]
+
+# The number of `_id` values we sample, per partition, when splitting a collection into partitions.
+NUM_SAMPLES_PER_PARTITION = 20
+
+# The minimum number of target `id`s we look up per task, when spreading the lookups over multiple threads; so that a
+# handful of `id`s doesn't get spread over a handful of queries.
+MIN_IDS_PER_LOOKUP_TASK = 100
+
+# The ways a progress bar's total (i.e. the number of relevant documents) can be determined: by counting the relevant
+# documents before scanning them ("exact"), by estimating it from the collection's metadata ("estimate"), or by
+# counting the relevant documents in a background thread while scanning them ("background").
+PROGRESS_TOTAL_EXACT = "exact"
+PROGRESS_TOTAL_ESTIMATE = "estimate"
+PROGRESS_TOTAL_BACKGROUND = "background"
+
+# The minimum amount of time between consecutive progress reports sent by a worker process to the main process.
+PROGRESS_REPORT_INTERVAL_IN_SECONDS = 0.5
+
+
+class Scanner:
+    r"""
+    A class that can be used to scan a source collection for referential integrity violations.
+
+    Note: The scanner uses the reference catalog (i.e. the `ReferenceList`) to know which of the collection's
+          documents' fields can contain references, and which collections can contain the referenced documents;
+          and it uses the finder to check whether those referenced documents exist.
+
+    Note: The scanner processes each collection via a pipeline of stages, which pass micro-batches of documents (see
+          `MicroBatch`) from one to the next: the source reader (`read_micro_batches`), the extractor
+          (`extract_references_in_micro_batch`), the resolver (`resolve_references_in_micro_batch`), and the sink
+          (`record_violations_in_micro_batch`). A subclass can replace any one stage by overriding its method. The
+          scanner keeps track of the time each stage spends in its `stats`.
+    """
+
+    # Note: This indicates whether the scanner calls its progress callback once per document it processes. If it
+    #       doesn't, whatever is tracking its progress has to mark the scan as complete once it ends.
+    reports_progress_per_document = True
+
+    def __init__(
+        self,
+        finder: Finder,
+        schema_view: SchemaView,
+        references: ReferenceList,
+        collection_names: List[str],
+        lookup_batch_size: int = 1000,
+        locate_misplaced_documents: bool = False,
+        index_misplaced_documents: bool = False,
+        sort_documents_by_id: bool = False,
+        validate_target_ids: bool = False,
+        use_raw_bson_documents: bool = False,
+        prefetch_queue_depth: int = 0,
+        adapt_cursor_batch_size: bool = False,
+        lookup_threads: int = 1,
+        verbose: bool = False,
+    ):
+        self.finder = finder
+        self.db = finder.db
+        self.schema_view = schema_view
+        self.references = references
+        self.collection_names = collection_names  # names of all collections described by the schema
+        self.lookup_batch_size = lookup_batch_size
+        self.lookup_threads = lookup_threads  # number of threads among which to spread each batch's lookups
+        self.locate_misplaced_documents = locate_misplaced_documents
+        self.misplaced_document_locator: Optional[MisplacedDocumentLocator] = None
+        if locate_misplaced_documents and index_misplaced_documents:
+            self.misplaced_document_locator = MisplacedDocumentLocator(self.db, collection_names)
+        self.sort_documents_by_id = sort_documents_by_id  # whether to process documents in `_id` order
+        self.use_raw_bson_documents = use_raw_bson_documents  # whether to decode source documents lazily
+        self.prefetch_queue_depth = prefetch_queue_depth  # if 0, documents are fetched only when they are needed
+        self.cursor_batch_size_tuner: Optional[CursorBatchSizeTuner] = None
+        if adapt_cursor_batch_size:
+            self.cursor_batch_size_tuner = CursorBatchSizeTuner()
+        self.verbose = verbose
+
+        # Get a dictionary that maps source class names to the names of their fields that can contain references.
+        self.reference_field_names_by_source_class_name = references.get_reference_field_names_by_source_class_name()
+
+        # Compile a scan plan for each `type` value a document can have, so that the scanner can get everything it
+        # needs to know about a document's class via a single dictionary lookup.
+        self.schema_analyzer = SchemaAnalyzer(schema_view)
+        self.scan_plans_by_class_uri = self.compile_scan_plans()
+
+        # If the user opted to validate target `id`s, compile the `id` patterns the schema specifies for the classes
+        # each reference field can target, so that the scanner can recognize values that cannot possibly be the `id`
+        # of any document the field is allowed to reference (and report them without searching the database).
+        self.validate_target_ids = validate_target_ids
+        self.target_id_regexes_by_source_class_and_field_name: Dict[Tuple[str, str], Pattern] = {}
+        if validate_target_ids:
+            self.target_id_regexes_by_source_class_and_field_name = self.compile_target_id_regexes()
+
+        # Count the relevant documents whose `type` values do not correspond to any schema class, by `type` value.
+        #
+        # Note: A `type` value that is missing or is not a string is counted under `None`.
+        #
+        self.num_documents_by_unknown_type: Counter = Counter()
+
+        # Keep track of how many source documents the scanner fetched, how much time it spent waiting for the database
+        # to send them (which, unless the scanner uses raw BSON documents, includes the time pymongo spent decoding
+        # each one into a dictionary), and how much time it spent decoding raw BSON documents; as well as the
+        # statistics of the prefetcher (see `DocumentPrefetcher`) and of the cursor batch sizes, if applicable.
+        self.stats: Counter = Counter()
+
+    def compile_scan_plans(self) -> Dict[str, ScanPlan]:
+        r"""
+        Returns a dictionary that maps each `class_uri` in the schema (i.e. each value the `type` field of a document
+        can have) to the scan plan for documents having that `type`.
+
+        Note: If multiple classes have the same `class_uri`, the first one (in the order in which the `SchemaView`
+              lists them) is the one whose plan gets used.
+        """
+        scan_plans_by_class_uri: Dict[str, ScanPlan] = {}
+        for class_uri, class_name in self.schema_analyzer.class_names_by_class_uri.items():
+            reference_fields = []
+            for field_name in self.reference_field_names_by_source_class_name.get(class_name, []):
+                target_collection_names = tuple(
+                    sorted(
+                        self.references.get_target_collection_names(
+                            source_class_name=class_name,
+                            source_field_name=field_name,
+                        )
+                    )
+                )
+                reference_fields.append((field_name, target_collection_names))
+
+            scan_plans_by_class_uri[class_uri] = ScanPlan(
+                class_uri=class_uri, class_name=class_name, reference_fields=tuple(reference_fields)
+            )
+        return scan_plans_by_class_uri
+
+    def compile_target_id_regexes(self) -> Dict[Tuple[str, str], Pattern]:
+        r"""
+        Returns a dictionary that maps each `(source_class_name, source_field_name)` tuple to a compiled regular
+        expression that matches every value that is a valid `id` of an instance of any class the field can target.
+
+        Note: If any of the classes a field can target has no `id` pattern, any value could be the `id` of an instance
+              of that class; so we don't compile a regular expression for that field (i.e. we don't validate it).
+
+        Note: LinkML patterns are matched the way JSON Schema patterns are (i.e. they are not implicitly anchored),
+              so we use `re.search`, not `re.match`, to match them.
+              Reference: https://linkml.io/linkml/schemas/constraints.html#pattern
+        """
+        target_id_regexes_by_source_class_and_field_name: Dict[Tuple[str, str], Pattern] = {}
+        for source_class_name, field_names in self.reference_field_names_by_source_class_name.items():
+            for field_name in field_names:
+                target_class_names = self.references.get_target_class_names(source_class_name, field_name)
+                patterns = [self.schema_analyzer.get_id_pattern_of_class(name) for name in target_class_names]
+                if len(patterns) == 0 or None in patterns:
+                    continue
+                regex = re.compile("|".join(f"(?:{pattern})" for pattern in sorted(set(patterns))))
+                target_id_regexes_by_source_class_and_field_name[(source_class_name, field_name)] = regex
+        return target_id_regexes_by_source_class_and_field_name
+
+    def is_malformed_target_id(self, source_class_name: Optional[str], source_field_name: str, target_id) -> bool:
+        r"""
+        Returns `True` if the specified value cannot possibly be the `id` of any document the specified field of an
+        instance of the specified class is allowed to reference, according to the `id` patterns in the schema (which
+        only ever match strings). Returns `False` if the value might be such an `id`, or if the scanner isn't
+        validating the `id`s the field references.
+        """
+        regex = self.target_id_regexes_by_source_class_and_field_name.get((source_class_name, source_field_name))
+        if regex is None:
+            return False
+        return not isinstance(target_id, str) or regex.search(target_id) is None
+
+    def scan_plans_as_table(self) -> Table:
+        r"""
+        Returns the scan plans as a `rich.Table` instance, with one row per field that can contain references.
+        """
+        table = Table(
+            Column(header="Type (class URI)", footer=f"{len(self.scan_plans_by_class_uri)} plans"),
+            Column(header="Class"),
+            Column(header="Reference field"),
+            Column(header="Target collection(s)"),
+            title="Scan plans",
+            show_footer=True,
+        )
+        for class_uri, scan_plan in sorted(self.scan_plans_by_class_uri.items()):
+            if len(scan_plan.reference_fields) == 0:
+                table.add_row(class_uri, scan_plan.class_name, "", "")
+            for field_name, target_collection_names in scan_plan.reference_fields:
+                table.add_row(class_uri, scan_plan.class_name, field_name, ", ".join(target_collection_names))
+        return table
+
+    def get_query_filter_and_projection(self, source_collection_name: str) -> Tuple[dict, List[str]]:
+        r"""
+        Returns the query filter and projection we use to fetch the relevant documents from the specified collection.
+
+        Note: The relevant documents are those that have _any_ of the fields (of classes whose instances are allowed
+              to reside in this collection) that the schema allows to contain a reference to an instance.
+        """
+        source_field_names = self.references.get_source_field_names_of_source_collection(source_collection_name)
+        or_terms = [{field_name: {"$exists": True}} for field_name in source_field_names]
+        query_filter = {"$or": or_terms}
+
+        # Ensure the fields we fetch include:
+        # - "id" (so we can produce a more user-friendly report later)
+        # - "type" (so we can map the document to a schema class)
+        additional_field_names_for_projection = []
+        if "id" not in source_field_names:
+            additional_field_names_for_projection.append("id")
+        if "type" not in source_field_names:
+            additional_field_names_for_projection.append("type")
+        query_projection = source_field_names + additional_field_names_for_projection
+
+        return query_filter, query_projection
+
+    def count_relevant_documents(self, source_collection_name: str, partition: Optional[Partition] = None) -> int:
+        r"""
+        Returns the number of relevant documents in the specified collection (or in the specified partition of it).
+        """
+        query_filter, _ = self.get_query_filter_and_projection(source_collection_name)
+        if partition is not None and partition.num_partitions > 1:
+            query_filter = {"$and": [query_filter, partition.get_query_filter()]}
+        return self.db.get_collection(source_collection_name).count_documents(query_filter)
+
+    def estimate_num_relevant_documents(
+        self, source_collection_name: str, partition: Optional[Partition] = None
+    ) -> int:
+        r"""
+        Returns an estimate of the number of relevant documents in the specified collection (or in the specified
+        partition of it); i.e. the number of documents in the collection, according to the collection's metadata
+        (divided evenly among the partitions).
+
+        Note: Unlike `count_relevant_documents`, this does not read any documents. Since not every document in the
+              collection is necessarily relevant, the estimate tends to be too high.
+              Reference: https://pymongo.readthedocs.io/en/stable/api/pymongo/collection.html#pymongo.collection.Collection.estimated_document_count
+        """
+        num_documents = self.db.get_collection(source_collection_name).estimated_document_count()
+        num_partitions = 1 if partition is None else partition.num_partitions
+        return math.ceil(num_documents / num_partitions)
+
+    def get_partitions(self, source_collection_name: str, num_partitions: int) -> List[Partition]:
+        r"""
+        Splits the specified collection into (up to) the specified number of partitions, based upon a random sample
+        of the `_id` values of its documents. Returns the partitions in `_id` order.
+
+        Note: If the collection's `_id` values are not all `ObjectId`s (or the sample is too small to split), this
+              returns a single partition that spans the whole collection.
+
+        References:
+        - https://www.mongodb.com/docs/manual/reference/operator/aggregation/sample/
+        """
+        if num_partitions <= 1:
+            return [Partition(collection_name=source_collection_name)]
+
+        # Get a sorted, random sample of the `_id` values in the collection.
+        pipeline = [
+            {"$sample": {"size": num_partitions * NUM_SAMPLES_PER_PARTITION}},
+            {"$project": {"_id": 1}},
+            {"$sort": {"_id": 1}},
+        ]
+        collection = self.db.get_collection(source_collection_name)
+        sampled_ids = [document["_id"] for document in collection.aggregate(pipeline)]
+        if len(sampled_ids) == 0 or not all(isinstance(_id, ObjectId) for _id in sampled_ids):
+            return [Partition(collection_name=source_collection_name)]
+
+        # Use evenly-spaced values from the sample as the boundaries between partitions.
+        boundaries = []
+        for i in range(1, num_partitions):
+            boundary = sampled_ids[len(sampled_ids) * i // num_partitions]
+            if len(boundaries) == 0 or boundary != boundaries[-1]:
+                boundaries.append(boundary)
+        lower_bounds = [None] + boundaries
+        upper_bounds = boundaries + [None]
+        return [
+            Partition(
+                collection_name=source_collection_name,
+                index=i,
+                num_partitions=len(lower_bounds),
+                lower_bound=lower_bound,
+                upper_bound=upper_bound,
+            )
+            for i, (lower_bound, upper_bound) in enumerate(zip(lower_bounds, upper_bounds))
+        ]
+
+    def get_partitions_of_collections(
+        self,
+        source_collection_names: List[str],
+        max_partitions_per_collection: int,
+        min_documents_per_partition: int,
+    ) -> List[Partition]:
+        r"""
+        Splits each of the specified collections into partitions (see `get_partitions`), based upon the number of
+        documents in it (according to the collection's metadata). Returns the partitions of all the collections, in
+        the order in which they should be scanned; i.e. those of the largest collection first (so that, when several
+        workers scan the partitions, no large collection is left running on its own at the end).
+
+        :param max_partitions_per_collection: The maximum number of partitions into which to split a collection
+        :param min_documents_per_partition: The minimum number of documents per partition
+        """
+        num_documents_by_collection_name = {
+            collection_name: self.db.get_collection(collection_name).estimated_document_count()
+            for collection_name in source_collection_names
+        }
+        partitions = []
+        for collection_name in sorted(source_collection_names, key=num_documents_by_collection_name.get, reverse=True):
+            num_documents = num_documents_by_collection_name[collection_name]
+            num_partitions = min(max_partitions_per_collection, num_documents // min_documents_per_partition)
+            partitions.extend(self.get_partitions(collection_name, num_partitions=num_partitions))
+        return partitions
+
+    def scan_collection(
+        self,
+        source_collection_name: str,
+        on_progress: Optional[ProgressCallback] = None,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+        on_checkpoint: Optional[CheckpointCallback] = None,
+    ) -> ViolationList:
+        r"""
+        Scans the relevant documents in the specified collection (or in the specified partition of it), and returns
+        a list of the violations found.
+
+        Note: When scanning one of several partitions of a collection, the documents are processed in `_id` order, so
+              that the violations found in all the partitions can be combined in `_id` order.
+
+        :param resume_after: The `_id` of the last document processed by a previous (interrupted) scan of this
+                             collection, if any. When specified, the scan skips that document and all the ones
+                             preceding it in `_id` order.
+        :param on_checkpoint: A function the scanner calls after processing each batch of documents, so that the
+                              caller can save the state of the scan (see `CheckpointCallback`)
+        """
+        # If the scanner was configured to use multiple lookup threads, make a pool of them.
+        #
+        # Note: The threads share the finder, and therefore share the `MongoClient`'s connection pool. Since pymongo
+        #       releases the GIL while waiting for the server to respond, the threads' queries overlap.
+        #
+        if self.lookup_threads > 1:
+            with ThreadPoolExecutor(max_workers=self.lookup_threads, thread_name_prefix="refscan-lookup") as executor:
+                return self._scan_collection_sync(
+                    source_collection_name, on_progress, partition, resume_after, on_checkpoint, executor
+                )
+        return self._scan_collection_sync(source_collection_name, on_progress, partition, resume_after, on_checkpoint)
+
+    def _scan_collection_sync(
+        self,
+        source_collection_name: str,
+        on_progress: Optional[ProgressCallback] = None,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+        on_checkpoint: Optional[CheckpointCallback] = None,
+        lookup_executor: Optional[ThreadPoolExecutor] = None,
+    ) -> ViolationList:
+        r"""
+        Does the work of `scan_collection`, spreading the lookups over the threads of the specified executor, if any.
+
+        Note: This method's name differs from that of the `AsyncScanner`'s `_scan_collection` coroutine, so that the
+              latter (which has a different signature and return type) does not override it.
+        """
+        violations = ViolationList()
+        num_documents_processed = 0
+
+        # Process the relevant documents in micro-batches, so that we can look up the targets of all the references
+        # in a given batch of documents via a few bulk queries, instead of via one query per reference. Each
+        # micro-batch passes through the stages of the pipeline in order, and we keep track of how long each stage
+        # spends on the micro-batches (the source reader keeps track of its own time; see `fetch_seconds`).
+        stages = [
+            ("extract", self.extract_references_in_micro_batch),
+            ("resolve", partial(self.resolve_references_in_micro_batch, lookup_executor=lookup_executor)),
+            ("sink", partial(self.record_violations_in_micro_batch, violations=violations, on_progress=on_progress)),
+        ]
+        for micro_batch in self.read_micro_batches(source_collection_name, partition, resume_after):
+            for stage_name, run_stage in stages:
+                stage_start_time = time.perf_counter()
+                run_stage(micro_batch)
+                self.stats[f"{stage_name}_seconds"] += time.perf_counter() - stage_start_time
+
+            # Report that the scan has gotten through this micro-batch.
+            num_documents_processed += len(micro_batch.documents)
+            if on_checkpoint is not None:
+                on_checkpoint(micro_batch.documents[-1]["_id"], num_documents_processed, violations)
+
+        return violations
+
+    def read_micro_batches(
+        self,
+        source_collection_name: str,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+    ) -> Iterator[MicroBatch]:
+        r"""
+        Source reader stage: Yields micro-batches of up to `lookup_batch_size` of the relevant documents in the
+        specified collection (or in the specified partition of it).
+        """
+        documents = self.find_relevant_documents(source_collection_name, partition=partition, resume_after=resume_after)
+        for batch_of_documents in self.fetch_batches_of_documents(documents, source_collection_name):
+            yield MicroBatch(source_collection_name=source_collection_name, documents=batch_of_documents)
+
+    def extract_references_in_micro_batch(self, micro_batch: MicroBatch) -> None:
+        r"""
+        Extractor stage: Extracts the references from each document in the micro-batch, and groups their target `id`s
+        by the combination of collections in which the schema allows the referenced documents to exist (and, if there
+        are multiple such collections, by routing key; so the finder can search them in the best order).
+
+        Note: We leave out the `id`s that we know, without searching for them, cannot be the `id`s of any eligible
+              document (i.e. malformed ones), as well as those that can't be used as dictionary keys (the sink looks
+              those up by themselves).
+        """
+        for document in micro_batch.documents:
+            source_class_name, references_in_document = self.get_references_in_document(document)
+            for field_name, target_collection_names, target_ids in references_in_document:
+                lookup_key = self.make_lookup_key(source_class_name, field_name, target_collection_names)
+                micro_batch.target_ids_by_lookup_key.setdefault(lookup_key, set()).update(
+                    target_id
+                    for target_id in target_ids
+                    if isinstance(target_id, Hashable)
+                    and not self.is_malformed_target_id(source_class_name, field_name, target_id)
+                )
+            micro_batch.references_by_document.append((document, source_class_name, references_in_document))
+
+    def resolve_references_in_micro_batch(
+        self, micro_batch: MicroBatch, lookup_executor: Optional[ThreadPoolExecutor] = None
+    ) -> None:
+        r"""
+        Resolver stage: Looks up the targets of all the references in the micro-batch, via a few bulk queries
+        (spread over the threads of the specified executor, if any).
+        """
+        micro_batch.name_of_collection_containing_target_by_lookup_key_and_id = self.find_targets(
+            micro_batch.target_ids_by_lookup_key, lookup_executor=lookup_executor
+        )
+
+    def record_violations_in_micro_batch(
+        self,
+        micro_batch: MicroBatch,
+        violations: ViolationList,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> None:
+        r"""
+        Sink stage: Appends a violation to the specified list for each reference in the micro-batch whose target was
+        not found (in document order), and reports each document's contribution to the progress.
+        """
+        name_of_collection_containing_target_by_lookup_key_and_id = (
+            micro_batch.name_of_collection_containing_target_by_lookup_key_and_id
+        )
+        for document, source_class_name, references_in_document in micro_batch.references_by_document:
+            for field_name, target_collection_names, target_ids in references_in_document:
+                lookup_key = self.make_lookup_key(source_class_name, field_name, target_collection_names)
+                for target_id in target_ids:
+                    if self.is_malformed_target_id(source_class_name, field_name, target_id):
+                        # Note: We know the target doesn't exist (among the eligible collections) without
+                        #       searching for it.
+                        name_of_collection_containing_target_document = None
+                    elif isinstance(target_id, Hashable):
+                        name_of_collection_containing_target_document = (
+                            name_of_collection_containing_target_by_lookup_key_and_id[lookup_key][target_id]
+                        )
+                    else:
+                        # Note: A value that isn't hashable (e.g. a dictionary) can't be used as a dictionary
+                        #       key, so we look up the target of such a reference by itself.
+                        name_of_collection_containing_target_document = (
+                            self.finder.check_whether_document_having_id_exists_among_collections(
+                                collection_names=list(target_collection_names),
+                                document_id=target_id,
+                                routing_key=lookup_key[1],
+                            )
+                        )
+                    if name_of_collection_containing_target_document is None:
+                        if self.locate_misplaced_documents:
+                            name_of_collection_containing_target_document = self.locate_misplaced_document(
+                                target_id=target_id, target_collection_names=target_collection_names
+                            )
+                        violation = self.make_violation(
+                            source_collection_name=micro_batch.source_collection_name,
+                            document=document,
+                            source_class_name=source_class_name,
+                            source_field_name=field_name,
+                            target_collection_names=target_collection_names,
+                            target_id=target_id,
+                            name_of_collection_containing_target=name_of_collection_containing_target_document,
+                        )
+                        violations.append(violation)
+
+            # Report the current document's contribution to the progress.
+            if on_progress is not None:
+                on_progress(1, len(violations))
+
+    def find_targets(
+        self, target_ids_by_lookup_key: Dict[tuple, set], lookup_executor: Optional[ThreadPoolExecutor] = None
+    ) -> Dict[tuple, Dict[Hashable, Optional[str]]]:
+        r"""
+        Looks up the specified target `id`s, which are grouped by lookup key (see `make_lookup_key`). Returns a
+        dictionary that maps each lookup key to a dictionary that maps each of its target `id`s to the name of the
+        collection containing the targeted document, or to `None` if no eligible collection contains it.
+
+        Note: If an executor is specified, we split each lookup key's `id`s into chunks (one per lookup thread, but
+              no smaller than `MIN_IDS_PER_LOOKUP_TASK`) and look up the chunks in the executor's threads. Since each
+              `id`'s result does not depend on which chunk it is in, the results are the same either way.
+        """
+        if lookup_executor is None:
+            return {
+                lookup_key: self.finder.find_collections_containing_documents(
+                    document_ids=target_ids,
+                    collection_names=list(lookup_key[0]),
+                    routing_key=lookup_key[1],
+                )
+                for lookup_key, target_ids in target_ids_by_lookup_key.items()
+            }
+
+        futures: List[Tuple[tuple, Future]] = []
+        for lookup_key, target_ids in target_ids_by_lookup_key.items():
+            target_ids = list(target_ids)
+            chunk_size = max(MIN_IDS_PER_LOOKUP_TASK, math.ceil(len(target_ids) / self.lookup_threads))
+            for i in range(0, len(target_ids), chunk_size):
+                future = lookup_executor.submit(
+                    self.finder.find_collections_containing_documents,
+                    document_ids=target_ids[i : i + chunk_size],
+                    collection_names=list(lookup_key[0]),
+                    routing_key=lookup_key[1],
+                )
+                futures.append((lookup_key, future))
+
+        name_of_collection_containing_target_by_lookup_key_and_id = {
+            lookup_key: {} for lookup_key in target_ids_by_lookup_key
+        }
+        for lookup_key, future in futures:
+            name_of_collection_containing_target_by_lookup_key_and_id[lookup_key].update(future.result())
+        return name_of_collection_containing_target_by_lookup_key_and_id
+
+    @staticmethod
+    def make_lookup_key(source_class_name: str, source_field_name: str, target_collection_names: tuple) -> tuple:
+        r"""
+        Returns a `(target_collection_names, routing_key)` tuple, by which the scanner groups the target `id`s it
+        looks up together; where the routing key tells the finder which kind of reference (i.e. which source class
+        and field) the `id`s come from, so it can search the target collections in the order most likely to find
+        the documents soonest.
+
+        Note: When there is only one target collection, there is nothing to route; so we omit the routing key, which
+              lets the scanner look up the `id`s referenced by different fields together.
+        """
+        if len(target_collection_names) > 1:
+            return target_collection_names, (source_class_name, source_field_name)
+        return target_collection_names, None
+
+    def fetch_batches_of_documents(
+        self, documents: Iterable, source_collection_name: Optional[str] = None
+    ) -> Iterator[list]:
+        r"""
+        Yields lists of up to `lookup_batch_size` consecutive documents from the specified cursor over the specified
+        collection, keeping track of how many documents were fetched and how long the scanner waited for them.
+
+        Note: If the scanner was configured to prefetch documents, it reads the batches in a background thread, so
+              that the database can be sending the next batches while the scanner is processing the current one.
+              In that case, `fetch_seconds` is the time the background thread spent fetching them, and
+              `prefetch_stall_seconds` is the time the scanner spent waiting for them.
+        """
+        batches_of_documents = self.read_batches_of_documents(documents, source_collection_name)
+        if self.prefetch_queue_depth > 0:
+            batches_of_documents = DocumentPrefetcher(
+                batches_of_documents, queue_depth=self.prefetch_queue_depth, stats=self.stats
+            )
+        yield from batches_of_documents
+
+    def read_batches_of_documents(
+        self, documents: Iterable, source_collection_name: Optional[str] = None
+    ) -> Iterator[list]:
+        r"""
+        Yields lists of up to `lookup_batch_size` consecutive documents from the specified cursor over the specified
+        collection, reporting what it observes about the documents to the cursor batch size tuner (if any).
+        """
+        iterator = iter(documents)
+        while True:
+            fetch_start_time = time.perf_counter()
+            batch_of_documents = list(islice(iterator, self.lookup_batch_size))
+            fetch_duration = time.perf_counter() - fetch_start_time
+            self.stats["fetch_seconds"] += fetch_duration
+            if len(batch_of_documents) == 0:
+                break
+            self.stats["documents_fetched"] += len(batch_of_documents)
+            if self.cursor_batch_size_tuner is not None:
+                # Note: We only measure the size of the first document in each batch, since encoding a document (in
+                #       order to measure it) takes about as long as decoding it did.
+                self.cursor_batch_size_tuner.record_batch(len(batch_of_documents), fetch_duration)
+                self.cursor_batch_size_tuner.record_document_size(
+                    source_collection_name, self.get_document_size(batch_of_documents[0])
+                )
+            yield batch_of_documents
+
+    @staticmethod
+    def get_document_size(document) -> int:
+        r"""Returns the size, in bytes, of the BSON representation of the specified document."""
+        if isinstance(document, RawBSONDocument):
+            return len(document.raw)
+        return len(encode(document))
+
+    def find_relevant_documents(
+        self,
+        source_collection_name: str,
+        partition: Optional[Partition] = None,
+        resume_after: Optional[Any] = None,
+    ) -> Cursor:
+        r"""
+        Returns a cursor over the relevant documents in the specified collection (or in the specified partition of it);
+        excluding, if `resume_after` is specified, the document having that `_id` and all the ones preceding it.
+
+        Note: When the partition is one of several partitions of a collection, when the scan is resuming, or when the
+              scanner was configured to sort documents by `_id`, the cursor is sorted by `_id`; so that the violations
+              found in all the partitions (or in all the runs of a resumed scan) can be combined in `_id` order.
+
+        Note: When the scanner was configured to use raw BSON documents, the cursor yields `RawBSONDocument`s, which
+              pymongo does not decode until one of their fields is accessed. Nested documents are decoded only when
+              they themselves are accessed.
+              Reference: https://pymongo.readthedocs.io/en/stable/api/bson/raw_bson.html
+        """
+        collection = self.db.get_collection(source_collection_name)
+        if self.use_raw_bson_documents:
+            collection = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+        query_filter, query_projection = self.get_query_filter_and_projection(source_collection_name)
+        is_partial_scan = partition is not None and partition.num_partitions > 1
+        and_terms = [query_filter]
+        if is_partial_scan:
+            and_terms.append(partition.get_query_filter())
+        if resume_after is not None:
+            and_terms.append({"_id": {"$gt": resume_after}})
+        if len(and_terms) > 1:
+            query_filter = {"$and": and_terms}
+        if self.verbose:
+            console.print(f"{query_filter=}")
+            console.print(f"{query_projection=}")
+
+        cursor = collection.find(query_filter, projection=query_projection)
+        if self.cursor_batch_size_tuner is not None:
+            cursor_batch_size = self.cursor_batch_size_tuner.get_batch_size(source_collection_name)
+            if cursor_batch_size is not None:
+                cursor = cursor.batch_size(cursor_batch_size)
+                self.stats["tuned_cursors"] += 1
+                self.stats["tuned_cursor_batch_size_total"] += cursor_batch_size
+                if self.verbose:
+                    console.print(f"{cursor_batch_size=}")
+        if is_partial_scan or resume_after is not None or self.sort_documents_by_id:
+            cursor = cursor.sort("_id", 1)
+        return cursor
+
+    def get_references_in_document(self, document: dict) -> Tuple[Optional[str], List[Tuple[str, tuple, list]]]:
+        r"""
+        Returns the name of the schema class of which the specified document represents an instance, and a list of
+        the references in the document. Each reference is a `(field_name, target_collection_names, target_ids)` tuple,
+        where the `target_collection_names` are the (sorted) names of the collections in which the schema allows the
+        referenced documents to exist.
+        """
+        # Get the scan plan for the document's `type`, which tells us the document's schema class name, which of its
+        # fields can contain references, and which collections can contain the documents referenced by each field.
+        #
+        # Note: The document's `type` is the `class_uri` of the schema class of which the document represents an
+        #       instance. Slot definition for that field:
+        #       https://github.com/microbiomedata/berkeley-schema-fy24/blob/fc2d9600/src/schema/basic_slots.yaml#L420-L436
+        #
+        # Note: Accessing the first field of a raw BSON document decodes the document (but not any documents nested
+        #       within it), so that's where we measure how long decoding takes.
+        #
+        if isinstance(document, RawBSONDocument):
+            decode_start_time = time.perf_counter()
+            class_uri = document.get("type")
+            self.stats["decode_seconds"] += time.perf_counter() - decode_start_time
+        else:
+            class_uri = document.get("type")
+        if not isinstance(class_uri, str):
+            class_uri = None
+        scan_plan = self.scan_plans_by_class_uri.get(class_uri)
+        if scan_plan is None:
+            self.num_documents_by_unknown_type[class_uri] += 1
+            return None, []
+
+        # Check each field that both (a) exists in the document and (b) can contain a reference.
+        source_class_name = scan_plan.class_name
+        references_in_document = []
+        for field_name, target_collection_names in scan_plan.reference_fields:
+            if field_name in document:
+                # Handle both the multi-value (array) and the single-value (scalar) case,
+                # normalizing the value or values into a list of values in either case.
+                if type(document[field_name]) is list:
+                    target_ids = document[field_name]
+                else:
+                    target_id = document[field_name]
+                    target_ids = [target_id]  # makes a one-item list
+
+                # Decode any (nested) raw BSON documents among the values, so they are reported like any other values.
+                if any(isinstance(target_id, RawBSONDocument) for target_id in target_ids):
+                    target_ids = [
+                        decode(target_id.raw) if isinstance(target_id, RawBSONDocument) else target_id
+                        for target_id in target_ids
+                    ]
+
+                references_in_document.append((field_name, target_collection_names, target_ids))
+
+        return source_class_name, references_in_document
+
+    def locate_misplaced_document(self, target_id: str, target_collection_names: tuple) -> Optional[str]:
+        r"""
+        Searches for the document having the specified `id` among all the collections _other_ than the specified
+        target collections (i.e. the ones the schema does not allow it to be in). Returns the name of the collection
+        containing it, if any; otherwise, returns `None`.
+
+        Note: If the scanner has an (indexed) misplaced document locator, we use it instead of querying the database;
+              except for `id` values that aren't hashable (e.g. dictionaries), which the locator can't index.
+        """
+        if self.misplaced_document_locator is not None and isinstance(target_id, Hashable):
+            return self.misplaced_document_locator.locate(target_id, target_collection_names)
+
+        names_of_ineligible_collections = list(set(self.collection_names) - set(target_collection_names))
+        return self.finder.check_whether_document_having_id_exists_among_collections(
+            collection_names=names_of_ineligible_collections, document_id=target_id
+        )
+
+    def make_violation(
+        self,
+        source_collection_name: str,
+        document: dict,
+        source_class_name: Optional[str],
+        source_field_name: str,
+        target_collection_names: tuple,
+        target_id: str,
+        name_of_collection_containing_target: Optional[str] = None,
+    ) -> Violation:
+        r"""
+        Returns a `Violation` describing the specified reference, whose target was not found in any of the specified
+        target collections; including the reason the reference lacks integrity.
+        """
+        # Get the document's `id` so that we can include it in this script's output.
+        source_document_object_id = document["_id"]
+        source_document_id = document["id"] if "id" in document else None
+
+        # Determine why the reference lacks integrity.
+        if self.is_malformed_target_id(source_class_name, source_field_name, target_id):
+            reason = REASON_MALFORMED_TARGET_ID
+        elif name_of_collection_containing_target is not None:
+            reason = REASON_TARGET_IN_INELIGIBLE_COLLECTION
+        else:
+            reason = REASON_TARGET_NOT_FOUND
+
+        violation = Violation(
+            source_collection_name=source_collection_name,
+            source_class_name=source_class_name,
+            source_field_name=source_field_name,
+            source_document_object_id=source_document_object_id,
+            source_document_id=source_document_id,
+            target_id=target_id,
+            name_of_collection_containing_target=name_of_collection_containing_target,
+            reason=reason,
+        )
+        if self.verbose:
+            console.print(
+                f"Failed to find document having `id` '{target_id}' "
+                f"among collections: {list(target_collection_names)}. "
+                f"{violation=}"
+            )
+        return violation
+
+
+# Note: Each worker process has its own scanner (and, therefore, its own `MongoClient` and `Finder`), which is
+#       created by the `init_worker_process` function when the worker process starts.
+_worker_scanner: Optional[Scanner] = None
+_worker_progress_queue: Optional[Queue] = None
+_worker_progress_total_mode: str = PROGRESS_TOTAL_EXACT
+
+
+def init_worker_process(
+    mongo_uri: str,
+    database_name: str,
+    schema_file_path: str,
+    references: ReferenceList,
+    collection_names: List[str],
+    scanner_class: type,
+    scanner_options: dict,
+    finder_options: dict,
+    id_index: Optional[IdIndex],
+    verify_hashed_ids: bool,
+    progress_total_mode: str,
+    progress_queue: Queue,
+) -> None:
+    r"""
+    Initializes the current worker process, so that it can scan collections.
+
+    Note: We pass the path to the schema file instead of a `SchemaView`, and we make a new `MongoClient`, because
+          neither of those can be shared between processes.
+    """
+    global _worker_scanner, _worker_progress_queue, _worker_progress_total_mode
+
+    mongo_client = connect_to_database(mongo_uri, database_name, verbose=False)
+    db = mongo_client.get_database(database_name)
+
+    # Note: A hashed (or memory-mapped) id index loses its database binding when it is sent to a worker process, so we
+    #       rebind it here.
+    if isinstance(id_index, (HashedIdIndex, MappedIdIndex)) and verify_hashed_ids:
+        id_index.db = db
+
+    _worker_scanner = scanner_class(
+        finder=Finder(database=db, id_index=id_index, **finder_options),
+        schema_view=SchemaView(schema_file_path),
+        references=references,
+        collection_names=collection_names,
+        **scanner_options,
+    )
+    _worker_progress_queue = progress_queue
+    _worker_progress_total_mode = progress_total_mode
+
+
+def scan_partition_in_worker_process(partition: Partition) -> Tuple[ViolationList, Counter, Counter, Counter]:
+    r"""
+    Scans the specified partition of a collection using the current worker process's scanner, sending progress
+    reports to the main process via the progress queue. Returns the violations found, the numbers of documents
+    having unknown `type` values (see `Scanner.num_documents_by_unknown_type`), the finder's statistics (see
+    `Finder.stats`), and the scanner's statistics (see `Scanner.stats`).
+
+    Note: In order to avoid flooding the queue, the progress reports are sent at most a few times per second.
+
+    Note: Depending upon the progress total mode (see `PROGRESS_TOTAL_EXACT`, etc.), the total number of relevant
+          documents is reported before the scan begins, estimated, or counted while the scan is underway.
+    """
+    progress_queue = _worker_progress_queue
+    _worker_scanner.num_documents_by_unknown_type.clear()  # so we only count the documents in this partition
+    _worker_scanner.finder.stats.clear()
+    _worker_scanner.stats.clear()
+
+    def report_total(count_documents: Callable[..., int]) -> None:
+        num_relevant_documents = count_documents(partition.collection_name, partition=partition)
+        progress_queue.put((partition, "total", num_relevant_documents))
+
+    counting_thread = None
+    if _worker_progress_total_mode == PROGRESS_TOTAL_BACKGROUND:
+        counting_thread = threading.Thread(
+            target=report_total, args=(_worker_scanner.count_relevant_documents,), daemon=True
+        )
+        counting_thread.start()
+    elif _worker_progress_total_mode == PROGRESS_TOTAL_ESTIMATE:
+        report_total(_worker_scanner.estimate_num_relevant_documents)
+    else:
+        report_total(_worker_scanner.count_relevant_documents)
+
+    num_documents_not_yet_reported = 0
+    time_of_last_report = time.monotonic()
+
+    def on_progress(num_documents: int, num_violations: int) -> None:
+        nonlocal num_documents_not_yet_reported, time_of_last_report
+        num_documents_not_yet_reported += num_documents
+        if time.monotonic() - time_of_last_report >= PROGRESS_REPORT_INTERVAL_IN_SECONDS:
+            progress_queue.put((partition, "advance", num_documents_not_yet_reported, num_violations))
+            num_documents_not_yet_reported = 0
+            time_of_last_report = time.monotonic()
+
+    violations = _worker_scanner.scan_collection(
+        partition.collection_name, on_progress=on_progress, partition=partition
+    )
+    progress_queue.put((partition, "advance", num_documents_not_yet_reported, len(violations)))
+
+    # Wait for the background count (if any) to finish, so it doesn't report a total after the main process has
+    # stopped listening for reports.
+    if counting_thread is not None:
+        counting_thread.join()
+
+    return (
+        violations,
+        Counter(_worker_scanner.num_documents_by_unknown_type),
+        Counter(_worker_scanner.finder.stats),
+        Counter(_worker_scanner.stats),
+    )
+
+
+def scan_partitions_in_worker_processes(
+    partitions: List[Partition],
+    num_workers: int,
+    progress: Progress,
+    initargs: tuple,
+    num_documents_by_unknown_type: Optional[Counter] = None,
+    finder_stats: Optional[Counter] = None,
+    scanner_stats: Optional[Counter] = None,
+    progress_total_mode: str = PROGRESS_TOTAL_EXACT,
+) -> Dict[str, ViolationList]:
+    r"""
+    Scans the specified partitions using a pool of worker processes, updating the specified progress bar as the
+    workers report their progress. Returns a dictionary that maps each collection name to its list of violations;
+    where the violations found in the partitions of a given collection are combined in `_id` order.
+
+    Note: The workers start scanning the partitions in the order in which they are listed, so listing the largest
+          collections first prevents a large collection that started late from being the last one still running.
+
+    Note: The `initargs` are the arguments (other than the progress total mode and the progress queue) to pass to
+          `init_worker_process`.
+
+    :param num_documents_by_unknown_type: A `Counter` to which this function will add the numbers of documents having
+                                          unknown `type` values, found by the workers
+    :param finder_stats: A `Counter` to which this function will add the statistics of the workers' finders
+    :param scanner_stats: A `Counter` to which this function will add the statistics of the workers' scanners
+    :param progress_total_mode: How the workers determine the total number of relevant documents in each partition
+                                (see `PROGRESS_TOTAL_EXACT`, etc.)
+    """
+    # Add a progress bar task for each partition, in alphabetical order.
+    task_ids = {}
+    for partition in sorted(partitions, key=lambda p: (p.collection_name, p.index)):
+        task_ids[partition] = progress.add_task(
+            partition.description,
+            total=None,  # we'll set this once a worker process has counted the relevant documents
+            num_violations=0,
+            remaining_time_label="waiting",
+        )
+
+    # Note: We use the "spawn" start method because it is not safe to fork a process that has a `MongoClient`.
+    #       Reference: https://pymongo.readthedocs.io/en/stable/faq.html#is-pymongo-fork-safe
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        progress_queue = manager.Queue()
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=context,
+            initializer=init_worker_process,
+            initargs=(*initargs, progress_total_mode, progress_queue),
+        ) as executor:
+            futures = {
+                partition: executor.submit(scan_partition_in_worker_process, partition) for partition in partitions
+            }
+
+            # Relay progress reports from the workers to the progress bar until all workers are done.
+            while True:
+                all_are_done = all(future.done() for future in futures.values())
+                try:
+                    while True:
+                        partition, kind, *values = progress_queue.get(timeout=0.1)
+                        task_id = task_ids[partition]
+                        if kind == "total":
+                            progress.update(task_id, total=values[0], remaining_time_label="remaining")
+                        else:
+                            progress.update(task_id, advance=values[0], num_violations=values[1])
+                except queue.Empty:
+                    pass
+                if all_are_done:
+                    break
+
+            # Combine the violations found in each collection's partitions, in `_id` order.
+            violations_by_collection_name: Dict[str, ViolationList] = {}
+            for partition in sorted(partitions, key=lambda p: (p.collection_name, p.index)):
+                # Note: This re-raises any exception raised in the worker process.
+                violations, unknown_type_counts, worker_finder_stats, worker_scanner_stats = futures[partition].result()
+                if num_documents_by_unknown_type is not None:
+                    num_documents_by_unknown_type.update(unknown_type_counts)
+                if finder_stats is not None:
+                    finder_stats.update(worker_finder_stats)
+                if scanner_stats is not None:
+                    scanner_stats.update(worker_scanner_stats)
+                violations_by_collection_name.setdefault(partition.collection_name, ViolationList()).extend(violations)
+
+                # Unless the total was counted exactly, make the progress bar show the number of documents the worker
+                # actually scanned, as the total.
+                if progress_total_mode != PROGRESS_TOTAL_EXACT:
+                    task = next(task for task in progress.tasks if task.id == task_ids[partition])
+                    progress.update(task_ids[partition], total=task.completed)
+                progress.update(task_ids[partition], remaining_time_label="done")
+
+    return violations_by_collection_name
@@ -0,0 +1,99 @@
+from typing import Dict, List, Optional
+import re
+
+from linkml_runtime import SchemaView
+from linkml_runtime.utils.pattern import PatternResolver
+
+# A regular expression that matches the beginning of an `id` pattern that specifies the `id`'s prefix and typecode;
+# e.g. "^(?:(nmdc):bsm-" or "^nmdc:(omprc|dgns)-". Its groups are the prefix alternatives and the typecode alternatives.
+ID_PATTERN_PREFIX_REGEX = re.compile(r"^\^?(?:\(\?:)?\(?([A-Za-z0-9_.|]+)\)?:\(?([A-Za-z0-9_|]+)\)?-")
+
+
+class SchemaAnalyzer:
+    r"""
+    A class that analyzes a schema once, so that questions about the schema that would otherwise require walking all
+    of its class definitions (e.g. "which class has this `class_uri`?") can be answered via dictionary lookups.
+
+    Note: The analyzer holds a reference to the `SchemaView` it analyzed, so that the lifetime of the indexes it builds
+          is tied to the lifetime of the analyzer (rather than to that of a module-level cache).
+    """
+
+    def __init__(self, schema_view: SchemaView):
+        self.schema_view = schema_view
+
+        # Build a reverse index that maps each `class_uri` to the name of the class having it.
+        #
+        # Note: If multiple classes have the same `class_uri`, the first one (in the order in which the `SchemaView`
+        #       lists them) is the one whose name gets used.
+        #
+        # References:
+        # - https://linkml.io/linkml/developers/schemaview.html#linkml_runtime.utils.schemaview.SchemaView.all_classes
+        # - https://linkml.io/linkml/code/metamodel.html#linkml_runtime.linkml_model.meta.ClassDefinition.class_uri
+        #
+        self.class_names_by_class_uri: Dict[str, str] = {}
+        for class_definition in schema_view.all_classes().values():
+            class_uri = class_definition.class_uri
+            if class_uri is not None and class_uri not in self.class_names_by_class_uri:
+                self.class_names_by_class_uri[class_uri] = class_definition.name
+
+    def translate_class_uri_into_schema_class_name(self, class_uri: str) -> Optional[str]:
+        r"""
+        Returns the name of the schema class that has the specified value as its `class_uri`.
+
+        Example: "nmdc:Biosample" (a `class_uri` value) -> "Biosample" (a class name)
+        """
+        return self.class_names_by_class_uri.get(class_uri)
+
+    def get_id_pattern_of_class(self, class_name: str) -> Optional[str]:
+        r"""
+        Returns the `pattern` (or interpolated `structured_pattern`) the schema specifies for the `id` slot of the
+        specified class; or `None` if the class has no `id` slot, or the slot has no pattern.
+
+        Note: Recent versions of `linkml-runtime` materialize a `structured_pattern` into a `pattern` when inducing
+              the slot; but older versions (e.g. 1.8.3, which is the version in our lock file) leave the induced
+              slot's `pattern` empty. In that case, we resolve the `structured_pattern` ourselves, the same way
+              `SchemaView.materialize_patterns` would (we don't call that method, since it modifies the schema
+              in place, and `SchemaView` may have already cached the induced slot).
+              Reference: https://linkml.io/linkml/schemas/constraints.html#structured-patterns
+        """
+        if "id" not in self.schema_view.class_slots(class_name):
+            return None
+        slot = self.schema_view.induced_slot("id", class_name)
+        if isinstance(slot.pattern, str):
+            return slot.pattern
+        structured_pattern = slot.structured_pattern
+        if structured_pattern is None or not isinstance(structured_pattern.syntax, str):
+            return None
+        if structured_pattern.interpolated:
+            return PatternResolver(self.schema_view).resolve(structured_pattern.syntax)
+        return structured_pattern.syntax
+
+    def get_id_prefixes_of_class(self, class_name: str) -> List[str]:
+        r"""
+        Returns the `id` prefixes (each consisting of a CURIE prefix and a typecode; e.g. "nmdc:bsm") that the
+        schema's `pattern` (or interpolated `structured_pattern`) for the `id` slot of the specified class allows;
+        or an empty list if the class has no `id` pattern, or its pattern does not begin with a prefix and typecode.
+        """
+        pattern = self.get_id_pattern_of_class(class_name)
+        match = ID_PATTERN_PREFIX_REGEX.match(pattern) if pattern is not None else None
+        if match is None:
+            return []
+        return [
+            f"{curie_prefix}:{typecode}"
+            for curie_prefix in match.group(1).split("|")
+            for typecode in match.group(2).split("|")
+        ]
+
+    def derive_schema_class_name_from_document(self, document: dict) -> Optional[str]:
+        r"""
+        Returns the name of the schema class, if any, of which the specified document claims to represent an instance.
+
+        This method is written under the assumption that the document has a `type` field whose value is the
+        `class_uri` belonging to the schema class of which the document represents an instance. Slot definition for
+        such a field:
+        https://github.com/microbiomedata/berkeley-schema-fy24/blob/fc2d9600/src/schema/basic_slots.yaml#L420-L436
+        """
+        class_uri = document.get("type")
+        if isinstance(class_uri, str):
+            return self.translate_class_uri_into_schema_class_name(class_uri)
+        return None
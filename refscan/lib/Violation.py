@@ -1,6 +1,11 @@
 from typing import Optional
 from dataclasses import dataclass, field
 
+# The reasons a reference can lack integrity (i.e. the values of the `reason` field of a `Violation`).
+REASON_TARGET_NOT_FOUND = "target_not_found"  # no eligible collection contains a document having the `id`
+REASON_TARGET_IN_INELIGIBLE_COLLECTION = "target_in_ineligible_collection"  # only an ineligible collection does
+REASON_MALFORMED_TARGET_ID = "malformed_target_id"  # the value doesn't match the `id` pattern of any target class
+
 
 @dataclass(frozen=True, order=True)
 class Violation:
@@ -21,3 +26,7 @@ class Violation:
     #       is not among the former is why there is a `Violation` instance describing this reference.
     #
     name_of_collection_containing_target: Optional[str] = field()
+
+    # Note: This field has a default value so that violations recorded before it existed (e.g. in a checkpoint file)
+    #       can still be loaded.
+    reason: str = field(default=REASON_TARGET_NOT_FOUND)
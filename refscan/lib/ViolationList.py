@@ -1,6 +1,6 @@
 from typing import Union
 from pathlib import Path
-from dataclasses import fields, astuple
+from dataclasses import fields
 from collections import UserList
 import csv
 
@@ -25,4 +25,4 @@ class ViolationList(UserList):
             writer = csv.writer(tsv_file, delimiter="\t")
             writer.writerow(column_names)  # header row
             for violation in self.data:
-                writer.writerow(astuple(violation))  # data row
+                writer.writerow([getattr(violation, cn) for cn in column_names])  # data row
@@ -1,13 +1,16 @@
-from typing import Optional, List
-from functools import cache
+from typing import Optional, List, Iterable, Iterator
+from itertools import islice
+from weakref import WeakKeyDictionary, proxy
 
 from pymongo import MongoClient, timeout
+from pymongo.collection import Collection
 from linkml_runtime import SchemaView, linkml_model
 from rich.console import Console
 from rich.progress import Progress, TextColumn, MofNCompleteColumn, BarColumn, TimeElapsedColumn, TimeRemainingColumn
 
 from refscan.lib.ReferenceList import ReferenceList
 from refscan.lib.Reference import Reference
+from refscan.lib.SchemaAnalyzer import SchemaAnalyzer
 from refscan.lib.constants import DATABASE_CLASS_NAME, console
 
 
@@ -30,6 +33,38 @@ def connect_to_database(mongo_uri: str, database_name: str, verbose: bool = True
     return mongo_client
 
 
+def get_id_values_in_collection(collection: Collection) -> Iterator[str]:
+    r"""
+    Yields the `id` value of each document in the specified collection that has one.
+
+    Note: When the collection has an index on its `id` field, we tell the server to use that index, so that the query
+          is a "covered query" (i.e. the server can answer it by reading the index alone, without reading documents).
+
+    References:
+    - https://www.mongodb.com/docs/manual/core/query-optimization/#covered-query
+    - https://pymongo.readthedocs.io/en/stable/api/pymongo/cursor.html#pymongo.cursor.Cursor.hint
+    """
+    cursor = collection.find({}, projection={"_id": 0, "id": 1})
+    index_keys = [index_info["key"] for index_info in collection.index_information().values()]
+    if [("id", 1)] in index_keys:
+        cursor = cursor.hint([("id", 1)])
+    for document in cursor:
+        document_id = document.get("id")  # note: documents that lack an `id` field will lack it here, too
+        if document_id is not None:
+            yield document_id
+
+
+def get_sample_of_id_values_in_collection(collection: Collection, sample_size: int) -> List[str]:
+    r"""
+    Returns the `id` values of a random sample of (up to) the specified number of documents in the specified
+    collection; omitting those of sampled documents that lack an `id`.
+
+    Reference: https://www.mongodb.com/docs/manual/reference/operator/aggregation/sample/
+    """
+    pipeline = [{"$sample": {"size": sample_size}}, {"$project": {"_id": 0, "id": 1}}]
+    return [document["id"] for document in collection.aggregate(pipeline) if document.get("id") is not None]
+
+
 def get_collection_names_from_schema(schema_view: SchemaView) -> list[str]:
     """
     Returns the names of the slots of the `Database` class that describe database collections.
@@ -64,24 +99,37 @@ def get_names_of_classes_eligible_for_collection(schema_view: SchemaView, collec
     return names_of_eligible_classes
 
 
-@cache  # memoizes the decorated function
+# The `SchemaAnalyzer` made for each `SchemaView` passed to `get_schema_analyzer`.
+#
+# Note: The dictionary only holds weak references to the `SchemaView`s, so it doesn't keep a `SchemaView` (nor its
+#       analyzer) alive after the rest of the program is done with it.
+#
+schema_analyzers_by_schema_view: "WeakKeyDictionary[SchemaView, SchemaAnalyzer]" = WeakKeyDictionary()
+
+
+def get_schema_analyzer(schema_view: SchemaView) -> SchemaAnalyzer:
+    r"""
+    Returns a `SchemaAnalyzer` for the specified `SchemaView`; making one the first time it is called for that
+    `SchemaView`, and returning the same one every time after that (since analyzing a schema is expensive).
+
+    Note: The analyzer refers to the `SchemaView` via a weak proxy, since a (strong) reference from the cached
+          analyzer to its `SchemaView` would keep the latter in the cache forever. So, the caller must keep the
+          `SchemaView` alive for as long as it uses the analyzer.
+    """
+    schema_analyzer = schema_analyzers_by_schema_view.get(schema_view)
+    if schema_analyzer is None:
+        schema_analyzer = SchemaAnalyzer(proxy(schema_view))
+        schema_analyzers_by_schema_view[schema_view] = schema_analyzer
+    return schema_analyzer
+
+
 def translate_class_uri_into_schema_class_name(schema_view: SchemaView, class_uri: str) -> Optional[str]:
     r"""
     Returns the name of the schema class that has the specified value as its `class_uri`.
 
     Example: "nmdc:Biosample" (a `class_uri` value) -> "Biosample" (a class name)
-
-    References:
-    - https://linkml.io/linkml/developers/schemaview.html#linkml_runtime.utils.schemaview.SchemaView.all_classes
-    - https://linkml.io/linkml/code/metamodel.html#linkml_runtime.linkml_model.meta.ClassDefinition.class_uri
     """
-    schema_class_name = None
-    all_class_definitions_in_schema = schema_view.all_classes()
-    for class_name, class_definition in all_class_definitions_in_schema.items():
-        if class_definition.class_uri == class_uri:
-            schema_class_name = class_definition.name
-            break
-    return schema_class_name
+    return get_schema_analyzer(schema_view).translate_class_uri_into_schema_class_name(class_uri)
 
 
 def derive_schema_class_name_from_document(schema_view: SchemaView, document: dict) -> Optional[str]:
@@ -92,11 +140,7 @@ def derive_schema_class_name_from_document(schema_view: SchemaView, document: di
     belonging to the schema class of which the document represents an instance. Slot definition for such a field:
     https://github.com/microbiomedata/berkeley-schema-fy24/blob/fc2d9600/src/schema/basic_slots.yaml#L420-L436
     """
-    schema_class_name = None
-    if "type" in document and isinstance(document["type"], str):
-        class_uri = document["type"]
-        schema_class_name = translate_class_uri_into_schema_class_name(schema_view, class_uri)
-    return schema_class_name
+    return get_schema_analyzer(schema_view).derive_schema_class_name_from_document(document)
 
 
 def init_progress_bar() -> Progress:
@@ -220,3 +264,21 @@ def identify_references(
                             references.append(reference)
 
     return references
+
+
+def split_into_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    r"""
+    Yields lists of consecutive items from the specified iterable, where each list contains up to `batch_size` items.
+
+    Example: split_into_batches([1, 2, 3, 4, 5], batch_size=2) -> [1, 2], [3, 4], [5]
+
+    Note: Python 3.12 introduced `itertools.batched`, which does something similar; but we support older versions.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch size must be at least 1.")
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if len(batch) == 0:
+            break
+        yield batch
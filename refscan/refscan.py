@@ -1,23 +1,45 @@
+from collections import Counter
+from contextlib import nullcontext
+from enum import Enum
 from pathlib import Path
+import time
 from typing import List, Optional
 from typing_extensions import Annotated
 
 import typer
 import linkml_runtime
+from rich.filesize import decimal
 
+from refscan.lib.AggregationScanner import AggregationScanner
+from refscan.lib.AsyncScanner import AsyncScanner
+from refscan.lib.BackgroundCounter import BackgroundCounter
+from refscan.lib.BloomFilterIndex import BloomFilterIndex
+from refscan.lib.Checkpoint import Checkpoint
+from refscan.lib.DistinctIdScanner import DistinctIdScanner
 from refscan.lib.Finder import Finder
+from refscan.lib.IdIndex import IdIndex
+from refscan.lib.IdPrefixRouter import IdPrefixRouter
+from refscan.lib.HashedIdIndex import HashedIdIndex
+from refscan.lib.MappedIdIndex import MappedIdIndex
+from refscan.lib.ProgressLogger import ProgressLogger
+from refscan.lib.Scanner import (
+    PROGRESS_REPORT_INTERVAL_IN_SECONDS,
+    Scanner,
+    scan_partitions_in_worker_processes,
+)
+from refscan.lib.SchemaAnalyzer import SchemaAnalyzer
 from refscan.lib.constants import console
 from refscan.lib.helpers import (
     connect_to_database,
     get_collection_names_from_schema,
-    derive_schema_class_name_from_document,
     init_progress_bar,
     get_lowercase_key,
+    get_id_values_in_collection,
+    get_sample_of_id_values_in_collection,
     print_section_header,
     get_names_of_classes_eligible_for_collection,
     identify_references,
 )
-from refscan.lib.Violation import Violation
 from refscan.lib.ViolationList import ViolationList
 from refscan import get_package_metadata
 
@@ -27,9 +49,67 @@ app = typer.Typer(
     rich_markup_mode="markdown",  # enables use of Markdown in docstrings and CLI help
 )
 
+# Make a separate program for building `id` indexes (i.e. `$ refscan-index`), which scans can reuse.
+#
+# Note: We make it a separate program (like `refgraph`), instead of a subcommand of `refscan`, because adding a
+#       subcommand would turn `refscan` into a multi-command program; which would make people type `$ refscan scan`
+#       instead of `$ refscan` to scan the database.
+#
+index_app = typer.Typer(
+    help="Builds an index of the `id`s of the documents in the database, which scans can reuse.",
+    add_completion=False,  # hides the shell completion options from `--help` output
+    rich_markup_mode="markdown",
+)
+
 app_version = get_package_metadata("Version")
 
 
+class Engine(str, Enum):
+    r"""The engine the scanner uses to schedule its database queries."""
+
+    sync = "sync"
+    async_ = "async"
+
+
+class Locator(str, Enum):
+    r"""The way the scanner locates the misplaced documents targeted by references."""
+
+    query = "query"
+    index = "index"
+
+
+class IdPrefixRouterSource(str, Enum):
+    r"""The source from which the `id` prefix router learns which collections contain which `id` prefixes."""
+
+    none = "none"
+    sample = "sample"
+    schema = "schema"
+
+
+class ProgressMode(str, Enum):
+    r"""The way the program reports its progress while scanning."""
+
+    auto = "auto"
+    bar = "bar"
+    log = "log"
+
+
+class ProgressTotal(str, Enum):
+    r"""The way the program determines the total number of relevant documents shown on each progress bar."""
+
+    exact = "exact"
+    estimate = "estimate"
+    background = "background"
+
+
+class Strategy(str, Enum):
+    r"""The strategy the scanner uses to check references."""
+
+    lookup = "lookup"
+    aggregate = "aggregate"
+    distinct = "distinct"
+
+
 def display_app_version_and_exit(is_active: bool = False) -> None:
     r"""
     Displays the app's version number, then exits.
@@ -142,6 +222,350 @@ def scan(
             ),
         ),
     ] = False,
+    locator: Annotated[
+        Locator,
+        typer.Option(
+            "--misplaced-document-locator",
+            case_sensitive=False,
+            help=(
+                "When using `--locate-misplaced-documents`, how the program searches the other collections. The "
+                "`query` locator queries the other collections one by one, for each violation. The `index` locator "
+                "reads the `id` of every document in every collection into a compact, hashed index in memory (once, "
+                "upon the first violation; in each worker process, if using `--workers`), then locates each "
+                "misplaced document via a lookup in that index (confirming each match with a query). The `index` "
+                "locator requires NumPy."
+            ),
+        ),
+    ] = Locator.query,
+    user_wants_to_validate_target_ids: Annotated[
+        bool,
+        typer.Option(
+            "--validate-target-ids",
+            help=(
+                "Check each referenced `id` against the `id` patterns the schema specifies for the classes the "
+                "reference can target, and report the ones that match none of them as violations (with the reason "
+                "`malformed_target_id`) without searching the database for them."
+            ),
+        ),
+    ] = False,
+    lookup_batch_size: Annotated[
+        int,
+        typer.Option(
+            "--lookup-batch-size",
+            min=1,
+            help=(
+                "Number of source documents whose references the program will check together, "
+                "using a few bulk queries instead of one query per reference."
+            ),
+        ),
+    ] = 1000,
+    progress_total: Annotated[
+        ProgressTotal,
+        typer.Option(
+            "--progress-total",
+            case_sensitive=False,
+            help=(
+                "How the program determines the number of relevant documents in each collection, for its progress "
+                "bar. The `exact` way counts them before scanning the collection, which reads the whole collection. "
+                "The `estimate` way uses the number of documents in the collection (according to its metadata), "
+                "which is instantaneous but usually too high. The `background` way counts them in a background "
+                "thread while the program scans the collection."
+            ),
+        ),
+    ] = ProgressTotal.exact,
+    progress_mode: Annotated[
+        ProgressMode,
+        typer.Option(
+            "--progress-mode",
+            case_sensitive=False,
+            help=(
+                "How the program reports its progress while scanning. The `bar` mode displays progress bars. The "
+                "`log` mode also prints a one-line report (documents scanned per second, lookups per second, and "
+                "violations found so far) periodically (see `--progress-log-interval`), for when the output is going "
+                "to a log file. The `auto` mode uses the `log` mode when the output is not going to a terminal."
+            ),
+        ),
+    ] = ProgressMode.auto,
+    progress_log_interval_in_seconds: Annotated[
+        float,
+        typer.Option(
+            "--progress-log-interval",
+            min=1,
+            help="Number of seconds between consecutive progress reports in the `log` progress mode.",
+        ),
+    ] = 30,
+    lookup_threads: Annotated[
+        int,
+        typer.Option(
+            "--lookup-threads",
+            min=1,
+            help=(
+                "Number of threads among which to spread the lookups for each batch of source documents (see "
+                "`--lookup-batch-size`), so that several queries can be in flight at once. The violations are still "
+                "reported in document order."
+            ),
+        ),
+    ] = 1,
+    user_wants_raw_bson_documents: Annotated[
+        bool,
+        typer.Option(
+            "--raw-bson-documents",
+            help=(
+                "Read source documents as raw BSON, which is only decoded when the program accesses the document's "
+                "fields (and, for nested documents, only when it accesses those). The scan summary reports the time "
+                "spent waiting for documents separately from the time spent decoding them."
+            ),
+        ),
+    ] = False,
+    prefetch_queue_depth: Annotated[
+        int,
+        typer.Option(
+            "--prefetch-depth",
+            min=0,
+            help=(
+                "Number of batches of source documents (see `--lookup-batch-size`) to read ahead in a background "
+                "thread, so the database can be sending documents while the program is checking the references in "
+                "the ones it already has. Use 0 to disable prefetching."
+            ),
+        ),
+    ] = 0,
+    user_wants_adaptive_cursor_batch_size: Annotated[
+        bool,
+        typer.Option(
+            "--adaptive-cursor-batch-size",
+            help=(
+                "Choose the number of source documents the database sends per round trip, for each collection (or "
+                "partition) scanned, based upon the document sizes and fetch latency observed so far; instead of "
+                "using the MongoDB driver's default. The choice is made when the program starts scanning the "
+                "collection (or partition), and is not changed partway through it; so the first collection scanned "
+                "uses the driver's default, and a large collection is only tuned partway through if it is split "
+                "into partitions (see `--workers`)."
+            ),
+        ),
+    ] = False,
+    user_wants_to_preload_target_ids: Annotated[
+        bool,
+        typer.Option(
+            "--preload-target-ids",
+            help=(
+                "Before scanning, read the `id` of every document in every collection that can contain referenced "
+                "documents, into an in-memory index; then check references against that index instead of against "
+                "the database."
+            ),
+        ),
+    ] = False,
+    user_wants_hashed_id_index: Annotated[
+        bool,
+        typer.Option(
+            "--hashed-id-index",
+            help=(
+                "Like `--preload-target-ids`, but store each `id` as a 64-bit hash in a NumPy array, which takes "
+                "much less memory. Requires NumPy."
+            ),
+        ),
+    ] = False,
+    user_wants_to_verify_hashed_ids: Annotated[
+        bool,
+        typer.Option(
+            "--verify-hashed-ids",
+            help=(
+                "When using `--hashed-id-index` or `--id-index`, confirm each hash match by querying the database, "
+                "so that a hash collision cannot hide a violation."
+            ),
+        ),
+    ] = False,
+    id_index_file_path: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--id-index",
+            exists=True,
+            dir_okay=False,
+            readable=True,
+            resolve_path=True,
+            help=(
+                "Filesystem path to an `id` index built (from the same database) via `$ refscan-index`. "
+                "The program memory-maps the file and checks references against it instead of against the database, "
+                "so scans running at the same time share a single copy of the index in memory."
+            ),
+        ),
+    ] = None,
+    user_wants_bloom_filters: Annotated[
+        bool,
+        typer.Option(
+            "--bloom-filters",
+            help=(
+                "Before scanning, build a Bloom filter of the `id`s in each collection that can contain referenced "
+                "documents; then, skip querying a collection for an `id` its filter says it definitely lacks."
+            ),
+        ),
+    ] = False,
+    bloom_filter_false_positive_rate: Annotated[
+        float,
+        typer.Option(
+            "--bloom-filter-false-positive-rate",
+            help=(
+                "When using `--bloom-filters`, the fraction of absent `id`s for which a filter will (wrongly) say the "
+                "`id` may be present. A lower rate makes the filters larger."
+            ),
+        ),
+    ] = 0.01,
+    bloom_filter_file_path: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--bloom-filter-file",
+            dir_okay=False,
+            writable=True,
+            readable=True,
+            resolve_path=True,
+            help=(
+                "Filesystem path at which you want the program to save the Bloom filters (implies `--bloom-filters`). "
+                "If the file already contains filters built from a database having the same name and the same number "
+                "of documents in each collection (e.g. the same snapshot), the program loads them instead of building "
+                "them."
+            ),
+        ),
+    ] = None,
+    num_workers: Annotated[
+        int,
+        typer.Option(
+            "--workers",
+            min=1,
+            help=(
+                "Number of worker processes to scan source collections with. Each worker process scans one "
+                "collection at a time, using its own connection to the MongoDB server."
+            ),
+        ),
+    ] = 1,
+    max_partitions_per_collection: Annotated[
+        int,
+        typer.Option(
+            "--max-partitions-per-collection",
+            min=1,
+            help=(
+                "When using multiple workers, the maximum number of `_id` ranges (partitions) to split a large "
+                "collection into, so that multiple workers can scan it at the same time. The violations found in a "
+                "collection that has been split up are reported in `_id` order."
+            ),
+        ),
+    ] = 1,
+    min_documents_per_partition: Annotated[
+        int,
+        typer.Option(
+            "--min-documents-per-partition",
+            min=1,
+            help="When splitting a collection into partitions, the minimum number of documents per partition.",
+        ),
+    ] = 100_000,
+    engine: Annotated[
+        Engine,
+        typer.Option(
+            "--engine",
+            case_sensitive=False,
+            help=(
+                "How the program schedules its database queries. The `async` engine keeps multiple lookups in "
+                "flight at once (see `--concurrency`) while it reads the source documents."
+            ),
+        ),
+    ] = Engine.sync,
+    concurrency: Annotated[
+        int,
+        typer.Option(
+            "--concurrency",
+            min=1,
+            help="When using the `async` engine, the maximum number of lookups in flight at once.",
+        ),
+    ] = 64,
+    strategy: Annotated[
+        Strategy,
+        typer.Option(
+            "--strategy",
+            case_sensitive=False,
+            help=(
+                "How the program checks references. The `lookup` strategy fetches the relevant source documents and "
+                "looks up the documents they reference. The `aggregate` strategy has the MongoDB server (version 5.0 "
+                "or later) do the lookups, via aggregation pipelines, and send only the violations to the program. "
+                "The `distinct` strategy has the MongoDB server collect the distinct `id`s referenced by each field, "
+                "checks those in bulk, then fetches only the source documents that reference missing documents."
+            ),
+        ),
+    ] = Strategy.lookup,
+    finder_cache_size: Annotated[
+        int,
+        typer.Option(
+            "--finder-cache-size",
+            min=0,
+            help=(
+                "Maximum number of lookup results (i.e. whether, and in which collection, a referenced document was "
+                "found) to keep in a least-recently-used cache, so that documents referenced by many other documents "
+                "are not looked up repeatedly. Use 0 to disable the cache."
+            ),
+        ),
+    ] = 100_000,
+    id_prefix_router_source: Annotated[
+        IdPrefixRouterSource,
+        typer.Option(
+            "--id-prefix-router",
+            case_sensitive=False,
+            help=(
+                "When a reference's target can be in several collections, search first in the collection its `id`'s "
+                "prefix and typecode (e.g. `nmdc:bsm`) predict it is in. The program learns which prefixes occur in "
+                "which collections from either a random `sample` of the `id`s in each collection, or the `id` "
+                "patterns in the `schema`."
+            ),
+        ),
+    ] = IdPrefixRouterSource.none,
+    id_prefix_sample_size: Annotated[
+        int,
+        typer.Option(
+            "--id-prefix-sample-size",
+            min=1,
+            help="When using `--id-prefix-router sample`, the number of `id`s to sample from each collection.",
+        ),
+    ] = 1000,
+    user_wants_exclusive_id_prefix_routing: Annotated[
+        bool,
+        typer.Option(
+            "--exclusive-id-prefix-routing",
+            help=(
+                "When using `--id-prefix-router`, if an `id`'s prefix has only been seen in one of the collections a "
+                "reference's target can be in, search only that collection. This saves queries, but a document whose "
+                "`id` prefix is unusual for the collection it is in will not be found."
+            ),
+        ),
+    ] = False,
+    checkpoint_file_path: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--checkpoint-file",
+            dir_okay=False,
+            writable=True,
+            readable=True,
+            resolve_path=True,
+            help=(
+                "Filesystem path at which you want the program to periodically save the state of the scan, so that "
+                "an interrupted scan can be resumed (see `--resume`). When this option is used, the documents in each "
+                "collection are scanned in `_id` order. The file is deleted once the violation report is written."
+            ),
+        ),
+    ] = None,
+    checkpoint_interval_in_seconds: Annotated[
+        float,
+        typer.Option(
+            "--checkpoint-interval",
+            min=0,
+            help="Minimum number of seconds between consecutive saves of the checkpoint file.",
+        ),
+    ] = 60,
+    user_wants_to_resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume",
+            help=(
+                "Resume the scan whose state was saved in the checkpoint file, instead of starting a new scan. "
+                "Requires `--checkpoint-file`."
+            ),
+        ),
+    ] = False,
 ):
     """
     Scans the NMDC MongoDB database for referential integrity violations.
@@ -201,8 +625,25 @@ def scan(
 
     print_section_header(console, text="Scanning for violations")
 
-    # Get a dictionary that maps source class names to the names of their fields that can contain references.
-    reference_field_names_by_source_class_name = references.get_reference_field_names_by_source_class_name()
+    # Validate the checkpoint-related options.
+    if user_wants_to_resume and checkpoint_file_path is None:
+        console.print("[red]The `--resume` option requires the `--checkpoint-file` option.[/red]")
+        raise typer.Exit(code=1)
+    if checkpoint_file_path is not None and num_workers > 1:
+        console.print("[red]The `--checkpoint-file` option cannot be used with multiple workers.[/red]")
+        raise typer.Exit(code=1)
+
+    # Validate the `id` index-related options.
+    if id_index_file_path is not None and (user_wants_to_preload_target_ids or user_wants_hashed_id_index):
+        console.print(
+            "[red]The `--id-index` option cannot be used with `--preload-target-ids` or `--hashed-id-index`.[/red]"
+        )
+        raise typer.Exit(code=1)
+
+    # Validate the Bloom filter-related options.
+    if not 0 < bloom_filter_false_positive_rate < 1:
+        console.print("[red]The `--bloom-filter-false-positive-rate` option must be between 0 and 1.[/red]")
+        raise typer.Exit(code=1)
 
     # Initialize a progress bar.
     custom_progress = init_progress_bar()
@@ -212,12 +653,231 @@ def scan(
 
     db = mongo_client.get_database(database_name)
 
+    # If the user opted to preload the `id`s of all target documents, read them into an in-memory index now.
+    id_index = None
+    if user_wants_to_preload_target_ids or user_wants_hashed_id_index:
+        if user_wants_hashed_id_index:
+            id_index = HashedIdIndex(database=db if user_wants_to_verify_hashed_ids else None)
+        else:
+            id_index = IdIndex()
+        preload_start_time = time.perf_counter()
+        for collection_name in sorted(references.get_distinct_target_collection_names()):
+            id_index.add_collection(collection_name, get_id_values_in_collection(db.get_collection(collection_name)))
+            if verbose:
+                console.print(f"Preloaded target ids from collection: {collection_name}")
+        preload_duration = time.perf_counter() - preload_start_time
+        console.print(
+            f"Preloaded {len(id_index)} target ids in {preload_duration:.1f} seconds "
+            f"(index size: {decimal(id_index.get_size_in_bytes())})"
+        )
+        console.print()  # newline
+
+    # If the user specified an `id` index file, memory-map it now, after making sure it was built from what seems to be
+    # the same snapshot of the database, and that it covers every collection that can contain referenced documents.
+    if id_index_file_path is not None:
+        id_index = MappedIdIndex(id_index_file_path, database=db if user_wants_to_verify_hashed_ids else None)
+        names_of_uncovered_collections = [
+            name for name in references.get_distinct_target_collection_names() if not id_index.has_collection(name)
+        ]
+        if id_index.metadata.get("database_name") != database_name or any(
+            db.get_collection(name).estimated_document_count() != num_documents
+            for name, num_documents in id_index.metadata.get("num_documents_by_collection_name", {}).items()
+        ):
+            console.print(f"[red]The `id` index does not match this database:[/red] {id_index_file_path}")
+            raise typer.Exit(code=1)
+        if len(names_of_uncovered_collections) > 0:
+            console.print(
+                f"[red]The `id` index lacks collections that can contain referenced documents:[/red] "
+                f"{', '.join(sorted(names_of_uncovered_collections))}"
+            )
+            raise typer.Exit(code=1)
+        console.print(
+            f"Loaded id index of {len(id_index)} ids from: {id_index_file_path} "
+            f"(file size: {decimal(id_index.get_size_in_bytes())})"
+        )
+        console.print()  # newline
+
+    # If the user opted to use Bloom filters, load them from the specified file (if they were built from what seems to
+    # be the same snapshot of the database) or build them now (saving them to the file, if one was specified).
+    bloom_filter_index = None
+    if user_wants_bloom_filters or bloom_filter_file_path is not None:
+        names_of_target_collections = sorted(references.get_distinct_target_collection_names())
+        bloom_filter_metadata = dict(
+            database_name=database_name,
+            num_documents_by_collection_name={
+                name: db.get_collection(name).estimated_document_count() for name in names_of_target_collections
+            },
+        )
+        if bloom_filter_file_path is not None and bloom_filter_file_path.exists():
+            saved_bloom_filter_index = BloomFilterIndex.load(bloom_filter_file_path)
+            if (
+                saved_bloom_filter_index.metadata == bloom_filter_metadata
+                and saved_bloom_filter_index.false_positive_rate == bloom_filter_false_positive_rate
+            ):
+                bloom_filter_index = saved_bloom_filter_index
+                console.print(f"Loaded Bloom filters of {len(bloom_filter_index)} ids from: {bloom_filter_file_path}")
+            else:
+                console.print(
+                    f"🤷  [orange]Bloom filter file does not match this database (or false positive rate); "
+                    f"rebuilding it:[/orange] {bloom_filter_file_path}"
+                )
+        if bloom_filter_index is None:
+            bloom_filter_index = BloomFilterIndex(bloom_filter_false_positive_rate, metadata=bloom_filter_metadata)
+            build_start_time = time.perf_counter()
+            for collection_name in names_of_target_collections:
+                bloom_filter_index.add_collection(
+                    collection_name,
+                    get_id_values_in_collection(db.get_collection(collection_name)),
+                    expected_num_ids=bloom_filter_metadata["num_documents_by_collection_name"][collection_name],
+                )
+            build_duration = time.perf_counter() - build_start_time
+            console.print(
+                f"Built Bloom filters of {len(bloom_filter_index)} ids in {build_duration:.1f} seconds "
+                f"(size: {decimal(bloom_filter_index.get_size_in_bytes())})"
+            )
+            if bloom_filter_file_path is not None:
+                bloom_filter_index.save(bloom_filter_file_path)
+                console.print(f"Saved Bloom filters to: {bloom_filter_file_path}")
+        console.print()  # newline
+
+    # If the user opted to route lookups by `id` prefix, learn which prefixes occur in which collections.
+    id_prefix_router = None
+    if id_prefix_router_source != IdPrefixRouterSource.none:
+        id_prefix_router = IdPrefixRouter(exclusive=user_wants_exclusive_id_prefix_routing)
+        names_of_target_collections = sorted(references.get_distinct_target_collection_names())
+        if id_prefix_router_source == IdPrefixRouterSource.sample:
+            for collection_name in names_of_target_collections:
+                sampled_ids = get_sample_of_id_values_in_collection(
+                    db.get_collection(collection_name), sample_size=id_prefix_sample_size
+                )
+                id_prefix_router.learn_ids(collection_name, sampled_ids)
+        else:
+            id_prefix_router.learn_from_schema(
+                SchemaAnalyzer(schema_view),
+                {name: collection_name_to_class_names[name] for name in names_of_target_collections},
+            )
+        console.print(f"Learned {len(id_prefix_router)} id prefixes from the {id_prefix_router_source.value}")
+        if verbose:
+            for prefix, num_ids_by_collection_name in sorted(id_prefix_router.num_ids_by_prefix.items()):
+                console.print(f"{prefix}: {dict(num_ids_by_collection_name)}")
+        console.print()  # newline
+
     # Make a finder bound to this database.
     # Note: A finder is a wrapper around a database that adds some caching that speeds up searches in some situations.
-    finder = Finder(database=db)
+    finder_options = dict(
+        result_cache_size=finder_cache_size,
+        id_prefix_router=id_prefix_router,
+        bloom_filter_index=bloom_filter_index,
+    )
+    finder = Finder(database=db, id_index=id_index, **finder_options)
+
+    # Make a scanner that uses that finder.
+    scanner_options = dict(
+        lookup_batch_size=lookup_batch_size,
+        locate_misplaced_documents=user_wants_to_locate_misplaced_documents,
+        index_misplaced_documents=locator == Locator.index,
+        sort_documents_by_id=checkpoint_file_path is not None,  # so the scan can resume where it left off
+        validate_target_ids=user_wants_to_validate_target_ids,
+        use_raw_bson_documents=user_wants_raw_bson_documents,
+        prefetch_queue_depth=prefetch_queue_depth,
+        adapt_cursor_batch_size=user_wants_adaptive_cursor_batch_size,
+        lookup_threads=lookup_threads,
+        verbose=verbose,
+    )
+    scanner_class = Scanner
+    if strategy in (Strategy.aggregate, Strategy.distinct):
+        scanner_class = AggregationScanner if strategy == Strategy.aggregate else DistinctIdScanner
+        if engine == Engine.async_:
+            console.print(
+                f"⚠️  [orange]Ignoring `--engine async`, since it does not apply to "
+                f"`--strategy {strategy.value}`.[/orange]"
+            )
+        for option_name, is_specified in [
+            ("--raw-bson-documents", user_wants_raw_bson_documents),
+            ("--prefetch-depth", prefetch_queue_depth > 0),
+            ("--adaptive-cursor-batch-size", user_wants_adaptive_cursor_batch_size),
+            ("--lookup-threads", lookup_threads > 1),
+        ]:
+            if is_specified:
+                console.print(
+                    f"⚠️  [orange]Ignoring `{option_name}`, since it does not apply to "
+                    f"`--strategy {strategy.value}`.[/orange]"
+                )
+    elif engine == Engine.async_:
+        scanner_class = AsyncScanner
+        scanner_options["concurrency"] = concurrency
+        if lookup_threads > 1:
+            console.print(
+                "⚠️  [orange]Ignoring `--lookup-threads`, since the `async` engine uses `--concurrency` "
+                "instead.[/orange]"
+            )
+    scanner = scanner_class(
+        finder=finder,
+        schema_view=schema_view,
+        references=references,
+        collection_names=collection_names,
+        **scanner_options,
+    )
+
+    # Display a table of the scan plans the scanner compiled from the schema.
+    if verbose:
+        console.print(scanner.scan_plans_as_table())
+
+    # If the user opted to save checkpoints, either load the checkpoint of the scan we are resuming, or make a new one.
+    #
+    # Note: The scan parameters recorded in the checkpoint are the ones that, if they were to differ between the
+    #       interrupted scan and the resumed one, would make the final reports differ from those of an uninterrupted
+    #       scan.
+    #
+    checkpoint = None
+    if checkpoint_file_path is not None:
+        scan_parameters = dict(
+            database_name=database_name,
+            schema_version=schema_view.schema.version,
+            strategy=strategy.value,
+            names_of_source_collections_to_skip=sorted(names_of_source_collections_to_skip),
+            locate_misplaced_documents=user_wants_to_locate_misplaced_documents,
+            validate_target_ids=user_wants_to_validate_target_ids,
+        )
+        if user_wants_to_resume and checkpoint_file_path.exists():
+            checkpoint = Checkpoint.load(checkpoint_file_path, save_interval_in_seconds=checkpoint_interval_in_seconds)
+            mismatched_scan_parameter_names = checkpoint.get_mismatched_scan_parameter_names(scan_parameters)
+            if len(mismatched_scan_parameter_names) > 0:
+                console.print(
+                    f"[red]Cannot resume scan, because these parameters differ from those of the checkpointed scan: "
+                    f"{mismatched_scan_parameter_names}[/red]"
+                )
+                raise typer.Exit(code=1)
+            console.print(
+                f"Resuming scan from checkpoint: {checkpoint_file_path} "
+                f"({len(checkpoint.names_of_completed_collections)} collections already scanned)"
+            )
+        else:
+            if user_wants_to_resume:
+                console.print(f"🤷  [orange]No checkpoint found; starting a new scan:[/orange] {checkpoint_file_path}")
+            checkpoint = Checkpoint(
+                checkpoint_file_path,
+                scan_parameters=scan_parameters,
+                save_interval_in_seconds=checkpoint_interval_in_seconds,
+            )
+        console.print()  # newline
+
+    # If the output is going to a log file (or the user opted to), make a logger that will periodically print a
+    # one-line progress report; since, in that case, the progress bar only gets displayed once the scan is done.
+    #
+    # Note: When the collections are scanned in worker processes, the main process only learns how many lookups the
+    #       workers performed once they are done, so the reports don't include lookups in that case.
+    #
+    progress_logger = None
+    if progress_mode == ProgressMode.log or (progress_mode == ProgressMode.auto and not console.is_terminal):
+        progress_logger = ProgressLogger(
+            custom_progress,
+            interval_in_seconds=progress_log_interval_in_seconds,
+            get_num_lookups=(lambda: finder.stats["lookups"]) if num_workers == 1 else None,
+        )
 
     source_collections_and_their_violations: dict[str, ViolationList] = {}
-    with custom_progress as progress:
+    with custom_progress as progress, progress_logger or nullcontext():
 
         # Filter out the collections that the schema says can contain references, but that don't exist in the database.
         source_collection_names_in_db = []
@@ -234,130 +894,190 @@ def scan(
             console.print(f"⚠️  [orange][bold]Skipping source collection:[/bold][/orange] {collection_name}")
         console.print()  # newline
 
+        # Determine which collections we will scan; i.e. those the user did not want to skip.
+        names_of_source_collections_to_scan = [
+            collection_name
+            for collection_name in sorted(source_collection_names_in_db)
+            if collection_name not in names_of_source_collections_to_skip
+        ]
+
         # Process each collection, checking for referential integrity violations;
         # using the reference catalog created earlier to know which collections can
         # contain "referrers" (documents), which of their slots can contain references (fields),
         # and which collections can contain the referred-to "referees" (documents).
-        for source_collection_name in sorted(source_collection_names_in_db):
-
-            # If this source collection is one of the ones the user wanted to skip, skip it now.
-            if source_collection_name in names_of_source_collections_to_skip:
-                continue
+        if num_workers > 1:
+            # Split each large collection into partitions, so that several workers can scan it at the same time; and
+            # scan the largest collections first, so that no large collection is left running on its own at the end.
+            partitions = scanner.get_partitions_of_collections(
+                names_of_source_collections_to_scan,
+                max_partitions_per_collection=max_partitions_per_collection,
+                min_documents_per_partition=min_documents_per_partition,
+            )
+            source_collections_and_their_violations = scan_partitions_in_worker_processes(
+                partitions=partitions,
+                num_workers=num_workers,
+                progress=progress,
+                num_documents_by_unknown_type=scanner.num_documents_by_unknown_type,
+                finder_stats=finder.stats,
+                scanner_stats=scanner.stats,
+                progress_total_mode=progress_total.value,
+                initargs=(
+                    mongo_uri,
+                    database_name,
+                    str(schema_file_path),
+                    references,
+                    collection_names,
+                    scanner_class,
+                    scanner_options,
+                    finder_options,
+                    id_index,
+                    user_wants_to_verify_hashed_ids,
+                ),
+            )
+        else:
+            # If the user opted to count the relevant documents in the background, make a thread in which to do so.
+            background_counter = None
+            if progress_total == ProgressTotal.background:
+                background_counter = BackgroundCounter(scanner.count_relevant_documents)
 
-            collection = db.get_collection(source_collection_name)
+            for source_collection_name in names_of_source_collections_to_scan:
 
-            # Prepare the query we will use to fetch documents from this collection. The documents we will fetch are
-            # those that have _any_ of the fields (of classes whose instances are allowed to reside in this collection)
-            # that the schema allows to contain a reference to an instance.
-            source_field_names = references.get_source_field_names_of_source_collection(source_collection_name)
-            or_terms = [{field_name: {"$exists": True}} for field_name in source_field_names]
-            query_filter = {"$or": or_terms}
-            if verbose:
-                console.print(f"{query_filter=}")
-
-            # Ensure the fields we fetch include:
-            # - "id" (so we can produce a more user-friendly report later)
-            # - "type" (so we can map the document to a schema class)
-            additional_field_names_for_projection = []
-            if "id" not in source_field_names:
-                additional_field_names_for_projection.append("id")
-            if "type" not in source_field_names:
-                additional_field_names_for_projection.append("type")
-            query_projection = source_field_names + additional_field_names_for_projection
-            if verbose:
-                console.print(f"{query_projection=}")
-
-            # Set up the progress bar for the task of scanning those documents.
-            num_relevant_documents = collection.count_documents(query_filter)
-            task_id = progress.add_task(
-                f"{source_collection_name}",
-                total=num_relevant_documents,
-                num_violations=0,
-                remaining_time_label="remaining",
-            )
+                # If the checkpoint says we already scanned this collection, use the violations recorded there.
+                if checkpoint is not None and checkpoint.is_collection_complete(source_collection_name):
+                    num_scanned_documents = checkpoint.num_documents_scanned_by_collection_name[source_collection_name]
+                    violations = checkpoint.violations_by_collection_name[source_collection_name]
+                    progress.add_task(
+                        f"{source_collection_name}",
+                        total=num_scanned_documents,
+                        completed=num_scanned_documents,
+                        num_violations=len(violations),
+                        remaining_time_label="done",
+                    )
+                    source_collections_and_their_violations[source_collection_name] = violations
+                    continue
 
-            # Advance the progress bar by 0 (this makes it so that, even if there are 0 relevant documents, the progress
-            # bar does not continue incrementing its "elapsed time" even after a subsequent task has begun).
-            progress.update(task_id, advance=0)
+                # If the checkpoint says we already scanned part of this collection, pick up where that scan left off.
+                resume_after = None
+                previous_violations = ViolationList()
+                num_previously_scanned_documents = 0
+                if checkpoint is not None:
+                    resume_after = checkpoint.get_resume_point(source_collection_name)
+                    if resume_after is not None:
+                        previous_violations = checkpoint.violations_by_collection_name[source_collection_name]
+                        num_previously_scanned_documents = checkpoint.num_documents_scanned_by_collection_name[
+                            source_collection_name
+                        ]
 
-            # Initialize the violation list for this collection.
-            source_collections_and_their_violations[source_collection_name] = ViolationList()
+                # Set up the progress bar for the task of scanning the relevant documents.
+                #
+                # Note: When the relevant documents are being counted in the background, the scan doesn't wait for
+                #       the count; and the progress bar is indeterminate (i.e. has no total) until the count is done.
+                #
+                num_relevant_documents = None
+                if progress_total == ProgressTotal.exact:
+                    num_relevant_documents = scanner.count_relevant_documents(source_collection_name)
+                elif progress_total == ProgressTotal.estimate:
+                    num_relevant_documents = scanner.estimate_num_relevant_documents(source_collection_name)
+                task_id = progress.add_task(
+                    f"{source_collection_name}",
+                    total=num_relevant_documents,
+                    completed=num_previously_scanned_documents,
+                    num_violations=len(previous_violations),
+                    remaining_time_label="remaining",
+                )
+                count_future = None
+                if background_counter is not None:
+                    count_future = background_counter.submit(
+                        source_collection_name,
+                        on_count=lambda count, task_id=task_id: progress.update(task_id, total=count),
+                    )
 
-            # Process each relevant document.
-            for document in collection.find(query_filter, projection=query_projection):
+                # Advance the progress bar by 0 (this makes it so that, even if there are 0 relevant documents, the
+                # progress bar does not continue incrementing its "elapsed time" even after a subsequent task has
+                # begun).
+                progress.update(task_id, advance=0)
 
-                # Get the document's `id` so that we can include it in this script's output.
-                source_document_object_id = document["_id"]
-                source_document_id = document["id"] if "id" in document else None
+                # Scan the collection, advancing the progress bar as documents are processed.
+                #
+                # Note: Updating the progress bar involves acquiring its lock and doing some bookkeeping, which adds
+                #       up when done once per document; so we tally the documents here and only update the progress
+                #       bar periodically (it only gets redrawn about once per second anyway).
+                #
+                num_documents_not_yet_reported = 0
+                num_violations_so_far = 0
+                time_of_last_report = time.monotonic()
 
-                # Get the document's schema class name so that we can interpret its fields accordingly.
-                source_class_name = derive_schema_class_name_from_document(schema_view, document)
+                def on_progress(num_documents: int, num_violations: int) -> None:
+                    nonlocal num_documents_not_yet_reported, num_violations_so_far
+                    num_documents_not_yet_reported += num_documents
+                    num_violations_so_far = num_violations
+                    if time.monotonic() - time_of_last_report >= PROGRESS_REPORT_INTERVAL_IN_SECONDS:
+                        flush_progress()
 
-                # Get the names of that class's fields that can contain references.
-                names_of_reference_fields = reference_field_names_by_source_class_name.get(source_class_name, [])
+                def flush_progress() -> None:
+                    nonlocal num_documents_not_yet_reported, time_of_last_report
+                    progress.update(
+                        task_id,
+                        advance=num_documents_not_yet_reported,
+                        num_violations=len(previous_violations) + num_violations_so_far,
+                    )
+                    num_documents_not_yet_reported = 0
+                    time_of_last_report = time.monotonic()
 
-                # Check each field that both (a) exists in the document and (b) can contain a reference.
-                for field_name in names_of_reference_fields:
-                    if field_name in document:
-                        # Determine which collections can contain the referenced document, based upon
-                        # the schema class of which this source document is an instance.
-                        target_collection_names = references.get_target_collection_names(
-                            source_class_name=source_class_name,
-                            source_field_name=field_name,
+                # Periodically save the state of the scan to the checkpoint file, if the user opted to do so.
+                def on_checkpoint(last_object_id, num_documents: int, violations: ViolationList) -> None:
+                    if checkpoint.is_save_due():
+                        checkpoint.record_progress(
+                            source_collection_name,
+                            last_object_id=last_object_id,
+                            num_documents_scanned=num_previously_scanned_documents + num_documents,
+                            violations=previous_violations + violations,
                         )
+                        checkpoint.save()
 
-                        # Handle both the multi-value (array) and the single-value (scalar) case,
-                        # normalizing the value or values into a list of values in either case.
-                        if type(document[field_name]) is list:
-                            target_ids = document[field_name]
-                        else:
-                            target_id = document[field_name]
-                            target_ids = [target_id]  # makes a one-item list
-
-                        for target_id in target_ids:
-                            name_of_collection_containing_target_document = (
-                                finder.check_whether_document_having_id_exists_among_collections(
-                                    collection_names=target_collection_names, document_id=target_id
-                                )
-                            )
-                            if name_of_collection_containing_target_document is None:
-
-                                if user_wants_to_locate_misplaced_documents:
-                                    names_of_ineligible_collections = list(
-                                        set(collection_names) - set(target_collection_names)
-                                    )
-                                    name_of_collection_containing_target_document = (
-                                        finder.check_whether_document_having_id_exists_among_collections(
-                                            collection_names=names_of_ineligible_collections, document_id=target_id
-                                        )
-                                    )
-
-                                violation = Violation(
-                                    source_collection_name=source_collection_name,
-                                    source_class_name=source_class_name,
-                                    source_field_name=field_name,
-                                    source_document_object_id=source_document_object_id,
-                                    source_document_id=source_document_id,
-                                    target_id=target_id,
-                                    name_of_collection_containing_target=name_of_collection_containing_target_document,
-                                )
-                                source_collections_and_their_violations[source_collection_name].append(violation)
-                                if verbose:
-                                    console.print(
-                                        f"Failed to find document having `id` '{target_id}' "
-                                        f"among collections: {target_collection_names}. "
-                                        f"{violation=}"
-                                    )
-
-                # Advance the progress bar to account for the current document's contribution to the violations count.
-                progress.update(
-                    task_id,
-                    advance=1,
-                    num_violations=len(source_collections_and_their_violations[source_collection_name]),
+                violations = scanner.scan_collection(
+                    source_collection_name,
+                    on_progress=on_progress,
+                    resume_after=resume_after,
+                    on_checkpoint=on_checkpoint if checkpoint is not None else None,
                 )
+                num_violations_so_far = len(violations)
+                flush_progress()
+                source_collections_and_their_violations[source_collection_name] = previous_violations + violations
+
+                # Determine how many documents were scanned, and make the progress bar show that they all were.
+                #
+                # Note: A scanner that doesn't report its progress per document doesn't tell us how many documents it
+                #       scanned, so we use the count (waiting for it, if it's running in the background) or estimate.
+                #
+                if scanner.reports_progress_per_document:
+                    num_scanned_documents = num_relevant_documents
+                    if progress_total != ProgressTotal.exact:
+                        if count_future is not None:
+                            background_counter.abandon(count_future)  # so it doesn't overwrite the total we set here
+                        task = next(task for task in progress.tasks if task.id == task_id)
+                        num_scanned_documents = int(task.completed)
+                        progress.update(task_id, total=num_scanned_documents)
+                else:
+                    if count_future is not None:
+                        num_relevant_documents = count_future.result()
+                    num_scanned_documents = num_relevant_documents
+                    progress.update(task_id, completed=num_relevant_documents)
+                if checkpoint is not None:
+                    checkpoint.mark_collection_complete(
+                        source_collection_name,
+                        num_documents_scanned=num_scanned_documents,
+                        violations=source_collections_and_their_violations[source_collection_name],
+                    )
+                    checkpoint.save()
+
+                # Update the progress bar to indicate the current task is complete.
+                progress.update(task_id, remaining_time_label="done")
 
-            # Update the progress bar to indicate the current task is complete.
-            progress.update(task_id, remaining_time_label="done")
+            # Abandon any counts that are still queued or underway (e.g. because their collections were scanned before
+            # the counts finished), so that none of them reports a total after the `MongoClient` is closed.
+            if background_counter is not None:
+                background_counter.stop()
 
     # Close the connection to the MongoDB server.
     mongo_client.close()
@@ -384,13 +1104,179 @@ def scan(
     color_name = "white" if num_all_violations == 0 else "red"
     console.print()  # newline
     console.print(f"Total violations: " f"[{color_name}]{num_all_violations}[/{color_name}]")
+    for reason, num_violations in Counter(violation.reason for violation in all_violations).most_common():
+        console.print(f"    {reason}: {num_violations}")
+    console.print()  # newline
+
+    # Report how many queries the finder sent to the database, and how effective its cache of lookup results was.
+    console.print(f"Lookup queries sent to the database: {finder.stats['queries']}")
+    if finder_cache_size > 0:
+        num_cache_hits, num_cache_misses = finder.stats["cache_hits"], finder.stats["cache_misses"]
+        num_cache_lookups = num_cache_hits + num_cache_misses
+        hit_rate = 0 if num_cache_lookups == 0 else num_cache_hits / num_cache_lookups
+        console.print(f"Finder cache: {num_cache_hits} hits, {num_cache_misses} misses ({hit_rate:.1%} hit rate)")
+    if bloom_filter_index is not None:
+        console.print(f"Collection searches skipped via Bloom filters: {finder.stats['bloom_filter_skips']}")
     console.print()  # newline
 
+    # Report how long the scanner spent waiting for the source documents it fetched, and how long it spent decoding
+    # them (which, unless it read them as raw BSON, is included in the former, since pymongo decodes them as they
+    # arrive).
+    #
+    # Note: When the scanner prefetched the documents, the source reader fetched them in a background thread, while
+    #       the scanner was processing earlier ones; so the time the scanner spent waiting for them is the time it
+    #       found the prefetch queue empty, not the time the source reader spent fetching them.
+    #
+    if scanner.stats["documents_fetched"] > 0:
+        console.print(f"Source documents fetched: {scanner.stats['documents_fetched']}")
+        if scanner.stats["prefetch_items"] > 0:
+            console.print(
+                f"Time spent waiting for source documents: {scanner.stats['prefetch_stall_seconds']:.1f} seconds"
+            )
+            console.print(
+                f"Time spent fetching source documents in the background: "
+                f"{scanner.stats['fetch_seconds']:.1f} seconds"
+            )
+        else:
+            console.print(f"Time spent waiting for source documents: {scanner.stats['fetch_seconds']:.1f} seconds")
+
+        # Report the throughput of each stage of the scanner's pipeline (see `Scanner.scan_collection`), if it has one.
+        if "extract_seconds" in scanner.stats:
+            console.print("Pipeline stage throughput:")
+            for stage_label, stats_key in [
+                ("source reader", "fetch_seconds"),
+                ("extractor", "extract_seconds"),
+                ("resolver", "resolve_seconds"),
+                ("sink", "sink_seconds"),
+            ]:
+                num_seconds = scanner.stats[stats_key]
+                throughput = scanner.stats["documents_fetched"] / num_seconds if num_seconds > 0 else float("inf")
+                console.print(f"    {stage_label}: {throughput:,.0f} documents per second ({num_seconds:.1f} seconds)")
+        if user_wants_raw_bson_documents:
+            console.print(f"Time spent decoding source documents: {scanner.stats['decode_seconds']:.1f} seconds")
+        if scanner.stats["prefetch_items"] > 0:
+            average_queue_depth = scanner.stats["prefetch_queue_depth_total"] / scanner.stats["prefetch_items"]
+            console.print(
+                f"Prefetch queue: average depth {average_queue_depth:.1f} of {prefetch_queue_depth}; "
+                f"stalled (empty) for {scanner.stats['prefetch_stall_seconds']:.1f} seconds, "
+                f"blocked (full) for {scanner.stats['prefetch_producer_wait_seconds']:.1f} seconds"
+            )
+        if scanner.stats["tuned_cursors"] > 0:
+            average_batch_size = scanner.stats["tuned_cursor_batch_size_total"] / scanner.stats["tuned_cursors"]
+            console.print(
+                f"Cursor batch size: {average_batch_size:.0f} documents on average "
+                f"(tuned for {scanner.stats['tuned_cursors']} cursors)"
+            )
+        console.print()  # newline
+
+    # Report the documents whose references we could not check, because their `type` values did not correspond to any
+    # schema class (so we could not tell which of their fields can contain references).
+    num_documents_having_unknown_type = sum(scanner.num_documents_by_unknown_type.values())
+    if num_documents_having_unknown_type > 0:
+        console.print(
+            f"⚠️  [orange]Documents whose `type` is not the `class_uri` of any schema class:[/orange] "
+            f"{num_documents_having_unknown_type}"
+        )
+        for class_uri, num_documents in scanner.num_documents_by_unknown_type.most_common():
+            label = "(missing or not a string)" if class_uri is None else f"'{class_uri}'"
+            console.print(f"    {label}: {num_documents}")
+        console.print()  # newline
+
     # Create a TSV-formatted violation report that lists all violations among all collections.
     console.print(f"Writing violation report: {violation_report_file_path}")
     all_violations.dump_to_tsv_file(file_path=violation_report_file_path)
     console.print()  # newline
 
+    # Now that the scan is complete, delete its checkpoint (so that a later `--resume` starts a new scan).
+    if checkpoint is not None:
+        console.print(f"Deleting checkpoint file: {checkpoint_file_path}")
+        checkpoint.delete()
+        console.print()  # newline
+
+
+@index_app.command("build")
+def build_index(
+    schema_file_path: Annotated[
+        Path,
+        typer.Option(
+            "--schema",
+            dir_okay=False,
+            writable=False,
+            readable=True,
+            resolve_path=True,
+            help="Filesystem path at which the YAML file representing the schema is located.",
+        ),
+    ],
+    index_file_path: Annotated[
+        Path,
+        typer.Option(
+            "--output",
+            dir_okay=False,
+            writable=True,
+            resolve_path=True,
+            help="Filesystem path at which you want the program to write the `id` index.",
+        ),
+    ],
+    database_name: Annotated[
+        str,
+        typer.Option(
+            help="Name of the database.",
+        ),
+    ] = "nmdc",
+    mongo_uri: Annotated[
+        str,
+        typer.Option(
+            envvar="MONGO_URI",
+            help="Connection string for accessing the MongoDB server.",
+        ),
+    ] = "mongodb://localhost:27017",
+    verbose: Annotated[
+        bool,
+        typer.Option(
+            "--verbose",
+            help="Show verbose output.",
+        ),
+    ] = False,
+):
+    """
+    Builds an index of the `id`s of the documents in every collection described by the schema, for use with
+    `$ refscan --id-index`.
+    """
+    schema_view = linkml_runtime.SchemaView(schema_file_path)
+    collection_names = sorted(get_collection_names_from_schema(schema_view))
+
+    # Connect to the MongoDB server and verify the database is accessible.
+    mongo_client = connect_to_database(mongo_uri, database_name)
+    db = mongo_client.get_database(database_name)
+
+    # Record which snapshot of the database the index was built from, so scans can refuse to use a stale index.
+    #
+    # Note: We get the document counts before reading the `id`s, so that, if the database changes while we're reading
+    #       them, the counts are more likely to be stale (which makes the scan refuse the index) than to look current.
+    #
+    metadata = dict(
+        database_name=database_name,
+        num_documents_by_collection_name={
+            name: db.get_collection(name).estimated_document_count() for name in collection_names
+        },
+    )
+
+    if verbose:
+        console.print(f"Collections to index: {', '.join(collection_names)}")
+
+    # Note: Each collection's `id`s are read (via a generator) only when the index gets to that collection.
+    build_start_time = time.perf_counter()
+    ids_by_collection_name = {name: get_id_values_in_collection(db.get_collection(name)) for name in collection_names}
+    MappedIdIndex.build(index_file_path, ids_by_collection_name, metadata=metadata)
+    build_duration = time.perf_counter() - build_start_time
+
+    id_index = MappedIdIndex(index_file_path)
+    console.print(
+        f"Wrote id index of {len(id_index)} ids from {len(collection_names)} collections in {build_duration:.1f} "
+        f"seconds: {index_file_path} (file size: {decimal(id_index.get_size_in_bytes())})"
+    )
+    id_index.close()
+
 
 if __name__ == "__main__":
     app()
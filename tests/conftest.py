@@ -0,0 +1,289 @@
+from typing import Callable, Iterable, Optional
+
+import pytest
+import linkml_runtime
+
+from refscan.lib.helpers import (
+    get_collection_names_from_schema,
+    get_names_of_classes_eligible_for_collection,
+    identify_references,
+)
+
+
+# Define a `pytest` fixture that can be used by tests in multiple files.
+#
+# Note: `pytest` makes the fixtures defined in a `conftest.py` file available to all tests in the same directory.
+#       Reference: https://docs.pytest.org/en/stable/reference/fixtures.html#conftest-py-sharing-fixtures-across-classes
+#
+def derive_scanner_inputs_from_schema(schema_file_path: str) -> dict:
+    r"""
+    Returns a dictionary containing the `SchemaView`, collection names, and `ReferenceList`, that a scanner derives
+    from the schema in the specified file.
+    """
+    schema_view = linkml_runtime.SchemaView(schema=schema_file_path)
+    collection_names = get_collection_names_from_schema(schema_view)
+    collection_name_to_class_names = {}
+    for collection_name in collection_names:
+        collection_name_to_class_names[collection_name] = get_names_of_classes_eligible_for_collection(
+            schema_view=schema_view,
+            collection_name=collection_name,
+        )
+    references = identify_references(schema_view, collection_name_to_class_names)
+    return dict(schema_view=schema_view, references=references, collection_names=collection_names)
+
+
+@pytest.fixture
+def schema_with_references() -> dict:
+    r"""
+    Returns a dictionary containing the `SchemaView`, collection names, and `ReferenceList`, that a scanner derives
+    from the schema in `tests/schemas/database_with_references.yaml`.
+    """
+    return derive_scanner_inputs_from_schema("tests/schemas/database_with_references.yaml")
+
+
+@pytest.fixture
+def schema_with_class_uris() -> dict:
+    r"""
+    Returns a dictionary containing the `SchemaView`, collection names, and `ReferenceList`, that a scanner derives
+    from the schema in `tests/schemas/database_with_class_uris.yaml` (whose classes, unlike those in the other
+    schema, have `class_uri`s; so documents can be mapped to them).
+    """
+    return derive_scanner_inputs_from_schema("tests/schemas/database_with_class_uris.yaml")
+
+
+# Define stand-ins for a `pymongo` database and its collections, which tests in multiple files can use instead of a
+# MongoDB server.
+#
+# Note: The stand-ins only understand the query filters and aggregation pipeline stages that refscan itself uses.
+#
+def matches_query_filter(document: dict, query_filter: dict) -> bool:
+    r"""Returns `True` if the specified document matches the specified query filter."""
+    for key, condition in query_filter.items():
+        if key == "$and":
+            if not all(matches_query_filter(document, term) for term in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_query_filter(document, term) for term in condition):
+                return False
+        elif key == "$expr":
+            if not evaluate_expression(condition, document):
+                return False
+        elif not matches_condition(document, key, condition):
+            return False
+    return True
+
+
+def matches_condition(document: dict, field_name: str, condition) -> bool:
+    r"""
+    Returns `True` if the specified field of the specified document satisfies the specified condition, which is either
+    a value (to which the field's value, or one of the items in the field's list of values, must be equal) or a
+    dictionary of query operators.
+    """
+    is_present = field_name in document
+    value = document.get(field_name)
+    values = value if isinstance(value, list) else [value]
+    if not (isinstance(condition, dict) and len(condition) > 0 and all(key.startswith("$") for key in condition)):
+        return is_present and (value == condition or condition in values)
+
+    def compare(operand, is_satisfied: Callable) -> bool:
+        return is_present and type(value) is type(operand) and is_satisfied(value, operand)
+
+    for operator, operand in condition.items():
+        if operator == "$exists":
+            is_satisfied = is_present == operand
+        elif operator == "$in":
+            is_satisfied = is_present and any(item in operand for item in values)
+        elif operator == "$nin":
+            is_satisfied = not (is_present and any(item in operand for item in values))
+        elif operator == "$type" and operand == "array":
+            is_satisfied = isinstance(value, list)
+        elif operator == "$not":
+            is_satisfied = not matches_condition(document, field_name, operand)
+        elif operator == "$gt":
+            is_satisfied = compare(operand, lambda a, b: a > b)
+        elif operator == "$gte":
+            is_satisfied = compare(operand, lambda a, b: a >= b)
+        elif operator == "$lt":
+            is_satisfied = compare(operand, lambda a, b: a < b)
+        else:
+            raise NotImplementedError(f"Unsupported query operator: {operator}")
+        if not is_satisfied:
+            return False
+    return True
+
+
+def evaluate_expression(expression, document: dict):
+    r"""Returns the value of the specified aggregation expression, evaluated for the specified document."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if isinstance(expression, list):
+        return [evaluate_expression(item, document) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    ((operator, operand),) = expression.items()
+    if operator == "$cond":
+        condition, value_if_true, value_if_false = operand
+        chosen = value_if_true if evaluate_expression(condition, document) else value_if_false
+        return evaluate_expression(chosen, document)
+    if operator == "$switch":
+        for branch in operand["branches"]:
+            if evaluate_expression(branch["case"], document):
+                return evaluate_expression(branch["then"], document)
+        return evaluate_expression(operand["default"], document)
+    values = evaluate_expression(operand, document)
+    if operator == "$isArray":
+        return isinstance(values, list)
+    if operator == "$size":
+        return len(values)
+    if operator == "$eq":
+        return values[0] == values[1]
+    if operator == "$gt":
+        return values[0] > values[1]
+    if operator == "$or":
+        return any(values)
+    raise NotImplementedError(f"Unsupported expression operator: {operator}")
+
+
+class FakeCursor(list):
+    r"""A stand-in for a `pymongo` cursor; i.e. a list of documents, which can be sorted."""
+
+    def sort(self, key: str, direction: int = 1) -> "FakeCursor":
+        return FakeCursor(sorted(self, key=lambda document: document[key], reverse=direction < 0))
+
+    def batch_size(self, batch_size: int) -> "FakeCursor":
+        return self
+
+    def hint(self, index) -> "FakeCursor":
+        return self
+
+
+class FakeCollection:
+    r"""
+    A stand-in for a `pymongo` collection, which keeps track of the queries and aggregation pipelines it receives.
+
+    Note: Reading the whole collection (i.e. `find` with an empty query filter) is counted as a "full read" instead
+          of as a query. Projections are ignored (i.e. the documents returned have all of their fields).
+
+    :param ids: `id` values of documents (having no other fields) to add to the collection, after the `documents`
+    :param aggregate: A function that, if specified, the collection will call with each aggregation pipeline it
+                      receives (instead of running the pipeline itself), and whose return value it will return
+    """
+
+    def __init__(
+        self,
+        documents: Iterable[dict] = (),
+        ids: Iterable = (),
+        aggregate: Optional[Callable[[list], Iterable[dict]]] = None,
+    ):
+        self.documents = list(documents)
+        self.documents.extend({"_id": len(self.documents) + n, "id": id_} for n, id_ in enumerate(ids))
+        self.aggregate_function = aggregate
+        self.database: Optional["FakeDatabase"] = None  # set by the database that contains this collection
+        self.queries = []  # query filters received via `find` and `find_one`
+        self.pipelines = []  # aggregation pipelines received via `aggregate`
+        self.num_full_reads = 0
+
+    @property
+    def num_queries(self) -> int:
+        return len(self.queries)
+
+    def find(self, query_filter: dict, projection=None) -> FakeCursor:
+        if query_filter == {}:
+            self.num_full_reads += 1
+        else:
+            self.queries.append(query_filter)
+        return FakeCursor(document for document in self.documents if matches_query_filter(document, query_filter))
+
+    def find_one(self, query_filter: dict, projection=None) -> Optional[dict]:
+        self.queries.append(query_filter)
+        return next((document for document in self.documents if matches_query_filter(document, query_filter)), None)
+
+    def count_documents(self, query_filter: dict) -> int:
+        return sum(1 for document in self.documents if matches_query_filter(document, query_filter))
+
+    def estimated_document_count(self) -> int:
+        return len(self.documents)
+
+    def index_information(self) -> dict:
+        return {"_id_": {"key": [("_id", 1)]}}
+
+    def with_options(self, **kwargs) -> "FakeCollection":
+        return self
+
+    def aggregate(self, pipeline: list, **kwargs) -> list:
+        self.pipelines.append(pipeline)
+        if self.aggregate_function is not None:
+            return list(self.aggregate_function(pipeline))
+        documents = [dict(document) for document in self.documents]
+        for stage in pipeline:
+            documents = self.run_stage(stage, documents)
+        return documents
+
+    def run_stage(self, stage: dict, documents: list) -> list:
+        r"""Returns the documents output by the specified aggregation pipeline stage, given its input documents."""
+        ((stage_name, spec),) = stage.items()
+        if stage_name == "$match":
+            return [document for document in documents if matches_query_filter(document, spec)]
+        if stage_name == "$project":
+            return [
+                {
+                    field_name: document[field_name] if expression == 1 else evaluate_expression(expression, document)
+                    for field_name, expression in spec.items()
+                    if expression != 1 or field_name in document
+                }
+                for document in documents
+            ]
+        if stage_name == "$unwind":
+            field_name = spec["path"][1:]
+            return [
+                {**document, field_name: value, spec["includeArrayIndex"]: index}
+                for document in documents
+                for index, value in enumerate(document.get(field_name) or [])
+            ]
+        if stage_name == "$lookup":
+            collection = self.database.get_collection(spec["from"])
+            output_documents = []
+            for document in documents:
+                query_filter = {spec["foreignField"]: document.get(spec["localField"])}
+                found_documents = [
+                    dict(found) for found in collection.documents if matches_query_filter(found, query_filter)
+                ]
+                for sub_stage in spec["pipeline"]:
+                    found_documents = self.run_stage(sub_stage, found_documents)
+                output_documents.append({**document, spec["as"]: found_documents})
+            return output_documents
+        if stage_name == "$limit":
+            return documents[:spec]
+        if stage_name == "$sample":
+            return documents[: spec["size"]]  # note: the sample is not random, so that tests are deterministic
+        if stage_name == "$sort":
+            ((field_name, direction),) = spec.items()
+            return sorted(documents, key=lambda document: document[field_name], reverse=direction < 0)
+        if stage_name == "$group":
+            # Note: The only accumulator we support is `$sum`.
+            groups = []
+            for document in documents:
+                value = evaluate_expression(spec["_id"], document)
+                group = next((group for group in groups if group["_id"] == value), None)
+                if group is None:
+                    group = {"_id": value, **{field_name: 0 for field_name in spec if field_name != "_id"}}
+                    groups.append(group)
+                for field_name, accumulator in spec.items():
+                    if field_name != "_id":
+                        group[field_name] += evaluate_expression(accumulator["$sum"], document)
+            return groups
+        if stage_name == "$count":
+            return [{spec: len(documents)}] if len(documents) > 0 else []
+        raise NotImplementedError(f"Unsupported aggregation pipeline stage: {stage_name}")
+
+
+class FakeDatabase:
+    r"""A stand-in for a `pymongo` database, whose collections are `FakeCollection`s."""
+
+    def __init__(self, collections: dict):
+        self.collections = collections
+        for collection in collections.values():
+            collection.database = self
+
+    def get_collection(self, name: str) -> FakeCollection:
+        return self.collections[name]
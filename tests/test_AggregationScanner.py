@@ -0,0 +1,89 @@
+import pytest
+
+from refscan.lib.AggregationScanner import AggregationScanner
+from refscan.lib.Finder import Finder
+from refscan.lib.Scanner import Scanner
+from tests.conftest import FakeCollection, FakeDatabase
+
+
+@pytest.fixture
+def scanner(schema_with_references):
+    return AggregationScanner(finder=Finder(database=None), **schema_with_references)
+
+
+def test_make_pipeline(scanner):
+    pipeline = scanner.make_pipeline(
+        "works_for",
+        {
+            "my:Employee": ("company_set",),
+            "my:Contractor": ("company_set", "agency_set"),
+        },
+    )
+
+    # Focus on the initial `$match` stage.
+    assert pipeline[0] == {
+        "$match": {"works_for": {"$exists": True}, "type": {"$in": ["my:Employee", "my:Contractor"]}}
+    }
+
+    # Focus on the `$lookup` stages (one per target collection, in alphabetical order).
+    lookup_stages = [stage["$lookup"] for stage in pipeline if "$lookup" in stage]
+    assert [stage["from"] for stage in lookup_stages] == ["agency_set", "company_set"]
+    assert all(stage["localField"] == "target_id" and stage["foreignField"] == "id" for stage in lookup_stages)
+
+    # Focus on the stage that filters out the references whose targets were found.
+    branches = pipeline[-2]["$match"]["$expr"]["$eq"][0]["$switch"]["branches"]
+    assert len(branches) == 2
+    assert branches[0]["case"] == {"$eq": ["$type", "my:Employee"]}
+    assert branches[0]["then"] == {"$or": [{"$gt": [{"$size": "$found_in_1"}, 0]}]}
+    assert len(branches[1]["then"]["$or"]) == 2
+
+
+def test_get_class_uris_by_class_name(scanner):
+    # Note: The classes in this schema have no `class_uri`.
+    assert scanner.get_class_uris_by_class_name() == {}
+
+
+def make_fake_database() -> FakeDatabase:
+    r"""
+    Returns a fake database containing employees whose references to companies and managers (some of which are
+    missing) the scanners can check; as well as some relevant documents whose `type` values are unknown.
+    """
+    employees = [
+        {"_id": 1, "id": "e1", "type": "my:Employee", "works_for": "c1"},
+        {"_id": 2, "id": "e2", "type": "my:Employee", "works_for": "c404", "managed_by": "e1"},
+        {"_id": 3, "id": "e3", "type": "my:Employee", "works_for": "c2", "managed_by": "e404"},
+        {"_id": 4, "id": "e4", "type": "my:Employee", "works_for": "c404", "managed_by": "e405"},
+        {"_id": 5, "id": "e5", "type": "my:Employee"},  # has no references
+        {"_id": 6, "id": "x1", "type": "my:Unknown", "works_for": "c404"},
+        {"_id": 7, "id": "x2", "type": "my:Unknown", "works_for": "c1"},
+        {"_id": 8, "id": "x3", "type": ["my:Employee"], "works_for": "c1"},
+        {"_id": 9, "id": "x4", "works_for": "c1"},
+    ]
+    companies = [
+        {"_id": 101, "id": "c1", "type": "my:Company", "employs": ["e1", "e404", "e2"]},
+        {"_id": 102, "id": "c2", "type": "my:Company", "employs": ["e3"]},
+    ]
+    return FakeDatabase(dict(company_set=FakeCollection(companies), employee_set=FakeCollection(employees)))
+
+
+def test_scan_collection(schema_with_class_uris):
+    db = make_fake_database()
+    scanner = AggregationScanner(finder=Finder(database=db), **schema_with_class_uris)
+    synchronous_scanner = Scanner(finder=Finder(database=make_fake_database()), **schema_with_class_uris)
+
+    # Confirm the scanner finds the same violations, in the same order, as the synchronous scanner; i.e. the pipelines'
+    # lookups that find a matching document are filtered out, and those that don't are reported.
+    for collection_name in ["company_set", "employee_set"]:
+        violations = scanner.scan_collection(collection_name)
+        assert violations == synchronous_scanner.scan_collection(collection_name)
+    assert [(violation.source_document_id, violation.target_id) for violation in violations] == [
+        ("e2", "c404"),
+        ("e3", "e404"),
+        ("e4", "c404"),
+        ("e4", "e405"),
+    ]
+
+    # Confirm the relevant documents whose `type` values are unknown were counted (the same way the synchronous scanner
+    # counts them), even though the pipelines that check references don't match them.
+    assert scanner.num_documents_by_unknown_type == synchronous_scanner.num_documents_by_unknown_type
+    assert scanner.num_documents_by_unknown_type == {"my:Unknown": 2, None: 2}
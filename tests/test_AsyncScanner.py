@@ -0,0 +1,81 @@
+import threading
+import time
+
+from refscan.lib.AsyncScanner import AsyncScanner
+from refscan.lib.Finder import Finder
+from refscan.lib.IdIndex import IdIndex
+from refscan.lib.Scanner import Scanner
+from tests.conftest import FakeCollection, FakeDatabase
+
+
+def make_scanner(schema_with_references: dict, locate_misplaced_documents: bool) -> AsyncScanner:
+    # Note: Since the finder has an index covering every collection, it will not access the database.
+    id_index = IdIndex()
+    id_index.add_collection("company_set", ["c1"])
+    id_index.add_collection("employee_set", ["e1"])
+    return AsyncScanner(
+        finder=Finder(database=None, id_index=id_index),
+        **schema_with_references,
+        locate_misplaced_documents=locate_misplaced_documents,
+        concurrency=2,
+    )
+
+
+def test_check_reference(schema_with_references):
+    scanner = make_scanner(schema_with_references, locate_misplaced_documents=False)
+    assert scanner.check_reference("c1", ("company_set",)) == (True, "company_set")
+    assert scanner.check_reference("e1", ("company_set",)) == (False, None)
+    assert scanner.check_reference("x1", ("company_set",)) == (False, None)
+
+    scanner = make_scanner(schema_with_references, locate_misplaced_documents=True)
+    assert scanner.check_reference("e1", ("company_set",)) == (False, "employee_set")
+    assert scanner.check_reference("x1", ("company_set",)) == (False, None)
+
+
+def test_scan_collection(schema_with_class_uris):
+    employees = [
+        {"_id": n, "id": f"e{n}", "type": "my:Employee", "works_for": f"c{n % 4}", "managed_by": f"e{n + 1}"}
+        for n in range(20)
+    ]
+    companies = [{"_id": 100 + n, "id": f"c{n}", "type": "my:Company"} for n in range(3)]  # there is no "c3"
+    db = FakeDatabase(dict(company_set=FakeCollection(companies), employee_set=FakeCollection(employees)))
+
+    class SlowFinder(Finder):
+        r"""
+        A finder whose lookups take longer the earlier the document referencing the target was read (so that they
+        finish in the opposite order from the one in which they began), and which keeps track of how many lookups
+        are in flight at once.
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.num_lookups_in_flight = 0
+            self.max_num_lookups_in_flight = 0
+            self.lock = threading.Lock()
+
+        def check_whether_document_having_id_exists_among_collections(self, document_id, *args, **kwargs):
+            with self.lock:
+                self.num_lookups_in_flight += 1
+                self.max_num_lookups_in_flight = max(self.max_num_lookups_in_flight, self.num_lookups_in_flight)
+            time.sleep(0.001 * (40 - int(document_id[1:]) % 40))
+            with self.lock:
+                self.num_lookups_in_flight -= 1
+            return super().check_whether_document_having_id_exists_among_collections(document_id, *args, **kwargs)
+
+    finder = SlowFinder(database=db)
+    scanner = AsyncScanner(finder=finder, **schema_with_class_uris, concurrency=3, lookup_batch_size=5)
+    checkpoints = []
+    violations = scanner.scan_collection(
+        "employee_set",
+        on_checkpoint=lambda _id, num_documents, violations: checkpoints.append((_id, num_documents, len(violations))),
+    )
+
+    # Confirm the violations are in document order (i.e. the order in which the synchronous scanner finds them), even
+    # though the lookups finished out of order; and that no more lookups were in flight at once than allowed.
+    expected_violations = Scanner(finder=Finder(database=db), **schema_with_class_uris).scan_collection("employee_set")
+    assert violations == expected_violations
+    assert len(violations) == 5 + 1  # "c3" (5 times) and "e20"
+    assert 1 < finder.max_num_lookups_in_flight <= 3
+
+    # Confirm a checkpoint was reported after every batch's worth of documents, with the violations found up to then.
+    assert checkpoints == [(4, 5, 1), (9, 10, 2), (14, 15, 3), (19, 20, 6)]
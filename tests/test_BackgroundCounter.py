@@ -0,0 +1,66 @@
+import threading
+
+from refscan.lib.BackgroundCounter import BackgroundCounter
+
+
+def test_counts_are_reported_in_order():
+    reported_counts = []
+    counter = BackgroundCounter(lambda collection_name: len(collection_name))
+    futures = [counter.submit(name, on_count=reported_counts.append) for name in ["a_set", "bb_set"]]
+    assert [future.result(timeout=5) for future in futures] == [5, 6]
+    assert reported_counts == [5, 6]
+    counter.stop()
+    counter.thread.join(timeout=5)
+    assert not counter.thread.is_alive()
+
+
+def test_abandoned_counts_are_not_reported():
+    is_count_underway = threading.Event()
+    may_finish_count = threading.Event()
+
+    def count_documents(collection_name: str) -> int:
+        is_count_underway.set()
+        may_finish_count.wait(timeout=5)
+        return 10
+
+    reported_counts = []
+    counter = BackgroundCounter(count_documents)
+    assert counter.thread.daemon  # so a count that is underway doesn't keep the program running
+    underway_future = counter.submit("a_set", on_count=reported_counts.append)
+    queued_future = counter.submit("b_set", on_count=reported_counts.append)
+    is_count_underway.wait(timeout=5)
+
+    # Abandon the count that is underway, and the one that is queued behind it.
+    counter.abandon(underway_future)
+    counter.abandon(queued_future)
+    may_finish_count.set()
+
+    # Confirm the count that was underway finished, but was not reported; and the queued one never started.
+    assert underway_future.result(timeout=5) == 10
+    assert queued_future.cancelled()
+    assert reported_counts == []
+
+
+def test_counts_are_not_reported_after_stopping():
+    is_count_underway = threading.Event()
+    may_finish_count = threading.Event()
+
+    def count_documents(collection_name: str) -> int:
+        is_count_underway.set()
+        may_finish_count.wait(timeout=5)
+        return 10
+
+    reported_counts = []
+    counter = BackgroundCounter(count_documents)
+    underway_future = counter.submit("a_set", on_count=reported_counts.append)
+    queued_future = counter.submit("b_set", on_count=reported_counts.append)
+    is_count_underway.wait(timeout=5)
+
+    # Stop the counter without waiting for the count that is underway (like the program does before it closes its
+    # connection to the database); then let that count finish.
+    counter.stop()
+    assert queued_future.cancelled()
+    may_finish_count.set()
+    assert underway_future.result(timeout=5) == 10
+    counter.thread.join(timeout=5)
+    assert reported_counts == []
@@ -0,0 +1,30 @@
+import pytest
+
+from refscan.lib.BloomFilter import BloomFilter
+
+
+def test_for_capacity():
+    # Reference: https://hur.st/bloomfilter/?n=1000&p=0.01
+    bloom_filter = BloomFilter.for_capacity(capacity=1000, false_positive_rate=0.01)
+    assert bloom_filter.num_bits == 9586
+    assert bloom_filter.num_hashes == 7
+    assert len(bloom_filter.bits) == 1199
+
+    with pytest.raises(ValueError):
+        BloomFilter.for_capacity(capacity=1000, false_positive_rate=0)
+
+
+def test_has_no_false_negatives_and_few_false_positives():
+    bloom_filter = BloomFilter.for_capacity(capacity=1000, false_positive_rate=0.01)
+    bloom_filter.update(f"nmdc:bsm-{i}" for i in range(1000))
+    assert bloom_filter.num_ids == 1000
+    assert all(f"nmdc:bsm-{i}" in bloom_filter for i in range(1000))
+
+    num_false_positives = sum(f"nmdc:sty-{i}" in bloom_filter for i in range(10_000))
+    assert num_false_positives < 200  # i.e. under 2%, allowing for some variance around the expected 1%
+    assert bloom_filter.get_estimated_false_positive_rate() == pytest.approx(0.01, rel=0.1)
+
+
+def test_empty_filter_contains_nothing():
+    bloom_filter = BloomFilter.for_capacity(capacity=0, false_positive_rate=0.01)
+    assert "nmdc:bsm-1" not in bloom_filter
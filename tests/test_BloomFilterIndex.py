@@ -0,0 +1,39 @@
+import pytest
+
+from refscan.lib.BloomFilterIndex import BloomFilterIndex
+
+
+@pytest.fixture
+def bloom_filter_index() -> BloomFilterIndex:
+    index = BloomFilterIndex(false_positive_rate=0.001, metadata={"database_name": "nmdc"})
+    index.add_collection("study_set", ["sty-1", "sty-2"], expected_num_ids=2)
+    index.add_collection("biosample_set", [f"bsm-{i}" for i in range(100)], expected_num_ids=100)
+    return index
+
+
+def test_may_contain(bloom_filter_index):
+    assert len(bloom_filter_index) == 102
+    assert bloom_filter_index.may_contain("study_set", "sty-1")
+    assert not bloom_filter_index.may_contain("study_set", "bsm-1")
+    assert bloom_filter_index.may_contain("data_object_set", "anything")  # no filter, so it may contain anything
+    assert bloom_filter_index.get_names_of_collections_that_may_contain_id(
+        "bsm-1", ["study_set", "data_object_set", "biosample_set"]
+    ) == ["data_object_set", "biosample_set"]
+
+
+def test_save_and_load(bloom_filter_index, tmp_path):
+    file_path = tmp_path / "filters.bin"
+    bloom_filter_index.save(file_path)
+    loaded_index = BloomFilterIndex.load(file_path)
+    assert loaded_index.metadata == {"database_name": "nmdc"}
+    assert loaded_index.false_positive_rate == 0.001
+    assert len(loaded_index) == 102
+    for collection_name, bloom_filter in bloom_filter_index.filters_by_collection_name.items():
+        loaded_filter = loaded_index.filters_by_collection_name[collection_name]
+        assert (loaded_filter.num_bits, loaded_filter.num_hashes) == (bloom_filter.num_bits, bloom_filter.num_hashes)
+        assert loaded_filter.bits == bloom_filter.bits
+
+    # A truncated file is rejected.
+    file_path.write_bytes(file_path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        BloomFilterIndex.load(file_path)
@@ -0,0 +1,73 @@
+from bson import ObjectId
+
+from refscan.lib.Checkpoint import Checkpoint
+from refscan.lib.Violation import Violation
+
+
+def make_violation(object_id: ObjectId, target_id: str) -> Violation:
+    return Violation(
+        source_collection_name="biosample_set",
+        source_class_name="Biosample",
+        source_field_name="associated_studies",
+        source_document_object_id=object_id,
+        source_document_id="nmdc:bsm-1",
+        target_id=target_id,
+        name_of_collection_containing_target=None,
+    )
+
+
+def test_save_and_load(tmp_path):
+    file_path = tmp_path / "checkpoint.json"
+    scan_parameters = dict(database_name="nmdc", strategy="lookup")
+    object_id_a = ObjectId("000000000000000000000001")
+    object_id_b = ObjectId("000000000000000000000002")
+
+    checkpoint = Checkpoint(file_path, scan_parameters=scan_parameters)
+    checkpoint.mark_collection_complete("study_set", num_documents_scanned=3, violations=[])
+    checkpoint.record_progress(
+        "biosample_set",
+        last_object_id=object_id_b,
+        num_documents_scanned=2,
+        violations=[make_violation(object_id_a, "nmdc:sty-9")],
+    )
+    checkpoint.save()
+    assert file_path.exists()
+    assert not (tmp_path / "checkpoint.json.tmp").exists()
+
+    # Confirm the loaded checkpoint has the same state, with the `ObjectId`s intact.
+    loaded_checkpoint = Checkpoint.load(file_path)
+    assert loaded_checkpoint.scan_parameters == scan_parameters
+    assert loaded_checkpoint.is_collection_complete("study_set")
+    assert not loaded_checkpoint.is_collection_complete("biosample_set")
+    assert loaded_checkpoint.get_resume_point("study_set") is None
+    assert loaded_checkpoint.get_resume_point("biosample_set") == object_id_b
+    assert loaded_checkpoint.num_documents_scanned_by_collection_name == {"study_set": 3, "biosample_set": 2}
+    assert list(loaded_checkpoint.violations_by_collection_name["study_set"]) == []
+    assert list(loaded_checkpoint.violations_by_collection_name["biosample_set"]) == [
+        make_violation(object_id_a, "nmdc:sty-9")
+    ]
+
+    # Confirm completing a collection clears its resume point.
+    loaded_checkpoint.mark_collection_complete("biosample_set", num_documents_scanned=4, violations=[])
+    assert loaded_checkpoint.get_resume_point("biosample_set") is None
+    assert loaded_checkpoint.is_collection_complete("biosample_set")
+
+    loaded_checkpoint.delete()
+    assert not file_path.exists()
+    loaded_checkpoint.delete()  # does not raise an exception when the file does not exist
+
+
+def test_get_mismatched_scan_parameter_names(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json", scan_parameters=dict(database_name="nmdc", strategy="lookup"))
+    assert checkpoint.get_mismatched_scan_parameter_names(dict(database_name="nmdc", strategy="lookup")) == []
+    assert checkpoint.get_mismatched_scan_parameter_names(dict(database_name="other", strategy="lookup")) == [
+        "database_name"
+    ]
+    assert checkpoint.get_mismatched_scan_parameter_names(dict(database_name="nmdc")) == ["strategy"]
+
+
+def test_is_save_due(tmp_path):
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json", scan_parameters={}, save_interval_in_seconds=0)
+    assert checkpoint.is_save_due()
+    checkpoint = Checkpoint(tmp_path / "checkpoint.json", scan_parameters={}, save_interval_in_seconds=3600)
+    assert not checkpoint.is_save_due()
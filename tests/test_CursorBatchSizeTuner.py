@@ -0,0 +1,36 @@
+from refscan.lib.CursorBatchSizeTuner import (
+    CursorBatchSizeTuner,
+    MAX_BATCH_SIZE,
+    MIN_BATCH_SIZE,
+    TARGET_BYTES_PER_BATCH,
+    TARGET_SECONDS_PER_BATCH,
+)
+
+
+def test_get_batch_size_without_observations():
+    tuner = CursorBatchSizeTuner()
+    assert tuner.get_batch_size("study_set") is None  # defers to the driver's default
+
+
+def test_get_batch_size_based_on_latency():
+    tuner = CursorBatchSizeTuner()
+    tuner.record_batch(num_documents=1000, num_seconds=0.1)
+    tuner.record_batch(num_documents=1000, num_seconds=0.1)
+    assert tuner.get_batch_size("study_set") == int(TARGET_SECONDS_PER_BATCH / 0.0001)
+
+
+def test_get_batch_size_based_on_document_size():
+    tuner = CursorBatchSizeTuner()
+    tuner.record_batch(num_documents=1000, num_seconds=0.001)  # fast enough that document size is the limit
+    tuner.record_document_size("study_set", 1000)
+    tuner.record_document_size("study_set", 3000)
+    assert tuner.get_batch_size("study_set") == int(TARGET_BYTES_PER_BATCH / 2000)
+
+    # A collection whose document sizes the tuner has not observed gets a batch size based on latency alone.
+    assert tuner.get_batch_size("biosample_set") == MAX_BATCH_SIZE
+
+
+def test_get_batch_size_is_clamped():
+    tuner = CursorBatchSizeTuner()
+    tuner.record_batch(num_documents=1, num_seconds=60)
+    assert tuner.get_batch_size("study_set") == MIN_BATCH_SIZE
@@ -0,0 +1,78 @@
+from refscan.lib.DistinctIdScanner import DistinctIdScanner
+from refscan.lib.Finder import Finder
+from refscan.lib.IdIndex import IdIndex
+from refscan.lib.Scanner import Scanner
+from refscan.lib.Violation import REASON_MALFORMED_TARGET_ID, REASON_TARGET_NOT_FOUND
+from tests.conftest import FakeCollection, FakeDatabase
+
+
+def test_get_missing_target_ids(schema_with_references):
+    # Note: Since the finder has an index covering every collection, it will not access the database.
+    id_index = IdIndex()
+    id_index.add_collection("company_set", ["c1", "c2"])
+    id_index.add_collection("employee_set", ["e1"])
+    scanner = DistinctIdScanner(finder=Finder(database=None, id_index=id_index), **schema_with_references)
+
+    missing_target_ids = scanner.get_missing_target_ids(["c1", "c2", "c3", "e1"], ("company_set",))
+    assert sorted(missing_target_ids) == ["c3", "e1"]
+
+    missing_target_ids = scanner.get_missing_target_ids(["c1", "e1"], ("company_set", "employee_set"))
+    assert missing_target_ids == []
+
+
+def make_fake_database() -> FakeDatabase:
+    r"""
+    Returns a fake database containing companies and employees, some of whose references are to `id`s that are
+    missing, malformed (per the schema's `id` patterns), or both.
+    """
+    companies = [
+        {
+            "_id": 101,
+            "id": "my:co-1",
+            "type": "my:Company",
+            "employs": ["my:emp-404", "my:emp-1", "bogus", "my:emp-405"],
+        },
+        {"_id": 102, "id": "my:co-2", "type": "my:Company", "employs": ["my:emp-404"]},
+        {"_id": 103, "id": "x1", "type": "my:Unknown", "employs": ["my:emp-404"]},
+    ]
+    employees = [
+        {"_id": 1, "id": "my:emp-1", "type": "my:Employee", "works_for": "my:co-1", "managed_by": "my:emp-1"},
+        {"_id": 2, "id": "my:emp-2", "type": "my:Employee", "works_for": "my:co-404"},
+        {"_id": 3, "id": "my:emp-3", "type": "my:Employee", "works_for": "my:emp-1"},  # exists, but isn't a company
+    ]
+    return FakeDatabase(dict(company_set=FakeCollection(companies), employee_set=FakeCollection(employees)))
+
+
+def test_scan_collection(schema_with_class_uris):
+    # Note: The finder looks up one `id` per query, so the scanner fetches the source documents that reference
+    #       missing `id`s once per `id`.
+    db = make_fake_database()
+    finder = Finder(database=db, max_ids_per_query=1)
+    scanner = DistinctIdScanner(finder=finder, **schema_with_class_uris, validate_target_ids=True)
+    synchronous_scanner = Scanner(
+        finder=Finder(database=make_fake_database()), **schema_with_class_uris, validate_target_ids=True
+    )
+
+    # Confirm the scanner finds the same violations, in the same order, as the synchronous scanner; i.e. it reports a
+    # source document that references several missing `id`s once per reference (not once per time it was fetched),
+    # and it tells malformed `id`s apart from missing ones.
+    violations = scanner.scan_collection("company_set")
+    assert violations == synchronous_scanner.scan_collection("company_set")
+    assert [(violation.target_id, violation.reason) for violation in violations] == [
+        ("my:emp-404", REASON_TARGET_NOT_FOUND),
+        ("bogus", REASON_MALFORMED_TARGET_ID),
+        ("my:emp-405", REASON_TARGET_NOT_FOUND),
+        ("my:emp-404", REASON_TARGET_NOT_FOUND),
+    ]
+    assert len(db.collections["company_set"].queries) == 3  # one query per batch of (missing or malformed) `id`s
+
+    violations = scanner.scan_collection("employee_set")
+    assert violations == synchronous_scanner.scan_collection("employee_set")
+    assert [(violation.target_id, violation.reason) for violation in violations] == [
+        ("my:co-404", REASON_TARGET_NOT_FOUND),
+        ("my:emp-1", REASON_MALFORMED_TARGET_ID),
+    ]
+
+    # Confirm the relevant documents whose `type` values are unknown were counted.
+    assert scanner.num_documents_by_unknown_type == synchronous_scanner.num_documents_by_unknown_type
+    assert scanner.num_documents_by_unknown_type == {"my:Unknown": 1}
@@ -0,0 +1,46 @@
+import pytest
+
+from refscan.lib.DocumentPrefetcher import DocumentPrefetcher
+
+
+def test_prefetch_items_in_order():
+    prefetcher = DocumentPrefetcher(([n] * 3 for n in range(10)), queue_depth=2)
+    assert list(prefetcher) == [[n] * 3 for n in range(10)]
+    assert not prefetcher.thread.is_alive()
+    assert prefetcher.stats["prefetch_items"] == 10
+    assert 0 <= prefetcher.stats["prefetch_queue_depth_total"] <= 2 * 10
+    assert prefetcher.stats["prefetch_stall_seconds"] >= 0
+
+
+def test_prefetch_raises_producer_exception():
+    def generate_items():
+        yield 1
+        raise RuntimeError("Connection lost")
+
+    items = []
+    with pytest.raises(RuntimeError, match="Connection lost"):
+        for item in DocumentPrefetcher(generate_items(), queue_depth=1):
+            items.append(item)
+    assert items == [1]
+
+
+def test_prefetch_stops_producer_when_consumer_stops():
+    num_items_produced = 0
+
+    def generate_items():
+        nonlocal num_items_produced
+        for n in range(1000):
+            num_items_produced += 1
+            yield n
+
+    prefetcher = DocumentPrefetcher(generate_items(), queue_depth=2)
+    iterator = iter(prefetcher)
+    assert next(iterator) == 0
+    iterator.close()  # e.g. the consumer raised an exception
+    assert not prefetcher.thread.is_alive()
+    assert num_items_produced < 1000
+
+
+def test_queue_depth_must_be_positive():
+    with pytest.raises(ValueError):
+        DocumentPrefetcher([], queue_depth=0)
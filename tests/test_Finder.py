@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from refscan.lib.BloomFilterIndex import BloomFilterIndex
+from refscan.lib.Finder import Finder
+from refscan.lib.IdIndex import IdIndex
+from refscan.lib.IdPrefixRouter import IdPrefixRouter
+from tests.conftest import FakeCollection, FakeDatabase
+
+
+def make_fake_database() -> FakeDatabase:
+    return FakeDatabase(
+        dict(study_set=FakeCollection(ids=["sty-1", "sty-2"]), biosample_set=FakeCollection(ids=["bsm-1"]))
+    )
+
+
+def test_find_collections_containing_documents():
+    db = make_fake_database()
+    finder = Finder(database=db, max_ids_per_query=2)
+
+    # Duplicate `id` values are only searched for once; and each `id` value maps to the first collection containing it.
+    result = finder.find_collections_containing_documents(
+        ["sty-1", "bsm-1", "sty-2", "sty-9", "sty-1"], ["study_set", "biosample_set"]
+    )
+    assert result == {"sty-1": "study_set", "sty-2": "study_set", "bsm-1": "biosample_set", "sty-9": None}
+
+    # The 4 distinct `id` values took 2 queries (of up to 2 `id` values each) of the first collection; and the 2
+    # `id` values not found there took 1 query of the second collection.
+    assert db.collections["study_set"].num_queries == 2
+    assert db.collections["biosample_set"].num_queries == 1
+
+    # An empty list of `id` values yields an empty dictionary, without querying the database.
+    assert finder.find_collections_containing_documents([], ["study_set"]) == {}
+    assert db.collections["study_set"].num_queries == 2
+
+
+def test_result_cache_avoids_repeated_queries():
+    db = make_fake_database()
+    finder = Finder(database=db, result_cache_size=10)
+
+    # Check a positive result and a negative result, twice each.
+    for _ in range(2):
+        assert finder.check_whether_document_having_id_exists_among_collections("sty-1", ["study_set"]) == "study_set"
+        assert finder.check_whether_document_having_id_exists_among_collections("sty-9", ["study_set"]) is None
+    assert db.collections["study_set"].num_queries == 2
+    assert finder.stats == {"lookups": 4, "cache_hits": 2, "cache_misses": 2, "queries": 2}
+
+    # The bulk method shares the cache, and only queries for the `id`s that aren't cached.
+    result = finder.find_collections_containing_documents(["sty-1", "sty-2", "sty-9"], ["study_set"])
+    assert result == {"sty-1": "study_set", "sty-2": "study_set", "sty-9": None}
+    assert db.collections["study_set"].num_queries == 3
+    assert finder.stats == {"lookups": 7, "cache_hits": 4, "cache_misses": 3, "queries": 3}
+
+
+def test_result_cache_is_keyed_by_collection_names():
+    db = make_fake_database()
+    finder = Finder(database=db, result_cache_size=10)
+
+    # A document missing from one set of collections can be present in another set.
+    assert finder.check_whether_document_having_id_exists_among_collections("bsm-1", ["study_set"]) is None
+    assert (
+        finder.check_whether_document_having_id_exists_among_collections("bsm-1", ["study_set", "biosample_set"])
+        == "biosample_set"
+    )
+
+    # The order of the collection names does not matter.
+    assert (
+        finder.check_whether_document_having_id_exists_among_collections("bsm-1", ["biosample_set", "study_set"])
+        == "biosample_set"
+    )
+    assert finder.stats == {"lookups": 3, "cache_hits": 1, "cache_misses": 2, "queries": 3}
+
+
+def test_result_cache_evicts_least_recently_used_result():
+    db = make_fake_database()
+    finder = Finder(database=db, result_cache_size=2)
+
+    finder.check_whether_document_having_id_exists_among_collections("sty-1", ["study_set"])
+    finder.check_whether_document_having_id_exists_among_collections("sty-2", ["study_set"])
+    finder.check_whether_document_having_id_exists_among_collections("sty-1", ["study_set"])  # hit
+    finder.check_whether_document_having_id_exists_among_collections("sty-3", ["study_set"])  # evicts "sty-2"
+    assert len(finder.result_cache) == 2
+    assert (frozenset(["study_set"]), "sty-1") in finder.result_cache
+    assert (frozenset(["study_set"]), "sty-2") not in finder.result_cache
+
+
+def test_result_cache_is_disabled_by_default():
+    db = make_fake_database()
+    finder = Finder(database=db)
+    for _ in range(2):
+        finder.check_whether_document_having_id_exists_among_collections("sty-1", ["study_set"])
+    assert db.collections["study_set"].num_queries == 2
+    assert len(finder.result_cache) == 0
+    assert finder.stats == {"lookups": 2, "queries": 2}
+
+    # Unhashable `id` values are never cached.
+    finder = Finder(database=db, result_cache_size=10)
+    assert finder.check_whether_document_having_id_exists_among_collections({"a": 1}, ["study_set"]) is None
+    assert len(finder.result_cache) == 0
+
+
+def test_collections_are_searched_in_order_of_hits_per_routing_key():
+    db = FakeDatabase(
+        dict(
+            a_set=FakeCollection(ids=["a-1", "a-2"]),
+            b_set=FakeCollection(ids=["b-1", "b-2", "b-3"]),
+        )
+    )
+    finder = Finder(database=db)
+    edge_1 = ("Biosample", "associated_studies")
+    edge_2 = ("DataObject", "was_generated_by")
+
+    # Before anything has been found, the collections are searched in their given order.
+    assert finder._get_names_of_collections_in_search_order(["a_set", "b_set"], edge_1) == ["a_set", "b_set"]
+
+    # Find documents via each routing key.
+    finder.find_collections_containing_documents(["b-1", "b-2", "a-1"], ["a_set", "b_set"], routing_key=edge_1)
+    finder.check_whether_document_having_id_exists_among_collections("a-2", ["a_set", "b_set"], routing_key=edge_2)
+    assert finder.num_documents_found_by_routing_key == {edge_1: {"b_set": 2, "a_set": 1}, edge_2: {"a_set": 1}}
+
+    # Each routing key's collections are ordered by their own hits, unaffected by those of other routing keys.
+    assert finder._get_names_of_collections_in_search_order(["a_set", "b_set"], edge_1) == ["b_set", "a_set"]
+    assert finder._get_names_of_collections_in_search_order(["a_set", "b_set"], edge_2) == ["a_set", "b_set"]
+    assert finder._get_names_of_collections_in_search_order(["b_set", "a_set"], None) == ["b_set", "a_set"]
+
+    # So, a document in `b_set` is found via edge 1 with a single query.
+    num_queries_before = db.collections["a_set"].num_queries + db.collections["b_set"].num_queries
+    assert (
+        finder.check_whether_document_having_id_exists_among_collections("b-3", ["a_set", "b_set"], routing_key=edge_1)
+        == "b_set"
+    )
+    assert db.collections["a_set"].num_queries + db.collections["b_set"].num_queries == num_queries_before + 1
+
+
+def test_collections_are_searched_in_order_of_id_prefix_prediction():
+    db = FakeDatabase(
+        dict(
+            a_set=FakeCollection(ids=["x:a-1", "x:a-2", "x:b-9"]),
+            b_set=FakeCollection(ids=["x:b-1", "x:b-2"]),
+        )
+    )
+    router = IdPrefixRouter()
+    router.learn_ids("a_set", ["x:a-0"])
+    router.learn_ids("b_set", ["x:b-0"])
+    finder = Finder(database=db, id_prefix_router=router)
+
+    # A document in the second collection is found with a single query, since its prefix points to that collection.
+    assert finder.check_whether_document_having_id_exists_among_collections("x:b-1", ["a_set", "b_set"]) == "b_set"
+    assert finder.stats["queries"] == 1
+
+    # In bulk, each `id` is only sent to its predicted collection (one query per collection) when all are found there.
+    finder.stats.clear()
+    result = finder.find_collections_containing_documents(["x:a-1", "x:a-2", "x:b-2"], ["a_set", "b_set"])
+    assert result == {"x:a-1": "a_set", "x:a-2": "a_set", "x:b-2": "b_set"}
+    assert finder.stats["queries"] == 2
+
+    # A mispredicted `id` is still found; as is the absence of an `id` that's in none of the collections.
+    result = finder.find_collections_containing_documents(["x:b-9", "x:b-404"], ["a_set", "b_set"])
+    assert result == {"x:b-9": "a_set", "x:b-404": None}
+
+
+def test_exclusive_id_prefix_routing_skips_other_collections():
+    db = FakeDatabase(dict(a_set=FakeCollection(ids=["x:b-9"]), b_set=FakeCollection(ids=["x:b-1"])))
+    router = IdPrefixRouter(exclusive=True)
+    router.learn_ids("b_set", ["x:b-0"])
+    finder = Finder(database=db, id_prefix_router=router)
+
+    # Note: The exclusive router trades accuracy for speed: it doesn't find `x:b-9`, since it is in the other collection.
+    assert finder.check_whether_document_having_id_exists_among_collections("x:b-9", ["a_set", "b_set"]) is None
+    result = finder.find_collections_containing_documents(["x:b-1", "x:b-9"], ["a_set", "b_set"])
+    assert result == {"x:b-1": "b_set", "x:b-9": None}
+    assert db.collections["a_set"].num_queries == 0
+
+
+def test_bloom_filters_skip_collections_that_lack_id():
+    db = FakeDatabase(dict(a_set=FakeCollection(ids=["a-1"]), b_set=FakeCollection(ids=["b-1"])))
+    bloom_filter_index = BloomFilterIndex(false_positive_rate=0.001)
+    bloom_filter_index.add_collection("a_set", ["a-1"], expected_num_ids=1)
+    bloom_filter_index.add_collection("b_set", ["b-1"], expected_num_ids=1)
+    finder = Finder(database=db, bloom_filter_index=bloom_filter_index)
+
+    # Only the collection whose filter may contain the `id` is queried; and a missing `id` causes no queries at all.
+    assert finder.check_whether_document_having_id_exists_among_collections("b-1", ["a_set", "b_set"]) == "b_set"
+    assert finder.check_whether_document_having_id_exists_among_collections("c-1", ["a_set", "b_set"]) is None
+    result = finder.find_collections_containing_documents(["a-1", "b-1", "c-1"], ["a_set", "b_set"])
+    assert result == {"a-1": "a_set", "b-1": "b_set", "c-1": None}
+    assert finder.stats["queries"] == 3
+    assert db.collections["a_set"].num_queries == 1
+
+
+def test_stats_are_counted_across_threads():
+    db = make_fake_database()
+    finder = Finder(database=db)
+
+    def look_up_ids():
+        for _ in range(500):
+            finder.check_whether_document_having_id_exists_among_collections("sty-9", ["study_set"])
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(8):
+            executor.submit(look_up_ids)
+    assert finder.stats["lookups"] == finder.stats["queries"] == 8 * 500
+
+
+def test_lookups_are_counted_however_they_are_answered():
+    db = make_fake_database()
+    id_index = IdIndex()
+    id_index.add_collection("study_set", ["sty-1", "sty-2"])
+    finder = Finder(database=db, id_index=id_index)
+
+    # The index answers these lookups, so the database is not queried; but they are still lookups.
+    assert finder.check_whether_document_having_id_exists_among_collections("sty-1", ["study_set"]) == "study_set"
+    finder.find_collections_containing_documents(["sty-1", "sty-2", "sty-9", "sty-1"], ["study_set"])
+    assert finder.stats == {"lookups": 1 + 3}
+    assert db.collections["study_set"].num_queries == 0
@@ -0,0 +1,63 @@
+import pytest
+from bson.int64 import Int64
+
+from refscan.lib.HashedIdIndex import HashedIdIndex, hash_id
+
+# Skip these tests if NumPy (an optional dependency) is not installed.
+pytest.importorskip("numpy")
+
+
+def test_hash_id():
+    assert hash_id("nmdc:sty-1") == hash_id("nmdc:sty-1")
+    assert hash_id("nmdc:sty-1") != hash_id("nmdc:sty-2")
+    assert 0 <= hash_id("nmdc:sty-1") < 2**64
+
+    # Values of different types have different hashes, even if their string representations are the same.
+    assert hash_id(5) != hash_id("5")
+    assert hash_id(True) != hash_id(1)
+    assert hash_id(Int64(5)) == hash_id(5)  # MongoDB considers these to be equal
+
+
+def test_find_collection_containing_id_of_different_type():
+    id_index = HashedIdIndex()
+    id_index.add_collection("study_set", ["5"])
+    assert id_index.find_collection_containing_id("5", ["study_set"]) == "study_set"
+    assert id_index.find_collection_containing_id(5, ["study_set"]) is None
+
+
+def test_find_collection_containing_id():
+    id_index = HashedIdIndex()
+    id_index.add_collection("study_set", ["nmdc:sty-1", "nmdc:sty-2"])
+    id_index.add_collection("biosample_set", ["nmdc:bsm-1"])
+    id_index.add_collection("empty_set", [])
+
+    assert id_index.find_collection_containing_id("nmdc:sty-1", ["study_set"]) == "study_set"
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["study_set", "biosample_set"]) == "biosample_set"
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["study_set"]) is None
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["empty_set"]) is None
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["unknown_set"]) is None
+    assert id_index.has_collections(["study_set", "biosample_set", "empty_set"])
+    assert not id_index.has_collection("unknown_set")
+
+
+def test_find_collections_containing_ids():
+    id_index = HashedIdIndex()
+    id_index.add_collection("study_set", ["nmdc:sty-1", "nmdc:sty-2"])
+    id_index.add_collection("biosample_set", [f"nmdc:bsm-{n}" for n in range(1000)])
+
+    result = id_index.find_collections_containing_ids(
+        ["nmdc:sty-2", "nmdc:bsm-999", "nmdc:bsm-1000", "nmdc:sty-2"], ["study_set", "biosample_set"]
+    )
+    assert result == {
+        "nmdc:sty-2": "study_set",
+        "nmdc:bsm-999": "biosample_set",
+        "nmdc:bsm-1000": None,
+    }
+
+
+def test_len_and_size():
+    id_index = HashedIdIndex()
+    id_index.add_collection("study_set", ["nmdc:sty-1", "nmdc:sty-2"])
+    id_index.add_collection("study_set", ["nmdc:sty-2", "nmdc:sty-3"])  # adds to the existing collection
+    assert len(id_index) == 3
+    assert id_index.get_size_in_bytes() == 3 * 8  # 8 bytes per hash
@@ -0,0 +1,48 @@
+from refscan.lib.IdIndex import IdIndex
+
+
+def test_find_collection_containing_id():
+    id_index = IdIndex()
+    id_index.add_collection("study_set", ["nmdc:sty-1", "nmdc:sty-2"])
+    id_index.add_collection("biosample_set", ["nmdc:bsm-1"])
+    id_index.add_collection("empty_set", [])
+
+    assert id_index.find_collection_containing_id("nmdc:sty-1", ["study_set"]) == "study_set"
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["study_set", "biosample_set"]) == "biosample_set"
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["study_set"]) is None
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["empty_set"]) is None
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["unknown_set"]) is None
+
+
+def test_has_collections():
+    id_index = IdIndex()
+    id_index.add_collection("study_set", ["nmdc:sty-1"])
+    id_index.add_collection("empty_set", [])
+
+    assert id_index.has_collection("study_set")
+    assert id_index.has_collection("empty_set")
+    assert not id_index.has_collection("unknown_set")
+    assert id_index.has_collections(["study_set", "empty_set"])
+    assert not id_index.has_collections(["study_set", "unknown_set"])
+
+
+def test_len_and_size():
+    id_index = IdIndex()
+    assert len(id_index) == 0
+    empty_size = id_index.get_size_in_bytes()
+
+    id_index.add_collection("study_set", ["nmdc:sty-1", "nmdc:sty-2"])
+    id_index.add_collection("study_set", ["nmdc:sty-2", "nmdc:sty-3"])  # adds to the existing collection
+    assert len(id_index) == 3
+    assert id_index.get_size_in_bytes() > empty_size
+
+
+def test_find_collections_containing_ids():
+    id_index = IdIndex()
+    id_index.add_collection("study_set", ["nmdc:sty-1", "nmdc:sty-2"])
+    id_index.add_collection("biosample_set", ["nmdc:bsm-1"])
+
+    result = id_index.find_collections_containing_ids(
+        ["nmdc:sty-2", "nmdc:bsm-1", "nmdc:bsm-2", "nmdc:sty-2"], ["study_set", "biosample_set"]
+    )
+    assert result == {"nmdc:sty-2": "study_set", "nmdc:bsm-1": "biosample_set", "nmdc:bsm-2": None}
@@ -0,0 +1,69 @@
+import linkml_runtime
+
+from refscan.lib.IdPrefixRouter import IdPrefixRouter
+from refscan.lib.SchemaAnalyzer import SchemaAnalyzer
+
+
+def test_get_id_prefix():
+    assert IdPrefixRouter.get_id_prefix("nmdc:bsm-11-abc123") == "nmdc:bsm"
+    assert IdPrefixRouter.get_id_prefix("nmdc:sty-11-abc123") == "nmdc:sty"
+    assert IdPrefixRouter.get_id_prefix("nmdc:abc123") is None  # no typecode
+    assert IdPrefixRouter.get_id_prefix("bsm-1") is None  # no prefix
+    assert IdPrefixRouter.get_id_prefix(123) is None
+
+
+def test_get_names_of_collections_to_search():
+    router = IdPrefixRouter()
+    router.learn_ids("biosample_set", ["nmdc:bsm-1", "nmdc:bsm-2", "nmdc:bsm-3", "nmdc:sty-9", "oops"])
+    router.learn_ids("study_set", ["nmdc:sty-1", "nmdc:sty-2"])
+    assert len(router) == 2
+    assert router.num_ids_by_prefix == {
+        "nmdc:bsm": {"biosample_set": 3},
+        "nmdc:sty": {"biosample_set": 1, "study_set": 2},
+    }
+
+    # Collections in which the prefix has been seen more often come first; then, the others, in their given order.
+    collection_names = ["data_object_set", "biosample_set", "study_set"]
+    assert router.get_predicted_collection_names("nmdc:sty-3", collection_names) == ["study_set", "biosample_set"]
+    assert router.get_names_of_collections_to_search("nmdc:sty-3", collection_names) == [
+        "study_set",
+        "biosample_set",
+        "data_object_set",
+    ]
+    assert router.get_names_of_collections_to_search("nmdc:bsm-4", collection_names) == [
+        "biosample_set",
+        "data_object_set",
+        "study_set",
+    ]
+
+    # Unknown prefixes (and `id`s lacking one) leave the given order unchanged.
+    assert router.get_predicted_collection_names("nmdc:dobj-1", collection_names) == []
+    assert router.get_names_of_collections_to_search("nmdc:dobj-1", collection_names) == collection_names
+    assert router.get_names_of_collections_to_search("dobj-1", collection_names) == collection_names
+
+    # An exclusive router only searches the predicted collection, when it is the only one predicted.
+    router.exclusive = True
+    assert router.get_names_of_collections_to_search("nmdc:bsm-4", collection_names) == ["biosample_set"]
+    assert len(router.get_names_of_collections_to_search("nmdc:sty-3", collection_names)) == 3
+
+
+def test_learn_from_schema():
+    schema_view = linkml_runtime.SchemaView(schema="tests/schemas/database_with_class_uris.yaml")
+    router = IdPrefixRouter()
+    router.learn_from_schema(
+        SchemaAnalyzer(schema_view),
+        {"company_set": ["Company"], "employee_set": ["Employee", "Contractor"]},
+    )
+    assert router.num_ids_by_prefix == {
+        "my:co": {"company_set": 1},
+        "my:emp": {"employee_set": 1},
+        "my:mgr": {"employee_set": 1},
+        "ex:emp": {"employee_set": 1},
+        "ex:mgr": {"employee_set": 1},
+    }
+
+    # Note: The `Employee` prefixes come from an interpolated `structured_pattern`, which some versions of
+    #       `linkml-runtime` (e.g. 1.8.3) don't materialize into a `pattern`; so this also confirms we resolve it.
+    collection_names = ["company_set", "employee_set"]
+    assert router.get_predicted_collection_names("ex:mgr-1", collection_names) == ["employee_set"]
+    assert router.get_predicted_collection_names("my:co-1", collection_names) == ["company_set"]
@@ -0,0 +1,98 @@
+import pickle
+
+import pytest
+
+import refscan.lib.MappedIdIndex
+from refscan.lib.MappedIdIndex import MappedIdIndex
+
+
+@pytest.fixture()
+def id_index_file_path(tmp_path):
+    file_path = tmp_path / "ids.idx"
+    MappedIdIndex.build(
+        file_path,
+        {
+            "study_set": ["nmdc:sty-2", "nmdc:sty-1", "nmdc:sty-2"],  # includes a duplicate
+            "biosample_set": (f"nmdc:bsm-{n}" for n in range(1000)),  # a generator, like a database cursor
+            "empty_set": [],
+        },
+        metadata=dict(database_name="nmdc"),
+    )
+    return file_path
+
+
+def test_build_and_open(id_index_file_path):
+    assert not id_index_file_path.with_name(f"{id_index_file_path.name}.tmp").exists()
+    assert not id_index_file_path.with_name(f"{id_index_file_path.name}.hashes.tmp").exists()
+
+    id_index = MappedIdIndex(id_index_file_path)
+    assert id_index.metadata == dict(database_name="nmdc")
+    assert len(id_index) == 2 + 1000
+    assert id_index.get_size_in_bytes() == id_index_file_path.stat().st_size
+    assert id_index.has_collections(["study_set", "biosample_set", "empty_set"])
+    assert not id_index.has_collection("unknown_set")
+    id_index.close()
+
+
+def test_build_without_numpy(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    ids_by_collection_name = {"a_set": [f"a-{n % 250}" for n in range(1000)], "b_set": ["b-1", 1, "1"], "c_set": []}
+    MappedIdIndex.build(tmp_path / "with_numpy.idx", ids_by_collection_name)
+
+    # Confirm that merging small sorted runs of hashes (some of which are duplicates) makes an identical file.
+    monkeypatch.setattr(refscan.lib.MappedIdIndex, "np", None)
+    monkeypatch.setattr(refscan.lib.MappedIdIndex, "NUM_HASHES_PER_SORTED_RUN", 100)
+    MappedIdIndex.build(tmp_path / "without_numpy.idx", ids_by_collection_name)
+    assert (tmp_path / "with_numpy.idx").read_bytes() == (tmp_path / "without_numpy.idx").read_bytes()
+
+    id_index = MappedIdIndex(tmp_path / "without_numpy.idx")
+    assert len(id_index) == 250 + 3
+    assert id_index.find_collections_containing_ids(["a-249", "a-250", 1], ["a_set", "b_set"]) == {
+        "a-249": "a_set",
+        "a-250": None,
+        1: "b_set",
+    }
+    id_index.close()
+
+
+def test_find_collection_containing_id(id_index_file_path):
+    id_index = MappedIdIndex(id_index_file_path)
+    assert id_index.find_collection_containing_id("nmdc:sty-1", ["study_set"]) == "study_set"
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["study_set", "biosample_set"]) == "biosample_set"
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["study_set"]) is None
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["empty_set"]) is None
+    assert id_index.find_collection_containing_id("nmdc:bsm-1", ["unknown_set"]) is None
+
+    result = id_index.find_collections_containing_ids(
+        ["nmdc:sty-2", "nmdc:bsm-999", "nmdc:bsm-1000", "nmdc:sty-2"], ["study_set", "biosample_set"]
+    )
+    assert result == {
+        "nmdc:sty-2": "study_set",
+        "nmdc:bsm-999": "biosample_set",
+        "nmdc:bsm-1000": None,
+    }
+
+
+def test_pickle(id_index_file_path):
+    id_index = MappedIdIndex(id_index_file_path)
+    id_index.db = object()  # stands in for a database, which can't be pickled
+
+    # Confirm the unpickled index maps the same file, and is not bound to a database.
+    unpickled_id_index = pickle.loads(pickle.dumps(id_index))
+    assert unpickled_id_index.db is None
+    assert len(unpickled_id_index) == len(id_index)
+    assert unpickled_id_index.find_collection_containing_id("nmdc:bsm-7", ["biosample_set"]) == "biosample_set"
+
+
+def test_open_invalid_file(id_index_file_path, tmp_path):
+    # Truncated file.
+    truncated_file_path = tmp_path / "truncated.idx"
+    truncated_file_path.write_bytes(id_index_file_path.read_bytes()[:-8])
+    with pytest.raises(ValueError, match="truncated"):
+        MappedIdIndex(truncated_file_path)
+
+    # File in some other format.
+    other_file_path = tmp_path / "other.idx"
+    other_file_path.write_bytes((2).to_bytes(8, byteorder="little") + b"{}")
+    with pytest.raises(ValueError, match="Not a version"):
+        MappedIdIndex(other_file_path)
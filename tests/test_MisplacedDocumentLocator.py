@@ -0,0 +1,51 @@
+import pytest
+
+from refscan.lib.MisplacedDocumentLocator import MisplacedDocumentLocator
+from tests.conftest import FakeCollection, FakeDatabase
+
+# Skip these tests if NumPy (an optional dependency, which the locator's index requires) is not installed.
+pytest.importorskip("numpy")
+
+
+def make_fake_database() -> FakeDatabase:
+    return FakeDatabase(
+        dict(
+            study_set=FakeCollection(ids=["sty-1", "dup-1"]),
+            biosample_set=FakeCollection(ids=["bsm-1", "dup-1", {"not": "hashable"}]),
+            data_object_set=FakeCollection(ids=["dobj-1", "dup-1"]),
+        )
+    )
+
+
+def test_locate():
+    db = make_fake_database()
+    locator = MisplacedDocumentLocator(db, ["study_set", "biosample_set", "data_object_set"])
+
+    # The index isn't built until the locator is first used.
+    assert len(locator) == 0
+    assert locator.locate("sty-1") == "study_set"
+    assert len(locator) == 7
+    assert locator.locate("bsm-1", ["study_set"]) == "biosample_set"
+    assert locator.locate("bsm-1", ["biosample_set"]) is None
+    assert locator.locate("missing") is None
+
+    # An `id` that's in multiple collections is located in the first (alphabetically) of the non-ignored ones.
+    assert locator.locate("dup-1") == "biosample_set"
+    assert locator.locate("dup-1", ("biosample_set",)) == "data_object_set"
+    assert locator.locate("dup-1", ("biosample_set", "data_object_set", "study_set")) is None
+
+    # Each collection was only read once; and a collection was only queried when the index said it contained the `id`.
+    assert all(collection.num_full_reads == 1 for collection in db.collections.values())
+    assert db.collections["study_set"].num_queries == 1  # "sty-1"
+    assert db.collections["biosample_set"].num_queries == 2  # "bsm-1" and "dup-1"
+    assert db.collections["data_object_set"].num_queries == 1  # "dup-1"
+
+
+def test_locate_unhashable_id():
+    db = make_fake_database()
+    locator = MisplacedDocumentLocator(db, ["study_set", "biosample_set", "data_object_set"])
+
+    # A value that isn't hashable is searched for via queries, without building the index.
+    assert locator.locate({"not": "hashable"}) == "biosample_set"
+    assert locator.locate({"not": "hashable"}, ["biosample_set"]) is None
+    assert len(locator) == 0
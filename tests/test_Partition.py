@@ -0,0 +1,17 @@
+from refscan.lib.Partition import Partition
+
+
+def test_description():
+    assert Partition(collection_name="study_set").description == "study_set"
+    assert Partition(collection_name="study_set", index=1, num_partitions=3).description == "study_set [2/3]"
+
+
+def test_get_query_filter():
+    assert Partition(collection_name="study_set").get_query_filter() == {}
+
+    first = Partition(collection_name="study_set", index=0, num_partitions=3, upper_bound=10)
+    middle = Partition(collection_name="study_set", index=1, num_partitions=3, lower_bound=10, upper_bound=20)
+    last = Partition(collection_name="study_set", index=2, num_partitions=3, lower_bound=20)
+    assert first.get_query_filter() == {"_id": {"$not": {"$gte": 10}}}
+    assert middle.get_query_filter() == {"_id": {"$gte": 10, "$lt": 20}}
+    assert last.get_query_filter() == {"_id": {"$gte": 20}}
@@ -0,0 +1,45 @@
+from refscan.lib.ProgressLogger import ProgressLogger
+from refscan.lib.helpers import init_progress_bar
+
+
+def test_make_report():
+    progress = init_progress_bar()
+    progress.add_task("study_set", total=10, completed=10, num_violations=1, remaining_time_label="done")
+    task_id = progress.add_task(
+        "biosample_set", total=100, completed=0, num_violations=0, remaining_time_label="remaining"
+    )
+    num_lookups = 0
+    logger = ProgressLogger(progress, get_num_lookups=lambda: num_lookups)
+
+    progress.update(task_id, advance=40, num_violations=2)
+    num_lookups = 7
+    report = logger.make_report()
+    assert report.startswith("Progress: 50 documents scanned (")
+    assert "7 lookups (" in report
+    assert "3 violations" in report
+    assert report.endswith("; scanning: biosample_set")
+
+    # The rates are based on what happened since the previous report.
+    logger.time_of_last_report -= 2  # pretend the previous report was made 2 seconds ago
+    progress.update(task_id, advance=60, num_violations=2, remaining_time_label="done")
+    report = logger.make_report()
+    assert report.startswith("Progress: 110 documents scanned (30/s), 7 lookups (0/s), 3 violations")
+    assert "scanning" not in report
+
+
+def test_make_report_without_lookups():
+    progress = init_progress_bar()
+    progress.add_task("study_set", total=10, completed=5, num_violations=0, remaining_time_label="remaining")
+    report = ProgressLogger(progress).make_report()
+    assert "lookups" not in report
+    assert "5 documents scanned" in report
+
+
+def test_start_and_stop(capsys):
+    progress = init_progress_bar()
+    progress.add_task("study_set", total=10, completed=5, num_violations=0, remaining_time_label="remaining")
+    with ProgressLogger(progress, interval_in_seconds=60):
+        pass
+
+    # Stopping the logger prints a final report (even though the interval had not elapsed).
+    assert "5 documents scanned" in capsys.readouterr().out
@@ -43,6 +43,14 @@ def test_get_source_collection_names(reference_list):
     assert "persons" not in collection_names
 
 
+def test_get_distinct_target_collection_names(reference_list):
+    collection_names = reference_list.get_distinct_target_collection_names()
+    assert len(collection_names) == 2
+    assert "companies" in collection_names
+    assert "persons" in collection_names
+    assert "employees" not in collection_names
+
+
 def test_get_source_field_names_of_source_collection(reference_list):
     field_names = reference_list.get_source_field_names_of_source_collection("employees")
     assert len(field_names) == 1
@@ -65,6 +73,11 @@ def test_get_target_collection_names(reference_list):
     assert len(collection_names) == 0
 
 
+def test_get_target_class_names(reference_list):
+    assert reference_list.get_target_class_names("Employee", "employer") == ["Company"]
+    assert reference_list.get_target_class_names("Employee", "foo") == []
+
+
 def test_get_reference_field_names_by_source_class_name(reference_list):
     field_names_by_class_name = reference_list.get_reference_field_names_by_source_class_name()
     assert len(field_names_by_class_name.keys()) == 2
@@ -74,5 +87,39 @@ def test_get_reference_field_names_by_source_class_name(reference_list):
     assert field_names_by_class_name["Company"] == ["owner"]
 
 
+def test_lookup_tables_are_rebuilt_after_mutation(reference_list):
+    assert reference_list.get_target_collection_names("Employee", "employer") == ["companies"]
+
+    # Mutate the list after the lookup tables have been built, and confirm the getters reflect the mutation.
+    reference_list.append(
+        Reference(
+            source_collection_name="employees",
+            source_class_name="Employee",
+            source_field_name="employer",
+            target_collection_name="nonprofits",
+            target_class_name="Nonprofit",
+        )
+    )
+    assert sorted(reference_list.get_target_collection_names("Employee", "employer")) == ["companies", "nonprofits"]
+    assert "nonprofits" in reference_list.get_distinct_target_collection_names()
+
+    del reference_list[0]
+    assert reference_list.get_target_collection_names("Employee", "employer") == ["nonprofits"]
+    assert reference_list.get_source_collection_names() == ["companies", "employees"]
+
+    reference_list.clear()
+    assert reference_list.get_source_collection_names() == []
+    assert reference_list.get_reference_field_names_by_source_class_name() == {}
+
+
+def test_getters_return_copies(reference_list):
+    reference_list.get_target_collection_names("Employee", "employer").append("foo")
+    reference_list.get_source_field_names_of_source_collection("employees").append("foo")
+    reference_list.get_reference_field_names_by_source_class_name()["Employee"].append("foo")
+    assert reference_list.get_target_collection_names("Employee", "employer") == ["companies"]
+    assert reference_list.get_source_field_names_of_source_collection("employees") == ["employer"]
+    assert reference_list.get_reference_field_names_by_source_class_name()["Employee"] == ["employer"]
+
+
 def test_as_table(reference_list):
     assert isinstance(reference_list.as_table(), Table)
@@ -0,0 +1,428 @@
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from types import SimpleNamespace
+import queue
+import threading
+
+import bson
+import pytest
+from bson.raw_bson import RawBSONDocument
+from rich.table import Table
+
+from refscan.lib.Finder import Finder
+from refscan.lib.HashedIdIndex import HashedIdIndex
+from refscan.lib.IdIndex import IdIndex
+from refscan.lib.MappedIdIndex import MappedIdIndex
+from refscan.lib.MicroBatch import MicroBatch
+from refscan.lib.Partition import Partition
+from refscan.lib.Scanner import Scanner, scan_partitions_in_worker_processes
+from refscan.lib.ViolationList import ViolationList
+from refscan.lib.helpers import init_progress_bar
+from tests.conftest import FakeCollection, FakeDatabase
+
+
+@pytest.fixture
+def scanner(schema_with_references):
+    # Note: The scanner does not access the database until it is asked to count or scan documents.
+    return Scanner(finder=Finder(database=None), **schema_with_references)
+
+
+def test_get_query_filter_and_projection(scanner):
+    query_filter, query_projection = scanner.get_query_filter_and_projection("employee_set")
+    assert len(query_filter["$or"]) == 2
+    assert {"works_for": {"$exists": True}} in query_filter["$or"]
+    assert {"managed_by": {"$exists": True}} in query_filter["$or"]
+    assert sorted(query_projection) == ["id", "managed_by", "type", "works_for"]
+
+    query_filter, query_projection = scanner.get_query_filter_and_projection("company_set")
+    assert query_filter == {"$or": [{"employs": {"$exists": True}}]}
+    assert sorted(query_projection) == ["employs", "id", "type"]
+
+
+def test_get_partitions_without_splitting(scanner):
+    # Note: When asked for fewer than 2 partitions, the scanner does not need to sample the collection.
+    for num_partitions in [0, 1]:
+        partitions = scanner.get_partitions("employee_set", num_partitions=num_partitions)
+        assert len(partitions) == 1
+        assert partitions[0].collection_name == "employee_set"
+        assert partitions[0].get_query_filter() == {}
+
+
+def test_get_references_in_document(scanner):
+    # Note: The classes in this schema have no `class_uri`, so no document can be mapped to a class.
+    document = {"_id": 1, "id": "e1", "type": "Employee", "works_for": "c1"}
+    source_class_name, references_in_document = scanner.get_references_in_document(document)
+    assert source_class_name is None
+    assert references_in_document == []
+
+
+def test_compile_scan_plans(schema_with_class_uris):
+    scanner = Scanner(finder=Finder(database=None), **schema_with_class_uris)
+    scan_plans_by_class_uri = scanner.scan_plans_by_class_uri
+
+    # Note: The `Database` class has no `class_uri`, so it gets no plan.
+    assert sorted(scan_plans_by_class_uri.keys()) == ["my:Company", "my:Contractor", "my:Employee"]
+
+    scan_plan = scan_plans_by_class_uri["my:Employee"]
+    assert scan_plan.class_uri == "my:Employee"
+    assert scan_plan.class_name == "Employee"
+    assert scan_plan.reference_fields == (("works_for", ("company_set",)), ("managed_by", ("employee_set",)))
+    assert scan_plan.reference_field_names == ("works_for", "managed_by")
+    assert scan_plan.get_target_collection_names("managed_by") == ("employee_set",)
+    assert scan_plan.get_target_collection_names("name") == ()
+
+    assert scan_plans_by_class_uri["my:Company"].reference_fields == (("employs", ("employee_set",)),)
+    assert scan_plans_by_class_uri["my:Contractor"].class_name == "Contractor"
+    assert scan_plans_by_class_uri["my:Contractor"].reference_fields == ()
+
+    assert isinstance(scanner.scan_plans_as_table(), Table)
+
+
+def test_get_references_in_document_using_scan_plan(schema_with_class_uris):
+    scanner = Scanner(finder=Finder(database=None), **schema_with_class_uris)
+
+    document = {"_id": 1, "id": "e1", "type": "my:Employee", "managed_by": ["e2", "e3"], "works_for": "c1"}
+    source_class_name, references_in_document = scanner.get_references_in_document(document)
+    assert source_class_name == "Employee"
+    assert references_in_document == [
+        ("works_for", ("company_set",), ["c1"]),
+        ("managed_by", ("employee_set",), ["e2", "e3"]),
+    ]
+
+    # A document of a class that has no reference fields.
+    document = {"_id": 2, "id": "x1", "type": "my:Contractor", "managed_by": "e1"}
+    assert scanner.get_references_in_document(document) == ("Contractor", [])
+
+    # Documents whose `type` is unknown, missing, or not a string.
+    for document in [
+        {"_id": 3, "type": "my:Unknown", "works_for": "c1"},
+        {"_id": 4, "works_for": "c1"},
+        {"_id": 5, "type": ["my:Employee"], "works_for": "c1"},
+    ]:
+        assert scanner.get_references_in_document(document) == (None, [])
+
+
+def test_get_references_in_raw_bson_document(schema_with_class_uris):
+    scanner = Scanner(finder=Finder(database=None), use_raw_bson_documents=True, **schema_with_class_uris)
+
+    document = {"_id": 1, "id": "e1", "type": "my:Employee", "managed_by": ["e2", {"id": "e3"}], "works_for": "c1"}
+    source_class_name, references_in_document = scanner.get_references_in_document(
+        RawBSONDocument(bson.encode(document))
+    )
+    assert source_class_name == "Employee"
+    assert references_in_document == [
+        ("works_for", ("company_set",), ["c1"]),
+        ("managed_by", ("employee_set",), ["e2", {"id": "e3"}]),  # the nested document is decoded into a dictionary
+    ]
+    assert type(references_in_document[1][2][1]) is dict
+    assert "decode_seconds" in scanner.stats
+
+
+def test_fetch_batches_of_documents(schema_with_class_uris):
+    scanner = Scanner(finder=Finder(database=None), lookup_batch_size=2, **schema_with_class_uris)
+    documents = ({"_id": n} for n in range(5))
+    batches = list(scanner.fetch_batches_of_documents(documents))
+    assert batches == [[{"_id": 0}, {"_id": 1}], [{"_id": 2}, {"_id": 3}], [{"_id": 4}]]
+    assert scanner.stats["documents_fetched"] == 5
+    assert scanner.stats["fetch_seconds"] >= 0
+
+
+def test_count_documents_having_unknown_type(schema_with_class_uris):
+    scanner = Scanner(finder=Finder(database=None), **schema_with_class_uris)
+    for document in [
+        {"_id": 1, "type": "my:Employee", "works_for": "c1"},
+        {"_id": 2, "type": "my:Unknown", "works_for": "c1"},
+        {"_id": 3, "type": "my:Unknown", "works_for": "c2"},
+        {"_id": 4, "works_for": "c1"},
+        {"_id": 5, "type": ["my:Employee"], "works_for": "c1"},
+    ]:
+        scanner.get_references_in_document(document)
+    assert scanner.num_documents_by_unknown_type == {"my:Unknown": 2, None: 2}
+
+
+def test_is_malformed_target_id(schema_with_class_uris):
+    # Target `id`s are only validated if the user opted to validate them.
+    scanner = Scanner(finder=Finder(database=None), **schema_with_class_uris)
+    assert scanner.target_id_regexes_by_source_class_and_field_name == {}
+    assert scanner.is_malformed_target_id("Employee", "works_for", "free text") is False
+
+    scanner = Scanner(finder=Finder(database=None), validate_target_ids=True, **schema_with_class_uris)
+    assert set(scanner.target_id_regexes_by_source_class_and_field_name.keys()) == {
+        ("Company", "employs"),
+        ("Employee", "works_for"),
+        ("Employee", "managed_by"),
+    }
+    assert scanner.is_malformed_target_id("Employee", "works_for", "my:co-1") is False
+    assert scanner.is_malformed_target_id("Employee", "managed_by", "ex:mgr-1") is False
+    for target_id in ["", "free text", "my:co-", "my:emp-1", 123, None]:
+        assert scanner.is_malformed_target_id("Employee", "works_for", target_id) is True
+
+    # Fields that can't contain references (or whose target classes lack `id` patterns) are not validated.
+    assert scanner.is_malformed_target_id("Contractor", "name", "free text") is False
+
+
+def test_make_violation_includes_reason(schema_with_class_uris):
+    scanner = Scanner(finder=Finder(database=None), validate_target_ids=True, **schema_with_class_uris)
+    document = {"_id": 1, "id": "my:emp-1", "type": "my:Employee"}
+    reasons = [
+        scanner.make_violation(
+            source_collection_name="employee_set",
+            document=document,
+            source_class_name="Employee",
+            source_field_name="works_for",
+            target_collection_names=("company_set",),
+            target_id=target_id,
+            name_of_collection_containing_target=name_of_collection_containing_target,
+        ).reason
+        for target_id, name_of_collection_containing_target in [
+            ("my:co-1", None),
+            ("my:co-1", "employee_set"),
+            ("my:emp-2", "employee_set"),
+        ]
+    ]
+    assert reasons == ["target_not_found", "target_in_ineligible_collection", "malformed_target_id"]
+
+
+def test_find_targets_using_lookup_threads(schema_with_class_uris):
+    class FakeFinder(Finder):
+        r"""A finder that "finds" every even-numbered `id`, and records the `id`s it was asked about in each call."""
+
+        def __init__(self):
+            super().__init__(database=None)
+            self.calls = []
+
+        def find_collections_containing_documents(self, document_ids, collection_names, routing_key=None):
+            self.calls.append(sorted(document_ids))
+            return {document_id: collection_names[0] if document_id % 2 == 0 else None for document_id in document_ids}
+
+    target_ids_by_lookup_key = {
+        (("company_set",), None): set(range(250)),
+        (("company_set", "employee_set"), ("Employee", "works_for")): {1, 2},
+    }
+    expected_result = {
+        (("company_set",), None): {n: "company_set" if n % 2 == 0 else None for n in range(250)},
+        (("company_set", "employee_set"), ("Employee", "works_for")): {1: None, 2: "company_set"},
+    }
+
+    finder = FakeFinder()
+    scanner = Scanner(finder=finder, lookup_threads=4, **schema_with_class_uris)
+    assert scanner.find_targets(target_ids_by_lookup_key) == expected_result
+    assert len(finder.calls) == 2  # one call per lookup key
+
+    # Confirm the threads get chunks of at least `MIN_IDS_PER_LOOKUP_TASK` `id`s, and the results are the same.
+    finder.calls.clear()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert scanner.find_targets(target_ids_by_lookup_key, lookup_executor=executor) == expected_result
+    assert sorted(len(call) for call in finder.calls) == [2, 50, 100, 100]
+
+
+def test_pipeline_stages(schema_with_class_uris):
+    class FakeFinder(Finder):
+        r"""A finder that only "finds" the `id` "c1"."""
+
+        def __init__(self):
+            super().__init__(database=None)
+
+        def find_collections_containing_documents(self, document_ids, collection_names, routing_key=None):
+            return {document_id: collection_names[0] if document_id == "c1" else None for document_id in document_ids}
+
+    scanner = Scanner(finder=FakeFinder(), **schema_with_class_uris)
+    micro_batch = MicroBatch(
+        source_collection_name="employee_set",
+        documents=[
+            {"_id": 1, "id": "e1", "type": "my:Employee", "works_for": "c1"},
+            {"_id": 2, "id": "e2", "type": "my:Employee", "works_for": "c2", "managed_by": ["e1"]},
+        ],
+    )
+
+    # Extractor stage.
+    scanner.extract_references_in_micro_batch(micro_batch)
+    assert len(micro_batch.references_by_document) == 2
+    assert micro_batch.target_ids_by_lookup_key == {
+        (("company_set",), None): {"c1", "c2"},
+        (("employee_set",), None): {"e1"},
+    }
+
+    # Resolver stage.
+    scanner.resolve_references_in_micro_batch(micro_batch)
+    assert micro_batch.name_of_collection_containing_target_by_lookup_key_and_id == {
+        (("company_set",), None): {"c1": "company_set", "c2": None},
+        (("employee_set",), None): {"e1": None},
+    }
+
+    # Sink stage.
+    violations = ViolationList()
+    progress_reports = []
+    scanner.record_violations_in_micro_batch(
+        micro_batch, violations=violations, on_progress=lambda *args: progress_reports.append(args)
+    )
+    assert [(violation.source_document_id, violation.target_id) for violation in violations] == [
+        ("e2", "c2"),
+        ("e2", "e1"),
+    ]
+    assert progress_reports == [(1, 0), (1, 2)]
+
+
+def test_estimate_num_relevant_documents(schema_with_class_uris):
+    db = FakeDatabase(dict(employee_set=FakeCollection(ids=[f"e{n}" for n in range(10)])))
+    scanner = Scanner(finder=Finder(database=db), **schema_with_class_uris)
+    assert scanner.estimate_num_relevant_documents("employee_set") == 10
+    partition = Partition(collection_name="employee_set", index=0, num_partitions=3)
+    assert scanner.estimate_num_relevant_documents("employee_set", partition=partition) == 4  # rounds up
+
+
+@pytest.mark.parametrize("id_index_class", [IdIndex, HashedIdIndex, MappedIdIndex])
+def test_unhashable_target_id_with_id_index(schema_with_class_uris, id_index_class, tmp_path):
+    if id_index_class is HashedIdIndex:
+        pytest.importorskip("numpy")
+
+    ids_by_collection_name = dict(company_set=["c1"], employee_set=["e1"])
+    if id_index_class is MappedIdIndex:
+        MappedIdIndex.build(tmp_path / "ids.idx", ids_by_collection_name)
+        id_index = MappedIdIndex(tmp_path / "ids.idx")
+    else:
+        id_index = id_index_class()
+        for collection_name, document_ids in ids_by_collection_name.items():
+            id_index.add_collection(collection_name, document_ids)
+    db = FakeDatabase(dict(company_set=FakeCollection(), employee_set=FakeCollection()))  # no documents
+    scanner = Scanner(finder=Finder(database=db, id_index=id_index), **schema_with_class_uris)
+    micro_batch = MicroBatch(
+        source_collection_name="employee_set",
+        documents=[{"_id": 1, "id": "e2", "type": "my:Employee", "works_for": {"id": "c1"}}],
+    )
+
+    # Confirm the dictionary-valued reference is looked up in the database (since it can't be in the index),
+    # instead of aborting the scan.
+    violations = ViolationList()
+    for stage in (
+        scanner.extract_references_in_micro_batch,
+        scanner.resolve_references_in_micro_batch,
+        lambda micro_batch: scanner.record_violations_in_micro_batch(micro_batch, violations, lambda *args: None),
+    ):
+        stage(micro_batch)
+    assert [violation.target_id for violation in violations] == [{"id": "c1"}]
+    assert db.collections["company_set"].queries == [{"id": {"id": "c1"}}]
+
+
+def make_fake_company_database() -> FakeDatabase:
+    r"""
+    Returns a fake database containing some companies and employees (whose `_id`s are in insertion order), some of
+    whose references lack integrity.
+    """
+
+    def make_object_id(n: int) -> bson.ObjectId:
+        return bson.ObjectId(f"{n:024x}")
+
+    companies = [
+        {"_id": make_object_id(100 + n), "id": f"c{n}", "type": "my:Company", "employs": [f"e{n}", f"e{n + 50}"]}
+        for n in range(3)
+    ]
+    employees = [
+        {"_id": make_object_id(n), "id": f"e{n}", "type": "my:Employee", "works_for": f"c{n % 4}"} for n in range(30)
+    ]
+    employees.append({"_id": make_object_id(30), "id": "x1", "type": "my:Unknown", "works_for": "c404"})
+    return FakeDatabase(dict(company_set=FakeCollection(companies), employee_set=FakeCollection(employees)))
+
+
+def test_get_partitions_of_collections(schema_with_class_uris):
+    db = make_fake_company_database()
+    scanner = Scanner(finder=Finder(database=db), **schema_with_class_uris)
+
+    # The largest collection's partitions come first; and a collection too small to split has a single partition.
+    partitions = scanner.get_partitions_of_collections(
+        ["company_set", "employee_set"], max_partitions_per_collection=3, min_documents_per_partition=10
+    )
+    assert [partition.description for partition in partitions] == [
+        "employee_set [1/3]",
+        "employee_set [2/3]",
+        "employee_set [3/3]",
+        "company_set",
+    ]
+
+
+def test_scan_partitions_in_worker_processes(schema_with_class_uris, monkeypatch):
+    db = make_fake_company_database()
+    scanner = Scanner(finder=Finder(database=db), **schema_with_class_uris, lookup_batch_size=1)
+    collection_names = ["company_set", "employee_set"]
+    partitions = scanner.get_partitions_of_collections(
+        collection_names, max_partitions_per_collection=3, min_documents_per_partition=10
+    )
+    submitted_partitions = []
+    completed_partitions = []
+
+    class FakeProcessPoolExecutor:
+        r"""
+        A stand-in for a `ProcessPoolExecutor`, which runs the tasks in a thread of the current process, in the reverse
+        of the order in which they were submitted (so that the partitions are scanned, and complete, out of order).
+        """
+
+        def __init__(self, max_workers: int, mp_context, initializer, initargs: tuple):
+            initializer(*initargs)
+            self.tasks = []
+            self.thread = threading.Thread(target=self.run_tasks)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self.thread.join()
+
+        def run_tasks(self):
+            for function, partition, future in reversed(self.tasks):
+                future.set_result(function(partition))
+                completed_partitions.append(partition)
+
+        def submit(self, function, partition) -> Future:
+            future = Future()
+            self.tasks.append((function, partition, future))
+            submitted_partitions.append(partition)
+            if len(self.tasks) == len(partitions):
+                self.thread.start()
+            return future
+
+    # Note: The "worker" scans the partitions using the same (fake) database as the main process.
+    monkeypatch.setattr("refscan.lib.Scanner.ProcessPoolExecutor", FakeProcessPoolExecutor)
+    monkeypatch.setattr(
+        "refscan.lib.Scanner.multiprocessing.get_context",
+        lambda method: SimpleNamespace(Manager=lambda: nullcontext(SimpleNamespace(Queue=queue.Queue))),
+    )
+    monkeypatch.setattr(
+        "refscan.lib.Scanner.connect_to_database", lambda *args, **kwargs: SimpleNamespace(get_database=lambda _: db)
+    )
+    num_documents_by_unknown_type = Counter()
+    finder_stats = Counter()
+    violations_by_collection_name = scan_partitions_in_worker_processes(
+        partitions=partitions,
+        num_workers=2,
+        progress=init_progress_bar(),
+        num_documents_by_unknown_type=num_documents_by_unknown_type,
+        finder_stats=finder_stats,
+        initargs=(
+            "mongodb://fake",
+            "fake",
+            "tests/schemas/database_with_class_uris.yaml",
+            schema_with_class_uris["references"],
+            schema_with_class_uris["collection_names"],
+            Scanner,
+            dict(lookup_batch_size=1),
+            dict(),
+            None,
+            False,
+        ),
+    )
+
+    # Confirm the partitions were scheduled in the order given (i.e. largest collection first), and completed in the
+    # opposite order.
+    assert submitted_partitions == partitions
+    assert completed_partitions == partitions[::-1]
+
+    # Confirm the violations in each collection are in the order a serial scan finds them, in spite of that; and that
+    # the statistics of the scans of the partitions were combined.
+    for collection_name in collection_names:
+        assert violations_by_collection_name[collection_name] == scanner.scan_collection(collection_name)
+    assert len(violations_by_collection_name["employee_set"]) == 7  # employees "e3", "e7", ..., "e27" work for "c3"
+    assert len(violations_by_collection_name["company_set"]) == 3  # none of "e50", "e51", "e52" exist
+    assert num_documents_by_unknown_type == scanner.num_documents_by_unknown_type == Counter({"my:Unknown": 1})
+    assert finder_stats == scanner.finder.stats
+    assert finder_stats["lookups"] > 0
@@ -0,0 +1,41 @@
+import linkml_runtime
+
+from refscan.lib.SchemaAnalyzer import SchemaAnalyzer
+
+
+def test_translate_class_uri_into_schema_class_name():
+    schema_view = linkml_runtime.SchemaView(schema="tests/schemas/database_with_class_uris.yaml")
+    schema_analyzer = SchemaAnalyzer(schema_view)
+
+    # Note: The `Database` class has no `class_uri`, so it is not in the index.
+    assert schema_analyzer.class_names_by_class_uri == {
+        "my:Company": "Company",
+        "my:Employee": "Employee",
+        "my:Contractor": "Contractor",
+    }
+    assert schema_analyzer.translate_class_uri_into_schema_class_name("my:Employee") == "Employee"
+    assert schema_analyzer.translate_class_uri_into_schema_class_name("my:Unknown") is None
+    assert schema_analyzer.translate_class_uri_into_schema_class_name("Employee") is None
+
+
+def test_derive_schema_class_name_from_document():
+    schema_view = linkml_runtime.SchemaView(schema="tests/schemas/database_with_class_uris.yaml")
+    schema_analyzer = SchemaAnalyzer(schema_view)
+
+    assert schema_analyzer.derive_schema_class_name_from_document({"type": "my:Company"}) == "Company"
+    assert schema_analyzer.derive_schema_class_name_from_document({"type": "my:Unknown"}) is None
+    assert schema_analyzer.derive_schema_class_name_from_document({"type": ["my:Company"]}) is None
+    assert schema_analyzer.derive_schema_class_name_from_document({"id": "c1"}) is None
+
+
+def test_get_id_prefixes_of_class():
+    schema_view = linkml_runtime.SchemaView(schema="tests/schemas/database_with_class_uris.yaml")
+    schema_analyzer = SchemaAnalyzer(schema_view)
+
+    assert schema_analyzer.get_id_prefixes_of_class("Company") == ["my:co"]  # via `pattern`
+
+    # Note: The `Employee` class's pattern is an interpolated `structured_pattern` having alternatives.
+    assert schema_analyzer.get_id_prefixes_of_class("Employee") == ["my:emp", "my:mgr", "ex:emp", "ex:mgr"]
+
+    # Note: The `Contractor` class has no `id` slot.
+    assert schema_analyzer.get_id_prefixes_of_class("Contractor") == []
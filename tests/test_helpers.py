@@ -1,14 +1,23 @@
+import gc
+import weakref
+
+import pytest
 from rich.progress import Progress
 import linkml_runtime
 
 from refscan.lib.Reference import Reference
 from refscan.lib.helpers import (
+    derive_schema_class_name_from_document,
     get_lowercase_key,
+    get_schema_analyzer,
+    schema_analyzers_by_schema_view,
     init_progress_bar,
     get_collection_names_from_schema,
     get_names_of_classes_eligible_for_collection,
     get_names_of_classes_in_effective_range_of_slot,
     identify_references,
+    split_into_batches,
+    translate_class_uri_into_schema_class_name,
 )
 
 
@@ -118,3 +127,52 @@ def test_identify_references():
     ]
     for expected_reference in expected_references:
         assert expected_reference in actual_references
+
+
+def test_split_into_batches():
+    batches = list(split_into_batches([1, 2, 3, 4, 5], batch_size=2))
+    assert batches == [[1, 2], [3, 4], [5]]
+
+    # Focus on iterables that aren't lists.
+    batches = list(split_into_batches(iter(range(3)), batch_size=3))
+    assert batches == [[0, 1, 2]]
+
+    # Focus on empty iterables.
+    batches = list(split_into_batches([], batch_size=2))
+    assert batches == []
+
+    # Focus on invalid batch sizes.
+    with pytest.raises(ValueError):
+        list(split_into_batches([1, 2], batch_size=0))
+
+
+def test_get_schema_analyzer():
+    schema_view = linkml_runtime.SchemaView(schema="tests/schemas/database_with_class_uris.yaml")
+
+    # Confirm the analyzer is made once per `SchemaView`, and reused by the helper functions.
+    assert get_schema_analyzer(schema_view) is get_schema_analyzer(schema_view)
+    assert get_schema_analyzer(schema_view) is not get_schema_analyzer(
+        linkml_runtime.SchemaView(schema="tests/schemas/database_with_class_uris.yaml")
+    )
+    assert translate_class_uri_into_schema_class_name(schema_view, "my:Employee") == "Employee"
+    assert derive_schema_class_name_from_document(schema_view, {"type": "my:Company"}) == "Company"
+    assert derive_schema_class_name_from_document(schema_view, {"type": "my:Unknown"}) is None
+    assert get_schema_analyzer(schema_view).get_id_prefixes_of_class("Company") == ["my:co"]
+
+
+def test_get_schema_analyzer_does_not_keep_schema_view_alive():
+    class FakeSchemaView:
+        r"""A stand-in for a `SchemaView` (whose own caches would keep it alive)."""
+
+        def all_classes(self) -> dict:
+            return {}
+
+    schema_view = FakeSchemaView()
+    get_schema_analyzer(schema_view)
+    assert schema_view in schema_analyzers_by_schema_view
+
+    # Once nothing else refers to the `SchemaView`, it (and its cached analyzer) can be garbage-collected.
+    schema_view_ref = weakref.ref(schema_view)
+    del schema_view
+    gc.collect()
+    assert schema_view_ref() is None
@@ -0,0 +1,19 @@
+from typer.testing import CliRunner
+
+from refscan.refscan import app, index_app
+
+runner = CliRunner()
+
+
+def test_scan_options_are_top_level():
+    r"""Confirms the scan's options are the program's own (i.e. people can run `$ refscan --schema ...`)."""
+    result = runner.invoke(app, ["--schema", "tests/schemas/database_with_references.yaml", "--help"])
+    assert result.exit_code == 0
+    assert "--database-name" in result.output
+
+
+def test_index_builder_options_are_top_level():
+    r"""Confirms the index builder's options are its program's own (i.e. people can run `$ refscan-index ...`)."""
+    result = runner.invoke(index_app, ["--help"])
+    assert result.exit_code == 0
+    assert "--output" in result.output